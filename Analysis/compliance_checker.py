@@ -1,174 +1,79 @@
 # analysis/compliance_checker.py
 
+import os
 import re
+import threading
 import streamlit as st
 from sentence_transformers import SentenceTransformer, util
 import torch
+from utils.budget import clear_degradation, record_degradation, stage_budget
+from utils.cache import LRUCache, cached_function
+from utils.encoding_scheduler import EncodingScheduler
+from Analysis.document_index import get_document_index, normalize_case, segment_sentences
+from Analysis.lexical_prefilter import get_shortlist
+from Analysis.rule_packs import get_rules
+
+# Sentence embeddings keyed by sentence text, so a revised document only
+# re-encodes the sentences that changed
+SENTENCE_EMBEDDING_CACHE = LRUCache(max_entries=50000, name="sentence_embeddings")
+
+# Sentence transformer used for semantic matching; requirement embeddings are
+# stored in the compiled rule pack under this name
+EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
 
 # Load sentence transformer model for semantic matching
 @st.cache_resource
 def load_embedder():
-    return SentenceTransformer('all-MiniLM-L6-v2')
+    return SentenceTransformer(EMBEDDING_MODEL)
+
+# Encode new sentences from all documents being analyzed through one shared
+# scheduler, which fills the model's batches across documents (set to 0 to
+# encode each document on its own)
+BATCH_ENCODING = os.environ.get("VAULTIQ_BATCH_ENCODING", "1") != "0"
+
+def encode_batch(embedder, batch):
+    """Encode one scheduler batch; the batch is already length-sorted and sized"""
+    embeddings = embedder.encode(batch, batch_size=len(batch), convert_to_tensor=True)
+    # Copy each row so a cached sentence doesn't keep its whole batch tensor alive
+    return [embedding.clone() for embedding in embeddings]
+
+# The scheduler's worker thread has no Streamlit script context, so it is
+# handed the model the caller loaded instead of calling load_embedder itself
+_sentence_encoder = (None, None)
+_sentence_encoder_lock = threading.Lock()
+
+def sentence_encoder(embedder):
+    """Return the shared scheduler encoding with an already-loaded model"""
+    global _sentence_encoder
+    with _sentence_encoder_lock:
+        model, scheduler = _sentence_encoder
+        if model is not embedder:
+            scheduler = EncodingScheduler(
+                lambda batch: encode_batch(embedder, batch),
+                on_result=SENTENCE_EMBEDDING_CACHE.set,
+                name="sentence_encoder"
+            )
+            _sentence_encoder = (embedder, scheduler)
+        return scheduler
+
+# Only encode the sentences a BM25 prefilter shortlists for some compliance
+# category (set VAULTIQ_LEXICAL_PREFILTER=0 to encode every sentence)
+LEXICAL_PREFILTER = os.environ.get("VAULTIQ_LEXICAL_PREFILTER", "1") != "0"
 
-# Comprehensive list of compliance requirements by category
-COMPLIANCE_REQUIREMENTS = {
-    "Financial Reporting": [
-        {
-            "description": "SOX Section 302 - Disclosure Controls",
-            "patterns": [
-                "disclosure controls and procedures", 
-                "effectiveness of disclosure controls",
-                "financial reporting procedures"
-            ],
-            "recommendation": "Include explicit statements about disclosure controls and procedures evaluation."
-        },
-        {
-            "description": "SOX Section 404 - Internal Controls",
-            "patterns": [
-                "internal control over financial reporting", 
-                "assessment of internal control",
-                "financial control framework"
-            ],
-            "recommendation": "Add language about maintaining effective internal controls over financial reporting."
-        },
-        {
-            "description": "GAAP Compliance Statement",
-            "patterns": [
-                "generally accepted accounting principles", 
-                "GAAP",
-                "accounting standards"
-            ],
-            "recommendation": "Include explicit statement of compliance with GAAP or applicable accounting standards."
-        }
-    ],
-    "Data Privacy": [
-        {
-            "description": "GDPR Data Processing Provisions",
-            "patterns": [
-                "data processing agreement", 
-                "personal data processing",
-                "data controller and processor", 
-                "data protection"
-            ],
-            "recommendation": "Include specific GDPR-compliant data processing terms and roles definition."
-        },
-        {
-            "description": "CCPA Consumer Rights",
-            "patterns": [
-                "california consumer privacy", 
-                "right to delete",
-                "right to access", 
-                "opt-out of sale"
-            ],
-            "recommendation": "Add provisions addressing CCPA consumer rights and business obligations."
-        },
-        {
-            "description": "Data Breach Notification",
-            "patterns": [
-                "data breach notification", 
-                "security incident response",
-                "breach reporting timeline"
-            ],
-            "recommendation": "Include clear procedures and timelines for data breach notifications."
-        }
-    ],
-    "Information Security": [
-        {
-            "description": "Security Safeguards Requirements",
-            "patterns": [
-                "information security safeguards", 
-                "technical security measures",
-                "administrative security controls"
-            ],
-            "recommendation": "Add specific security safeguards requirements and standards compliance."
-        },
-        {
-            "description": "Security Assessment Rights",
-            "patterns": [
-                "security assessment", 
-                "security audit rights",
-                "penetration testing", 
-                "vulnerability scanning"
-            ],
-            "recommendation": "Include rights to conduct security assessments or audit security practices."
-        },
-        {
-            "description": "Security Certification Requirements",
-            "patterns": [
-                "ISO 27001", 
-                "SOC 2", 
-                "security certification",
-                "security standards compliance"
-            ],
-            "recommendation": "Specify required security certifications or compliance standards."
-        }
-    ],
-    "Employment": [
-        {
-            "description": "Non-Discrimination Provisions",
-            "patterns": [
-                "equal opportunity employer", 
-                "non-discrimination policy",
-                "workplace equality"
-            ],
-            "recommendation": "Include comprehensive non-discrimination provisions covering protected classes."
-        },
-        {
-            "description": "Workplace Safety Requirements",
-            "patterns": [
-                "workplace safety", 
-                "health and safety policies",
-                "safe working environment"
-            ],
-            "recommendation": "Add specific workplace safety requirements and compliance with regulations."
-        },
-        {
-            "description": "Worker Classification",
-            "patterns": [
-                "employee classification", 
-                "independent contractor",
-                "worker status"
-            ],
-            "recommendation": "Clarify worker classification and ensure compliance with labor laws."
-        }
-    ],
-    "Anti-Corruption": [
-        {
-            "description": "FCPA/Anti-Bribery Provisions",
-            "patterns": [
-                "foreign corrupt practices", 
-                "anti-bribery",
-                "corruption prevention", 
-                "government officials"
-            ],
-            "recommendation": "Include specific anti-corruption and anti-bribery provisions and compliance requirements."
-        },
-        {
-            "description": "Gift Policy",
-            "patterns": [
-                "gift policy", 
-                "business courtesies",
-                "gifts and entertainment"
-            ],
-            "recommendation": "Add clear policies regarding gifts, entertainment, and business courtesies."
-        },
-        {
-            "description": "Third-Party Due Diligence",
-            "patterns": [
-                "third-party due diligence", 
-                "vendor vetting",
-                "business partner screening"
-            ],
-            "recommendation": "Include requirements for conducting due diligence on third parties."
-        }
-    ]
-}
+# Rough CPU encoding rate used to tell whether semantic matching fits the
+# compliance budget (override with VAULTIQ_ENCODE_RATE)
+ENCODE_SENTENCES_PER_SECOND = float(os.environ.get("VAULTIQ_ENCODE_RATE", "200"))
 
-@st.cache_data
 def check_compliance(text, confidence_threshold=0.5):
     """
     Check document compliance against standard regulatory requirements
     
+    Pattern matches and similarity scores are cached per document by
+    `score_compliance`; only the threshold comparison runs on every call.
+    When the document is near its budget, or encoding its new sentences
+    would not fit the compliance budget, requirements are checked by their
+    phrase patterns only.
+    
     Args:
         text: The extracted text from the document
         confidence_threshold: Minimum confidence level for matching
@@ -176,38 +81,100 @@ def check_compliance(text, confidence_threshold=0.5):
     Returns:
         dict: Compliance analysis results
     """
-    embedder = load_embedder()
+    semantic, reason = semantic_within_budget(text)
+    if semantic:
+        clear_degradation("compliance")
+    else:
+        record_degradation("compliance", f"Pattern-only compliance check, semantic matching skipped ({reason})")
+    
+    scores = score_compliance(text, get_rules().fingerprint, semantic)
+    return apply_compliance_threshold(scores, confidence_threshold)
+
+def semantic_within_budget(text):
+    """Whether semantic matching fits the compliance budget, and why not otherwise"""
+    _, sentences = semantic_candidates(text)
+    return encoding_within_budget(sentences, "compliance")
+
+def encoding_within_budget(sentences, stage):
+    """Whether encoding sentences fits a stage's budget, and why not otherwise"""
+    budget = stage_budget(stage)
+    if budget.near_limit():
+        return False, "document time or memory budget nearly used"
+    
+    # Only sentences missing from the embedding cache cost encoder time
+    remaining = budget.remaining()
+    if remaining is None:
+        return True, None
+    missing = sum(1 for sentence in dict.fromkeys(sentences) if sentence not in SENTENCE_EMBEDDING_CACHE)
+    estimate = missing / ENCODE_SENTENCES_PER_SECOND
+    if estimate > remaining:
+        return False, f"encoding {missing} sentences would take about {estimate:.0f}s, {remaining:.0f}s left"
+    return True, None
+
+@cached_function("compliance_scores", max_entries=256, max_mb=64, ttl=6 * 3600)
+def score_compliance(text, rules_fingerprint=None, semantic=True):
+    """
+    Score every compliance requirement against the document
     
-    # Split text into sentences for more accurate matching
-    sentences = split_into_sentences(text)
+    Args:
+        text: The extracted text from the document
+        rules_fingerprint: Fingerprint of the rule packs to check against;
+            also keys the cache so swapped packs are re-scored
+        semantic: Fall back to semantic search for requirements without a
+            pattern match (False checks patterns only, without the encoder)
+        
+    Returns:
+        dict: Per-category list of requirement scores (pattern hit, best
+            semantic similarity and the best matching sentence)
+    """
+    embedder = load_embedder() if semantic else None
+    rules = get_rules(rules_fingerprint)
+    index = get_document_index(text)
     
-    # Generate embeddings for all sentences at once (more efficient)
+    # Split text into sentences for more accurate matching, and keep the ones
+    # that can plausibly match a requirement
+    candidates, sentences = semantic_candidates(text, index, rules) if semantic else ([], [])
+    
+    # Generate embeddings for all candidate sentences at once (more efficient)
     if sentences:
-        sentence_embeddings = embedder.encode(sentences, convert_to_tensor=True)
+        sentence_embeddings = encode_sentences(embedder, sentences)
     else:
         sentence_embeddings = torch.tensor([])
     
-    results = {"checks": {}, "overall_compliant": True}
+    # Find the first occurrence of every requirement phrase in a single scan
+    phrase_offsets = rules.phrase_automaton.first_offsets(index.lower)
     
-    # Check each compliance category
-    for category, requirements in COMPLIANCE_REQUIREMENTS.items():
-        category_results = []
+    scores = {}
+    
+    # Score each compliance category
+    for category, requirements in rules.compliance_requirements.items():
+        category_scores = []
         
-        for req in requirements:
-            requirement_matched = False
+        for i, req in enumerate(requirements):
+            pattern_matched = False
             best_match_score = 0
             best_match_text = ""
+            best_match_page = None
+            best_match_offset = None
             
-            # Check pattern-based matching first (faster)
+            # Check pattern-based matching first (faster); the patterns are
+            # plain phrases, already located by the rule pack's automaton
             for pattern in req["patterns"]:
-                if re.search(pattern, text, re.IGNORECASE):
-                    requirement_matched = True
+                offset = phrase_offsets.get(normalize_case(pattern))
+                if offset is not None:
+                    pattern_matched = True
+                    best_match_page = index.page_of(offset)
+                    best_match_offset = offset
                     break
             
             # If not matched by pattern, use semantic search
-            if not requirement_matched and len(sentences) > 0:
-                # Encode the requirement patterns
-                pattern_embeddings = embedder.encode(req["patterns"], convert_to_tensor=True)
+            semantic_checked = not pattern_matched and len(sentences) > 0
+            if semantic_checked:
+                # Requirement embeddings are computed once per rule pack, not per document
+                pattern_embeddings = torch.as_tensor(
+                    rules.requirement_embeddings(embedder, EMBEDDING_MODEL)[(category, i)],
+                    device=sentence_embeddings.device
+                )
                 
                 # Find best matches between patterns and sentences
                 for pattern_embedding in pattern_embeddings:
@@ -220,18 +187,45 @@ def check_compliance(text, confidence_threshold=0.5):
                         best_match_score = score
                         if best_idx < len(sentences):
                             best_match_text = sentences[best_idx]
-                
-                # Consider it matched if similarity exceeds threshold
-                if best_match_score >= confidence_threshold:
-                    requirement_matched = True
+                            best_match_offset = index.sentence_spans[candidates[best_idx]][0]
+                            best_match_page = index.page_of(best_match_offset)
+            
+            category_scores.append({
+                "description": req["description"],
+                "recommendation": req["recommendation"],
+                "pattern_matched": pattern_matched,
+                "semantic_checked": semantic_checked,
+                "score": best_match_score,
+                "best_match": best_match_text,
+                "page": best_match_page,
+                "offset": best_match_offset
+            })
+        
+        scores[category] = category_scores
+    
+    return scores
+
+def apply_compliance_threshold(scores, confidence_threshold=0.5):
+    """Derive compliance results from cached requirement scores"""
+    results = {"checks": {}, "overall_compliant": True}
+    
+    for category, category_scores in scores.items():
+        category_results = []
+        
+        for req_score in category_scores:
+            # Consider it matched by pattern or if similarity exceeds threshold
+            requirement_matched = req_score["pattern_matched"] or (
+                req_score["semantic_checked"] and req_score["score"] >= confidence_threshold)
             
             # Record the result
             check_result = {
-                "description": req["description"],
+                "description": req_score["description"],
                 "compliant": requirement_matched,
-                "confidence": best_match_score if not requirement_matched else 1.0,
-                "recommendation": req["recommendation"] if not requirement_matched else "",
-                "best_match": best_match_text if best_match_text else ""
+                "confidence": req_score["score"] if not requirement_matched else 1.0,
+                "recommendation": req_score["recommendation"] if not requirement_matched else "",
+                "best_match": req_score["best_match"] if req_score["best_match"] else "",
+                "page": req_score.get("page"),
+                "offset": req_score.get("offset")
             }
             
             category_results.append(check_result)
@@ -244,22 +238,72 @@ def check_compliance(text, confidence_threshold=0.5):
     
     return results
 
-def split_into_sentences(text):
-    """Split text into sentences for analysis"""
-    # Simple sentence splitter (handles common abbreviations)
-    text = re.sub(r'([.!?])\s+', r'\1|SPLIT|', text)
-    text = re.sub(r'([.!?])"', r'\1"|SPLIT|', text)
+def semantic_candidates(text, index=None, rules=None):
+    """
+    Sentences to compare against the requirements semantically
     
-    # Handle common abbreviations to avoid false splits
-    common_abbr = ['Mr.', 'Mrs.', 'Ms.', 'Dr.', 'Inc.', 'Ltd.', 'Co.', 'Corp.',
-                  'i.e.', 'e.g.', 'vs.', 'U.S.', 'Fig.']
+    Returns:
+        tuple: (sentence indexes into the document index, sentences)
+    """
+    index = index or get_document_index(text)
+    rules = rules or get_rules()
+    sentences = index.sentences
+    if not LEXICAL_PREFILTER or not sentences:
+        return list(range(len(sentences))), sentences
+    candidates = get_shortlist(text, sentences, rules)
+    return candidates, [sentences[i] for i in candidates]
+
+def encode_sentences(embedder, sentences):
+    """Encode sentences, reusing cached embeddings and batching only the new ones"""
+    cached = [SENTENCE_EMBEDDING_CACHE.get(sentence) for sentence in sentences]
+    missing = list(dict.fromkeys(s for s, emb in zip(sentences, cached) if emb is None))
+    
+    if missing:
+        if BATCH_ENCODING:
+            # The scheduler fills the embedding cache itself
+            encoded = dict(zip(missing, sentence_encoder(embedder).encode(missing)))
+        else:
+            # Copied rows, as in encode_batch, so the cache holds no batch tensors
+            embeddings = embedder.encode(missing, convert_to_tensor=True)
+            encoded = {sentence: embedding.clone() for sentence, embedding in zip(missing, embeddings)}
+            for sentence, embedding in encoded.items():
+                SENTENCE_EMBEDDING_CACHE.set(sentence, embedding)
+        cached = [emb if emb is not None else encoded[s] for s, emb in zip(sentences, cached)]
+    
+    return torch.stack(cached)
+
+def prefetch_sentence_embeddings(text):
+    """
+    Queue a document's new sentences for encoding without waiting
     
-    for abbr in common_abbr:
-        text = text.replace(f"{abbr}|SPLIT|", abbr + " ")
+    Batch runs call this right after extraction, so the sentences are encoded
+    together with other documents' while the legal and financial analyses run.
+    """
+    if not BATCH_ENCODING:
+        return None
+    _, sentences = semantic_candidates(text)
+    missing = [sentence for sentence in dict.fromkeys(sentences) if sentence not in SENTENCE_EMBEDDING_CACHE]
+    return sentence_encoder(load_embedder()).submit(missing) if missing else None
+
+def embed_document_sentences(text):
+    """Return all of the document index's sentences and their embeddings as a NumPy array"""
+    sentences = get_document_index(text).sentences
+    if not sentences:
+        return [], None
     
-    # Split the text and filter out empty sentences
-    sentences = [s.strip() for s in text.split('|SPLIT|')]
-    return [s for s in sentences if s]
+    # Sentences the compliance check already encoded come from the embedding cache
+    embeddings = encode_sentences(load_embedder(), sentences)
+    return sentences, embeddings.cpu().numpy()
+
+def embed_query(text):
+    """Embed free text (e.g. a clause to look up) as a NumPy vector"""
+    return load_embedder().encode([text], convert_to_tensor=True)[0].cpu().numpy()
+
+def split_into_sentences(text):
+    """Split text into sentences for analysis"""
+    # Same splitter the document index uses (handles common abbreviations)
+    sentences, _ = segment_sentences(text)
+    return sentences
 
 def identify_regulatory_references(text):
     """Identify references to specific regulations in text"""
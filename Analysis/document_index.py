@@ -0,0 +1,183 @@
+# analysis/document_index.py
+
+import re
+from bisect import bisect_right
+from collections import defaultdict
+from utils.cache import LRUCache, content_hash
+
+# Indexes of recently analyzed documents, shared by the legal, compliance and financial analyzers
+DOCUMENT_INDEX_CACHE = LRUCache(max_entries=64, name="document_indexes")
+
+SENTENCE_END_PATTERN = re.compile(r'[.!?]\s+')
+QUOTED_SENTENCE_END_PATTERN = re.compile(r'[.!?]"')
+TOKEN_PATTERN = re.compile(r'\w+')
+
+# Abbreviations that end with a period without ending the sentence
+COMMON_ABBREVIATIONS = ('Mr.', 'Mrs.', 'Ms.', 'Dr.', 'Inc.', 'Ltd.', 'Co.', 'Corp.',
+                        'i.e.', 'e.g.', 'vs.', 'U.S.', 'Fig.')
+
+class DocumentIndex:
+    """
+    Everything the analyzers need to know about a document's text, computed once
+
+    Holds the lowercased text (same length as the original, so offsets carry
+    over), sentence spans, page boundaries and a token-to-position index that
+    is built on first use.
+    """
+
+    def __init__(self, text, pages=None):
+        self.text = text
+        self.lower = normalize_case(text)
+        self.sentences, self.sentence_spans = segment_sentences(text)
+        self.sentence_starts = [start for start, _ in self.sentence_spans]
+        self.page_starts, self.page_numbers = locate_pages(text, pages) if pages else ([], [])
+        self._token_positions = None
+        self._layout = None
+
+    @property
+    def has_pages(self):
+        return bool(self.page_starts)
+
+    def page_of(self, offset):
+        """1-based page number of a character offset, or None without page information"""
+        i = bisect_right(self.page_starts, offset) - 1
+        return self.page_numbers[max(i, 0)] if self.page_starts else None
+
+    def sentence_of(self, offset):
+        """Index of the sentence containing (or preceding) a character offset"""
+        return max(bisect_right(self.sentence_starts, offset) - 1, 0)
+
+    def contains(self, phrase):
+        """Case-insensitive substring check"""
+        return normalize_case(phrase) in self.lower
+
+    def find(self, phrase, start=0):
+        """Case-insensitive offset of phrase at or after start, or -1"""
+        return self.lower.find(normalize_case(phrase), start)
+
+    @property
+    def token_positions(self):
+        """Map of lowercased word token to the offsets where it starts"""
+        if self._token_positions is None:
+            positions = defaultdict(list)
+            for match in TOKEN_PATTERN.finditer(self.lower):
+                positions[match.group()].append(match.start())
+            self._token_positions = dict(positions)
+        return self._token_positions
+
+    def positions(self, token):
+        """Offsets of a whole-word token"""
+        return self.token_positions.get(normalize_case(token), [])
+
+    def find_phrase(self, phrase):
+        """Offsets where a phrase starts at the beginning of a word"""
+        phrase = normalize_case(phrase)
+        tokens = TOKEN_PATTERN.findall(phrase)
+        if not phrase:
+            return []
+        if not tokens or not phrase.startswith(tokens[0]):
+            # Phrases starting with punctuation can't use the token index
+            offsets, i = [], self.lower.find(phrase)
+            while i >= 0:
+                offsets.append(i)
+                i = self.lower.find(phrase, i + 1)
+            return offsets
+        return [i for i in self.positions(tokens[0]) if self.lower.startswith(phrase, i)]
+
+    @property
+    def layout(self):
+        """Word start and line break offsets (see text_layout), computed on first use"""
+        if self._layout is None:
+            self._layout = text_layout(self.text)
+        return self._layout
+
+    def term_frequencies(self):
+        """Count alphabetic word tokens"""
+        return {token: len(offsets) for token, offsets in self.token_positions.items() if token.isalpha()}
+
+def get_document_index(text, pages=None):
+    """
+    Return the shared index of a document, building it on first request
+
+    Call with the extracted pages right after extraction so later calls
+    with just the text (from any analyzer) get an index with page boundaries.
+
+    Args:
+        text: The extracted text from the document
+        pages: Optional per-page text as produced by process_uploaded_file
+
+    Returns:
+        DocumentIndex: Index shared by every analyzer for this text
+    """
+    key = content_hash(text)
+    index = DOCUMENT_INDEX_CACHE.get(key)
+    if index is None or (pages and not index.has_pages):
+        index = DocumentIndex(text, pages)
+        DOCUMENT_INDEX_CACHE.set(key, index)
+    return index
+
+def normalize_case(text):
+    """Lowercase text without changing its length, so offsets stay valid"""
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    # A few characters (e.g. 'İ') lowercase to two; keep only the first
+    return "".join(char.lower()[0] for char in text)
+
+def text_layout(text):
+    """Offsets of word starts and line breaks, used to bound pattern gaps"""
+    word_starts = [match.start() for match in TOKEN_PATTERN.finditer(text)]
+    line_breaks = [match.start() for match in re.finditer("\n", text)]
+    return word_starts, line_breaks
+
+def segment_sentences(text):
+    """
+    Split text into sentences and their (start, end) offsets
+
+    Sentences end at ., ! or ? followed by whitespace or a closing quote,
+    except after common abbreviations. Sentences are stripped; whitespace
+    after an abbreviation collapses to a single space.
+    """
+    # Sentence boundaries as (position, resume, is_break): text[position:resume] is the gap
+    boundaries = []
+    for match in SENTENCE_END_PATTERN.finditer(text):
+        end = match.start() + 1
+        boundaries.append((end, match.end(), not text.endswith(COMMON_ABBREVIATIONS, 0, end)))
+    for match in QUOTED_SENTENCE_END_PATTERN.finditer(text):
+        boundaries.append((match.end(), match.end(), True))
+    boundaries.sort()
+
+    sentences, spans = [], []
+    pieces, start, position = [], 0, 0
+    for end, resume, is_break in boundaries + [(len(text), len(text), True)]:
+        pieces.append(text[position:end])
+        position = resume
+        if not is_break:
+            pieces.append(" ")
+            continue
+
+        sentence = "".join(pieces).strip()
+        if sentence:
+            raw = text[start:end]
+            span_start = start + len(raw) - len(raw.lstrip())
+            span_end = start + len(raw.rstrip())
+            sentences.append(sentence)
+            spans.append((span_start, span_end))
+        pieces, start = [], resume
+
+    return sentences, spans
+
+def locate_pages(text, pages):
+    """Find where each non-empty page starts in the joined document text"""
+    starts, numbers = [], []
+    position = 0
+    for number, page in enumerate(pages, start=1):
+        if not page:
+            continue
+        offset = position if text.startswith(page, position) else text.find(page, position)
+        if offset < 0:
+            continue
+        starts.append(offset)
+        numbers.append(number)
+        position = offset + len(page)
+    return starts, numbers
@@ -3,27 +3,11 @@
 import re
 import pandas as pd
 import numpy as np
-import streamlit as st
 from collections import defaultdict
-
-# Financial keywords and patterns with improved regex
-FINANCIAL_KEYWORDS = {
-    "Revenue": r"(?:Annual|Total|Net)?\s*Revenue\s*(?:of|:)?\s*[\$]?([0-9,\.]+)\s*(?:million|billion|M|B)?",
-    "Net Income": r"(?:Net Income|Net Profit|Net Earnings)\s*(?:of|:)?\s*[\$]?([0-9,\.]+)\s*(?:million|billion|M|B)?",
-    "Total Assets": r"Total Assets\s*(?:of|:)?\s*[\$]?([0-9,\.]+)\s*(?:million|billion|M|B)?",
-    "Total Liabilities": r"Total Liabilities\s*(?:of|:)?\s*[\$]?([0-9,\.]+)\s*(?:million|billion|M|B)?",
-    "EBITDA": r"EBITDA\s*(?:of|:)?\s*[\$]?([0-9,\.]+)\s*(?:million|billion|M|B)?",
-    "EPS": r"(?:Earnings Per Share|EPS)\s*(?:of|:)?\s*[\$]?([0-9,\.]+)",
-    "Gross Profit": r"Gross Profit\s*(?:of|:)?\s*[\$]?([0-9,\.]+)\s*(?:million|billion|M|B)?",
-    "Operating Income": r"Operating Income\s*(?:of|:)?\s*[\$]?([0-9,\.]+)\s*(?:million|billion|M|B)?"
-}
-
-# Periods for financial reporting
-FINANCIAL_PERIODS = [
-    r"FY\s?(\d{4})",  # Fiscal year
-    r"Q(\d)\s?(\d{4})",  # Quarter
-    r"(?:Jan|January|Feb|February|Mar|March|Apr|April|May|Jun|June|Jul|July|Aug|August|Sep|September|Oct|October|Nov|November|Dec|December)[a-z]*\s+(\d{4})"  # Month-Year
-]
+from utils.cache import cached_function
+from Analysis.document_index import get_document_index
+from Analysis.numeric_index import format_amount, get_numeric_index
+from Analysis.rule_packs import get_rules
 
 # Financial ratios and formulas
 FINANCIAL_RATIOS = {
@@ -33,7 +17,6 @@ FINANCIAL_RATIOS = {
     "ROA": {"formula": lambda ni, ta: ni / ta, "inputs": ["Net Income", "Total Assets"]}
 }
 
-@st.cache_data
 def analyze_financials(text, tables=None):
     """
     Comprehensive financial analysis of document text and tables
@@ -45,12 +28,29 @@ def analyze_financials(text, tables=None):
     Returns:
         dict: Financial analysis results
     """
+    return score_financials(text, tables, get_rules().fingerprint)
+
+@cached_function("financial_scores", max_entries=256, max_mb=64, ttl=6 * 3600)
+def score_financials(text, tables=None, rules_fingerprint=None):
+    """
+    Run the financial analysis with one rule set (cached per document and rule set)
+    
+    Args:
+        text: The extracted text from the document
+        tables: List of pandas DataFrames containing extracted tables
+        rules_fingerprint: Fingerprint of the rule packs providing the patterns
+        
+    Returns:
+        dict: Financial analysis results
+    """
+    rules = get_rules(rules_fingerprint)
+    
     # Extract primary financial metrics from text
-    metrics = extract_financial_metrics(text)
+    metrics = extract_financial_metrics(text, rules)
     
     # If tables are available, enhance extraction from tables
     if tables and len(tables) > 0:
-        table_metrics = extract_metrics_from_tables(tables)
+        table_metrics = extract_metrics_from_tables(tables, rules)
         # Merge table metrics with text metrics (table data takes precedence)
         metrics.update(table_metrics)
     
@@ -59,7 +59,7 @@ def analyze_financials(text, tables=None):
     metrics.update(ratios)
     
     # Extract trends if any
-    trends = extract_financial_trends(text, tables)
+    trends = extract_financial_trends(text, tables, get_document_index(text), rules)
     
     # Return comprehensive results
     return {
@@ -67,42 +67,23 @@ def analyze_financials(text, tables=None):
         "trends": trends
     }
 
-def extract_financial_metrics(text):
-    """Extract financial metrics using regex patterns"""
+def extract_financial_metrics(text, rules=None):
+    """Extract financial metrics from the document's numeric index"""
+    rules = rules or get_rules()
+    numbers = get_numeric_index(text, rules)
     results = {}
     
-    # Apply each regex pattern to extract metrics
-    for key, pattern in FINANCIAL_KEYWORDS.items():
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        if matches:
-            # Use the first match as the primary metric
-            value = matches[0]
-            # Clean and format the value
-            value = value.replace(',', '')
-            
-            # Handle currency formatting
-            try:
-                float_value = float(value)
-                # Format as currency with commas
-                results[key] = f"${float_value:,.2f}"
-            except ValueError:
-                # If conversion fails, use as is
-                results[key] = value
-    
-    # Look for additional metrics not covered by standard patterns
-    # Current assets and liabilities (needed for current ratio)
-    current_assets_match = re.search(r"Current Assets\s*(?:of|:)?\s*[\$]?([0-9,\.]+)", text, re.IGNORECASE)
-    if current_assets_match:
-        results["Current Assets"] = clean_financial_value(current_assets_match.group(1))
-    
-    current_liabilities_match = re.search(r"Current Liabilities\s*(?:of|:)?\s*[\$]?([0-9,\.]+)", text, re.IGNORECASE)
-    if current_liabilities_match:
-        results["Current Liabilities"] = clean_financial_value(current_liabilities_match.group(1))
+    # Use the first amount each metric's label introduces, scaled (e.g. "$5.2M")
+    for key in rules.financial_keywords:
+        entity = numbers.first(key)
+        if entity:
+            results[key] = format_amount(entity)
     
     return results
 
-def extract_metrics_from_tables(tables):
+def extract_metrics_from_tables(tables, rules=None):
     """Extract financial metrics from tables"""
+    rules = rules or get_rules()
     results = {}
     
     # Iterate through each table
@@ -115,7 +96,7 @@ def extract_metrics_from_tables(tables):
                 row_text = ' '.join(str(cell) for cell in row)
                 
                 # Check each financial keyword
-                for key, pattern in FINANCIAL_KEYWORDS.items():
+                for key in rules.financial_keywords:
                     if re.search(key, row_text, re.IGNORECASE):
                         # Find the value column (usually the last or second-to-last column)
                         for i in range(len(row) - 1, 0, -1):
@@ -167,6 +148,15 @@ def clean_financial_value(value_str):
     except ValueError:
         return value_str
 
+def parse_financial_value(value):
+    """Convert a formatted value such as '$1,234.00' or '12.5%' back to a float"""
+    cleaned = re.sub(r"[^\d.\-]", "", str(value))
+    try:
+        number = float(cleaned)
+    except ValueError:
+        return float("nan")
+    return number / 100 if str(value).strip().endswith('%') else number
+
 def calculate_financial_ratios(metrics):
     """Calculate financial ratios based on available metrics"""
     results = {}
@@ -178,13 +168,12 @@ def calculate_financial_ratios(metrics):
         
         for input_name in ratio_info["inputs"]:
             if input_name in metrics:
-                # Extract numeric value from formatted string
-                value_str = metrics[input_name].replace('$', '').replace(',', '')
-                try:
-                    input_values.append(float(value_str))
-                except ValueError:
+                # Extract numeric value from formatted string (any currency symbol)
+                value = parse_financial_value(metrics[input_name])
+                if np.isnan(value):
                     inputs_available = False
                     break
+                input_values.append(value)
             else:
                 inputs_available = False
                 break
@@ -208,30 +197,30 @@ def calculate_financial_ratios(metrics):
     
     return results
 
-def extract_financial_trends(text, tables=None):
+def extract_financial_trends(text, tables=None, index=None, rules=None):
     """Extract financial trends over multiple periods"""
+    index = index or get_document_index(text)
+    rules = rules or get_rules()
     trends = defaultdict(dict)
     
     # Extract period information from text
     periods = []
-    for period_pattern in FINANCIAL_PERIODS:
-        period_matches = re.findall(period_pattern, text)
+    for period_pattern in rules.period_matchers:
+        period_matches = period_pattern.findall(text)
         if period_matches:
             periods.extend([match if isinstance(match, str) else ''.join(match) for match in period_matches])
     
-    # For each metric and period, try to find values
-    for key, pattern in FINANCIAL_KEYWORDS.items():
-        for period in periods:
-            # Modify pattern to include period
-            period_pattern = f"{period}.*?{pattern}"
-            match = re.search(period_pattern, text, re.IGNORECASE)
-            if match:
-                value = clean_financial_value(match.group(1))
-                trends[key][period] = value
+    # For each metric and period, try to find values (each distinct period once)
+    numbers = get_numeric_index(text, rules)
+    for key in rules.financial_keywords:
+        for period in dict.fromkeys(periods):
+            entity = search_after_period(index, period, numbers, key)
+            if entity:
+                trends[key][period] = format_amount(entity)
     
     # Extract trends from tables if available
     if tables and len(tables) > 0:
-        table_trends = extract_trends_from_tables(tables, periods)
+        table_trends = extract_trends_from_tables(tables, periods, rules)
         # Merge table trends with text trends
         for metric, period_values in table_trends.items():
             for period, value in period_values.items():
@@ -239,8 +228,35 @@ def extract_financial_trends(text, tables=None):
     
     return dict(trends)
 
-def extract_trends_from_tables(tables, periods):
+def search_after_period(index, period, numbers, metric):
+    """
+    First amount of a metric whose label is later on the same line as a period mention
+    
+    Jumps between period mentions in the lowercased text and looks the next
+    labelled amount up in the numeric index instead of rescanning the text.
+    """
+    text = index.text
+    needle = period.lower()
+    
+    start = index.lower.find(needle)
+    while start >= 0:
+        after = start + len(needle)
+        entity = numbers.first_after(metric, after)
+        if entity is None:
+            return None
+        
+        # The metric's label has to start on the period's line
+        line_end = text.find("\n", after)
+        if line_end < 0 or entity.label_start <= line_end:
+            return entity
+        
+        start = index.lower.find(needle, start + 1)
+    
+    return None
+
+def extract_trends_from_tables(tables, periods, rules=None):
     """Extract trend data from tables"""
+    rules = rules or get_rules()
     trends = defaultdict(dict)
     
     for table in tables:
@@ -262,7 +278,7 @@ def extract_trends_from_tables(tables, periods):
                 row_label = str(row[0]).strip()
                 
                 # Check if row contains a financial metric
-                for metric in FINANCIAL_KEYWORDS.keys():
+                for metric in rules.financial_keywords.keys():
                     if re.search(metric, row_label, re.IGNORECASE):
                         # Extract values for each period
                         for col_idx, period in period_cols:
@@ -2,167 +2,195 @@
 
 import spacy
 import re
+import time
 import streamlit as st
-from collections import defaultdict
+from bisect import bisect_right
+from collections import Counter, defaultdict
+from utils.budget import clear_degradation, record_degradation, stage_budget
+from utils.cache import LRUCache, cached_function, content_hash
+from Analysis.document_index import get_document_index
+from Analysis.numeric_index import VALUE_LABELS, format_amount, get_numeric_index
+from Analysis.pattern_engine import MAX_GAP_WORDS, compile_pattern
+from Analysis.rule_packs import get_rules
+
+# Parsed pages keyed by content hash, so revised documents only re-parse changed pages
+PAGE_PARSE_CACHE = LRUCache(max_entries=5000, name="page_parses")
 
 # Load spaCy model
 @st.cache_resource
 def load_nlp_model():
     return spacy.load("en_core_web_sm")
 
-# Extended dictionary of legal clauses with risk patterns and levels
-LEGAL_CLAUSES = {
-    "Indemnification": {
-        "patterns": [
-            r"(indemnify|indemnification|hold harmless|defend against)",
-            r"(shall compensate|reimburse .* for any losses)",
-            r"(indemnifying party|indemnified party)"
-        ],
-        "risk_levels": {
-            "unlimited": "High",
-            "cap": "Medium",
-            "mutual": "Low"
-        }
-    },
-    "Limitation of Liability": {
-        "patterns": [
-            r"(limit(ation)? of liability|liability .* limited|shall not exceed)",
-            r"(cap on damages|maximum liability|not be liable for more than)",
-            r"(no event shall .* be liable)"
-        ],
-        "risk_levels": {
-            "not_present": "High",
-            "low_cap": "High",
-            "reasonable_cap": "Low",
-            "waived_consequential": "Medium"
-        }
-    },
-    "Termination": {
-        "patterns": [
-            r"(terminat(e|ion) .* convenience|right to terminate)",
-            r"(early terminat(e|ion)|cancel .* agreement|prematurely)",
-            r"(terminat(e|ion) notice period|notice of terminat(e|ion))"
-        ],
-        "risk_levels": {
-            "at_will": "High",
-            "with_cause": "Medium",
-            "mutual": "Low"
-        }
-    },
-    "Intellectual Property": {
-        "patterns": [
-            r"(intellectual property|IP rights|patent|copyright|trademark)",
-            r"(ownership of .* (IP|property|work product|deliverables))",
-            r"(transfer of .* ownership|assign .* rights)"
-        ],
-        "risk_levels": {
-            "full_transfer": "High",
-            "license": "Medium",
-            "limited_license": "Low"
-        }
-    },
-    "Confidentiality": {
-        "patterns": [
-            r"(confidentiality|confidential information|trade secrets)",
-            r"(non-disclosure|not disclose|maintain .* secrecy)",
-            r"(protect .* information|confidential treatment)"
-        ],
-        "risk_levels": {
-            "weak": "High",
-            "standard": "Medium",
-            "strong": "Low"
-        }
-    },
-    "Governing Law": {
-        "patterns": [
-            r"(govern(ed)? by the laws|jurisdiction|venue)",
-            r"(applicable law|disputes .* settled|legal proceedings)",
-            r"(forum selection|choice of law|subject to .* laws)"
-        ],
-        "risk_levels": {
-            "unfavorable": "High",
-            "neutral": "Medium",
-            "favorable": "Low"
-        }
-    },
-    "Force Majeure": {
-        "patterns": [
-            r"(force majeure|act of god|beyond .* control)",
-            r"(unforeseen circumstance|unavoidable .* delay)",
-            r"(prevent performance|excuse .* performance)"
-        ],
-        "risk_levels": {
-            "not_present": "High",
-            "limited": "Medium",
-            "comprehensive": "Low"
-        }
-    },
-    "Payment Terms": {
-        "patterns": [
-            r"(payment terms|payment .* due|invoice .* payable)",
-            r"(net \d+|payment schedule|payment obligation)",
-            r"(late payment|interest .* unpaid|fee for .* delay)"
-        ],
-        "risk_levels": {
-            "short_timeline": "High",
-            "standard": "Medium",
-            "extended": "Low"
-        }
-    }
-}
-
-@st.cache_data
-def analyze_legal_document(text, confidence_threshold=0.5):
+def analyze_legal_document(text, confidence_threshold=0.5, pages=None):
     """
     Comprehensive legal analysis of document text
     
+    The expensive extraction (spaCy NER and clause pattern scans) is cached per
+    document by `score_legal_document`, so changing the threshold only re-runs
+    the cheap evaluation step.
+    
     Args:
         text: The extracted text from the document
         confidence_threshold: Minimum confidence level for detection
+        pages: Optional per-page text for incremental, page-by-page parsing
         
     Returns:
         dict: Legal analysis results
     """
+    # Pin one rule set for the whole analysis, even if the packs are swapped meanwhile
+    rules = get_rules()
+    scores = score_legal_document(text, pages, rules.fingerprint)
+    
+    # Evaluate the cached clause matches against the current threshold
+    risk_clauses = evaluate_clause_matches(scores["clause_matches"], confidence_threshold, rules)
+    
+    # Return comprehensive results
+    return {
+        "contract_info": scores["contract_info"],
+        "risk_clauses": risk_clauses,
+        "contract_value": scores["contract_value"],
+        "obligations": scores["obligations"],
+        "duration": scores["duration"],
+        "term_frequencies": scores["term_frequencies"],
+        "entity_cooccurrence": scores["entity_cooccurrence"],
+        "pattern_budget": scores["pattern_budget"],
+        "rules_version": rules.version
+    }
+
+# Scans cut short by the time budget are not cached, so the next run gets a full scan
+@cached_function(
+    "legal_scores", max_entries=256, max_mb=256, ttl=6 * 3600,
+    cache_if=lambda scores: not scores["pattern_budget"]["exceeded"]
+)
+def score_legal_document(text, pages=None, rules_fingerprint=None):
+    """
+    Run the threshold-independent part of the legal analysis
+    
+    Args:
+        text: The extracted text from the document
+        pages: Optional per-page text; when given the document is parsed page by
+            page so that unchanged pages of a revised version reuse their parse
+        rules_fingerprint: Fingerprint of the rule packs to match with; also
+            keys the cache so swapped packs don't reuse stale matches
+        
+    Returns:
+        dict: Contract information, raw clause matches, value, obligations and duration
+    """
     nlp = load_nlp_model()
+    rules = get_rules(rules_fingerprint)
+    index = get_document_index(text, pages)
+    
+    # Parse the document once for both entity and obligation extraction
+    parsed = parse_pages(pages, nlp) if pages else parse_text(text, nlp)
     
     # Extract contract information
-    contract_info = extract_contract_info(text, nlp)
+    contract_info = extract_contract_info(text, parsed, index)
     
-    # Identify risk clauses
-    risk_clauses = identify_risk_clauses(text, confidence_threshold)
+    # Find risk clause matches within the legal budget (and what is left of the document's);
+    # categories left when it runs out are reported as not checked
+    budget = stage_budget("legal")
+    time_budget = budget.remaining()
+    clause_matches = find_clause_matches(text, index, time_budget, rules)
+    skipped = [category for category, matches in clause_matches.items() if matches.get("skipped")]
+    pattern_budget = {
+        "budget_seconds": time_budget,
+        "elapsed_seconds": budget.elapsed(),
+        "exceeded": bool(skipped),
+        "skipped_categories": skipped
+    }
+    if skipped:
+        record_degradation("legal", f"Risk clause scan stopped after {budget.elapsed():.1f}s; "
+                                    f"not checked: {', '.join(skipped)}")
+    else:
+        clear_degradation("legal")
     
     # Extract contract value if present
-    contract_value = extract_contract_value(text)
+    contract_value = extract_contract_value(text, index, rules)
     
     # Extract parties' obligations
-    obligations = extract_obligations(text, nlp)
+    obligations = extract_obligations(parsed)
     
     # Extract contract duration
     duration = extract_contract_duration(text)
     
-    # Return comprehensive results
+    # Count how often parties are mentioned together in a sentence
+    entity_cooccurrence = extract_entity_cooccurrence(parsed)
+    
     return {
         "contract_info": contract_info,
-        "risk_clauses": risk_clauses,
+        "clause_matches": clause_matches,
         "contract_value": contract_value,
         "obligations": obligations,
-        "duration": duration
+        "duration": duration,
+        "term_frequencies": parsed["term_frequencies"],
+        "entity_cooccurrence": entity_cooccurrence,
+        "pattern_budget": pattern_budget
     }
 
-def extract_contract_info(text, nlp):
-    """Extract basic contract information using NER and pattern matching"""
+def parse_text(text, nlp):
+    """Reduce a spaCy parse to plain sentences, entities tagged with their sentence and term counts"""
     doc = nlp(text)
     
+    # Count alphabetic tokens once so visualizations don't re-tokenize the text
+    term_frequencies = Counter(token.lower_ for token in doc if token.is_alpha)
+    
+    sentences = []
+    sentence_starts = []
+    for sent in doc.sents:
+        sentences.append(sent.text)
+        sentence_starts.append(sent.start)
+    
+    entities = []
+    for ent in doc.ents:
+        entities.append({
+            "text": ent.text,
+            "label": ent.label_,
+            "sentence": max(bisect_right(sentence_starts, ent.start) - 1, 0)
+        })
+    
+    return {"sentences": sentences, "entities": entities, "term_frequencies": dict(term_frequencies)}
+
+def parse_pages(pages, nlp):
+    """Parse a document page by page, reusing cached parses of unchanged pages"""
+    keys = [content_hash(page) for page in pages]
+    
+    # Only send pages that have not been parsed before through spaCy
+    page_parses = {key: PAGE_PARSE_CACHE.get(key) for key in keys}
+    for key, page in zip(keys, pages):
+        if page_parses[key] is None:
+            page_parses[key] = parse_text(page, nlp)
+            PAGE_PARSE_CACHE.set(key, page_parses[key])
+    
+    # Stitch the page parses together, shifting sentence numbers per page
+    parsed = {"sentences": [], "entities": [], "term_frequencies": Counter()}
+    for key in keys:
+        parsed["term_frequencies"].update(page_parses[key]["term_frequencies"])
+        offset = len(parsed["sentences"])
+        parsed["sentences"].extend(page_parses[key]["sentences"])
+        parsed["entities"].extend(
+            dict(entity, sentence=entity["sentence"] + offset)
+            for entity in page_parses[key]["entities"]
+        )
+    
+    parsed["term_frequencies"] = dict(parsed["term_frequencies"])
+    return parsed
+
+# Organization names that spaCy often tags on their own but are not parties
+COMMON_FALSE_POSITIVE_PARTIES = ['Inc', 'LLC', 'Ltd', 'Corporation', 'Company', 'Corp']
+
+def extract_contract_info(text, parsed, index=None):
+    """Extract basic contract information using NER and pattern matching"""
+    index = index or get_document_index(text)
+    
     # Extract parties using Named Entity Recognition
-    parties = [ent.text for ent in doc.ents if ent.label_ == "ORG"]
+    parties = [ent["text"] for ent in parsed["entities"] if ent["label"] == "ORG"]
     
     # Filter out duplicate parties and common false positives
     filtered_parties = []
-    common_false_positives = ['Inc', 'LLC', 'Ltd', 'Corporation', 'Company', 'Corp']
     
     for party in parties:
         # Skip if it's a common false positive
-        if party in common_false_positives:
+        if party in COMMON_FALSE_POSITIVE_PARTIES:
             continue
         
         # Skip if it's already in the filtered list
@@ -176,7 +204,7 @@ def extract_contract_info(text, nlp):
         filtered_parties.append(party)
     
     # Extract dates using NER
-    dates = [ent.text for ent in doc.ents if ent.label_ == "DATE"]
+    dates = [ent["text"] for ent in parsed["entities"] if ent["label"] == "DATE"]
     
     # Extract governing law clause using pattern matching
     law_pattern = r"governed by the laws of ([^,.;]*)"
@@ -192,7 +220,7 @@ def extract_contract_info(text, nlp):
     
     contract_type = None
     for ct in contract_types:
-        if re.search(ct, text, re.IGNORECASE):
+        if ct in index.lower:
             contract_type = ct.title()
             break
     
@@ -205,17 +233,35 @@ def extract_contract_info(text, nlp):
 
 def identify_risk_clauses(text, confidence_threshold=0.5):
     """Identify risk clauses and evaluate their risk level"""
-    results = {}
+    rules = get_rules()
+    return evaluate_clause_matches(find_clause_matches(text, rules=rules), confidence_threshold, rules)
+
+def find_clause_matches(text, index=None, time_budget=None, rules=None):
+    """
+    Find every risk clause pattern match along with its surrounding context and page
     
-    # Check each legal clause category
-    for category, clause_info in LEGAL_CLAUSES.items():
+    Patterns run through the linear-time proximity engine. With a time budget,
+    categories not reached before it runs out are marked as skipped.
+    """
+    index = index or get_document_index(text)
+    rules = rules or get_rules()
+    deadline = time.perf_counter() + time_budget if time_budget is not None else None
+    matches_by_category = {}
+    
+    # Check each legal clause category with the rule pack's precompiled matchers
+    for category, matchers in rules.clause_matchers.items():
+        if deadline is not None and time.perf_counter() > deadline:
+            matches_by_category[category] = {"patterns": [], "contexts": [], "pages": [], "offsets": [], "skipped": True}
+            continue
+        
         found_patterns = []
         clause_text = []
+        clause_pages = []
+        clause_offsets = []
         
         # Check each pattern in this category
-        for pattern in clause_info["patterns"]:
-            matches = re.finditer(pattern, text, re.IGNORECASE)
-            for match in matches:
+        for pattern, matcher in matchers:
+            for match in matcher.finditer(text, index.layout):
                 # Extract the matching text and surrounding context
                 start = max(0, match.start() - 100)
                 end = min(len(text), match.end() + 100)
@@ -223,21 +269,55 @@ def identify_risk_clauses(text, confidence_threshold=0.5):
                 
                 found_patterns.append(pattern)
                 clause_text.append(context)
+                clause_pages.append(index.page_of(match.start()))
+                clause_offsets.append(match.start())
+        
+        matches_by_category[category] = {
+            "patterns": found_patterns,
+            "contexts": clause_text,
+            "pages": clause_pages,
+            "offsets": clause_offsets
+        }
+    
+    return matches_by_category
+
+def evaluate_clause_matches(clause_matches, confidence_threshold=0.5, rules=None):
+    """Turn raw clause matches into risk findings"""
+    rules = rules or get_rules()
+    results = {}
+    
+    for category, clause_info in rules.legal_clauses.items():
+        # Categories added by a newer pack than the matches were made with
+        if category not in clause_matches:
+            continue
+        found_patterns = clause_matches[category]["patterns"]
+        clause_text = clause_matches[category]["contexts"]
         
+        # Categories the time budget didn't reach are neither found nor missing
+        if clause_matches[category].get("skipped"):
+            results[category] = {
+                "found": False,
+                "patterns_matched": [],
+                "risk_level": "N/A",
+                "skipped": True,
+                "description": f"{category} was not checked because the pattern time budget ran out."
+            }
         # If patterns were found, evaluate risk level
-        if found_patterns:
+        elif found_patterns:
             risk_level = evaluate_risk_level(category, clause_text, clause_info["risk_levels"])
             
             # Generate description and recommendation
             description = f"Found {len(found_patterns)} instances of {category} language."
-            recommendation = generate_recommendation(category, risk_level)
+            recommendation = generate_recommendation(category, risk_level, rules)
             
             results[category] = {
                 "found": True,
                 "patterns_matched": found_patterns,
                 "risk_level": risk_level,
                 "description": description,
-                "recommendation": recommendation
+                "recommendation": recommendation,
+                "pages": sorted({page for page in clause_matches[category].get("pages", []) if page}),
+                "offsets": sorted(set(clause_matches[category].get("offsets", [])))
             }
         else:
             # If no patterns found, check if this is itself a risk
@@ -265,147 +345,162 @@ def evaluate_risk_level(category, clause_texts, risk_levels):
     # Default to medium risk if found but can't determine specifics
     default_risk = "Medium"
     
+    # Lowercase each context once rather than once per keyword check
+    lowered_texts = [text.lower() for text in clause_texts]
+    
     # Special handling for different clause types
     if category == "Indemnification":
         # Check if indemnification is unlimited
-        if any("unlimited" in text.lower() or "all" in text.lower() for text in clause_texts):
+        if any("unlimited" in text or "all" in text for text in lowered_texts):
             return risk_levels.get("unlimited", default_risk)
         # Check if indemnification has a cap
-        elif any("cap" in text.lower() or "limit" in text.lower() for text in clause_texts):
+        elif any("cap" in text or "limit" in text for text in lowered_texts):
             return risk_levels.get("cap", default_risk)
         # Check if indemnification is mutual
-        elif any("mutual" in text.lower() or "both parties" in text.lower() for text in clause_texts):
+        elif any("mutual" in text or "both parties" in text for text in lowered_texts):
             return risk_levels.get("mutual", default_risk)
     
     elif category == "Limitation of Liability":
         # Check if liability is capped low
-        if any(re.search(r"limited to .* (less than|equal to) \$?\d{1,6}", text) for text in clause_texts):
+        low_cap = compile_pattern(r"limited to .* (less than|equal to) \$?\d{1,6}", 0)
+        if any(low_cap.search(text) for text in clause_texts):
             return risk_levels.get("low_cap", default_risk)
         # Check if liability cap is reasonable
-        elif any("cap" in text.lower() or "limit" in text.lower() for text in clause_texts):
+        elif any("cap" in text or "limit" in text for text in lowered_texts):
             return risk_levels.get("reasonable_cap", default_risk)
         # Check if consequential damages are waived
-        elif any("consequential" in text.lower() and "waive" in text.lower() for text in clause_texts):
+        elif any("consequential" in text and "waive" in text for text in lowered_texts):
             return risk_levels.get("waived_consequential", default_risk)
     
     elif category == "Termination":
         # Check if termination is at will
-        if any("at will" in text.lower() or "any reason" in text.lower() for text in clause_texts):
+        if any("at will" in text or "any reason" in text for text in lowered_texts):
             return risk_levels.get("at_will", default_risk)
         # Check if termination requires cause
-        elif any("with cause" in text.lower() or "for cause" in text.lower() for text in clause_texts):
+        elif any("with cause" in text or "for cause" in text for text in lowered_texts):
             return risk_levels.get("with_cause", default_risk)
         # Check if termination rights are mutual
-        elif any("mutual" in text.lower() or "both parties" in text.lower() for text in clause_texts):
+        elif any("mutual" in text or "both parties" in text for text in lowered_texts):
             return risk_levels.get("mutual", default_risk)
     
     # Return default risk level if specific conditions aren't matched
     return default_risk
 
-def generate_recommendation(category, risk_level):
+def generate_recommendation(category, risk_level, rules=None):
     """Generate a recommendation based on clause category and risk level"""
-    recommendations = {
-        "Indemnification": {
-            "High": "Consider negotiating for a cap on indemnification obligations or excluding certain types of damages.",
-            "Medium": "Review the indemnification provisions for fair allocation of risk between parties.",
-            "Low": "Mutual indemnification provides balanced protection. No immediate action needed."
-        },
-        "Limitation of Liability": {
-            "High": "Negotiate for a reasonable liability cap that's proportional to the contract value.",
-            "Medium": "Consider clarifying which types of damages are excluded and ensure adequate protection.",
-            "Low": "Current limitation of liability appears reasonable. Regular review recommended."
-        },
-        "Termination": {
-            "High": "Negotiate for more balanced termination rights or longer notice periods.",
-            "Medium": "Ensure termination for cause definitions are clear and reasonable.",
-            "Low": "Termination provisions appear balanced. No immediate action needed."
-        },
-        "Intellectual Property": {
-            "High": "Consider negotiating for a license rather than full transfer of IP rights.",
-            "Medium": "Clarify the scope of IP rights being transferred or licensed.",
-            "Low": "IP provisions appear to provide adequate protection. Regular review recommended."
-        },
-        "Confidentiality": {
-            "High": "Strengthen confidentiality provisions with clearer definitions and longer terms.",
-            "Medium": "Review confidentiality terms to ensure adequate protection of sensitive information.",
-            "Low": "Confidentiality provisions appear comprehensive. No immediate action needed."
-        },
-        "Governing Law": {
-            "High": "Consider negotiating for a more favorable or neutral jurisdiction.",
-            "Medium": "Evaluate the implications of the current governing law on potential disputes.",
-            "Low": "Current jurisdiction appears favorable. No immediate action needed."
-        },
-        "Force Majeure": {
-            "High": "Add a comprehensive force majeure clause to mitigate risks from unforeseeable events.",
-            "Medium": "Expand the force majeure clause to cover additional scenarios relevant to your business.",
-            "Low": "Force majeure provisions appear comprehensive. No immediate action needed."
-        },
-        "Payment Terms": {
-            "High": "Negotiate for more favorable payment terms or longer payment periods.",
-            "Medium": "Review payment terms to ensure they align with cash flow requirements.",
-            "Low": "Payment terms appear favorable. No immediate action needed."
-        }
-    }
+    rules = rules or get_rules()
+    recommendations = rules.legal_clauses.get(category, {}).get("recommendations", {})
     
     # Return recommendation if available, otherwise a generic one
-    return recommendations.get(category, {}).get(risk_level, 
+    return recommendations.get(risk_level, 
         f"Review the {category} clause and consider consulting with legal counsel regarding the {risk_level.lower()} risk level.")
 
-def extract_contract_value(text):
-    """Extract contract value information"""
-    # Patterns for different ways contract values might be expressed
-    value_patterns = [
-        r"contract value of \$?([0-9,\.]+)",
-        r"total value of \$?([0-9,\.]+)",
-        r"agreement .* worth \$?([0-9,\.]+)",
-        r"consideration of \$?([0-9,\.]+)",
-        r"fee of \$?([0-9,\.]+)",
-        r"amount of \$?([0-9,\.]+)"
-    ]
+def extract_contract_value(text, index=None, rules=None):
+    """Extract contract value information from the document's numeric index"""
+    index = index or get_document_index(text)
+    numbers = get_numeric_index(text, rules or get_rules())
     
-    for pattern in value_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            value = match.group(1).replace(',', '')
-            try:
-                return f"${float(value):,.2f}"
-            except ValueError:
-                return None
+    # Ways contract values might be expressed, most specific first
+    for label in VALUE_LABELS:
+        amounts = numbers.amounts(label)
+        if label == "Worth":
+            # "... worth $X" only counts in a sentence about the agreement
+            amounts = [entity for entity in amounts if follows_agreement(index, entity.label_start)]
+        if amounts:
+            return format_amount(amounts[0])
     
     return None
 
-def extract_obligations(text, nlp):
+def follows_agreement(index, offset):
+    """Whether "agreement" appears earlier on the same line, within MAX_GAP_WORDS words"""
+    line_start = index.text.rfind("\n", 0, offset) + 1
+    mention = index.lower.rfind("agreement ", line_start, offset)
+    if mention < 0:
+        return False
+    word_starts, _ = index.layout
+    return bisect_right(word_starts, offset) - bisect_right(word_starts, mention + len("agreement")) <= MAX_GAP_WORDS
+
+# Terms that mark a sentence as stating an obligation (plain substring match)
+OBLIGATION_TERMS = ["shall", "must", "required to", "agrees to", "will"]
+OBLIGATION_PATTERN = re.compile("|".join(re.escape(term) for term in OBLIGATION_TERMS))
+
+def extract_obligations(parsed):
     """Extract key obligations for each party"""
-    obligations = defaultdict(list)
+    # Extract parties if possible, keeping the first occurrence of each
+    parties = list(dict.fromkeys(ent["text"] for ent in parsed["entities"] if ent["label"] == "ORG"))
     
-    # Process text with spaCy
-    doc = nlp(text)
+    # Detect obligation sentences once instead of once per party
+    obligation_sentences = []
+    lowered_sentences = []
+    for sentence in parsed["sentences"]:
+        sent_text = sentence.lower()
+        if OBLIGATION_PATTERN.search(sent_text):
+            obligation_sentences.append(sentence)
+            lowered_sentences.append(sent_text)
     
-    # Extract parties if possible
-    parties = [ent.text for ent in doc.ents if ent.label_ == "ORG"]
+    # Build the party-to-sentence index in a single pass over obligation sentences
+    party_index = build_party_index(parties, lowered_sentences)
     
-    # If parties were found, look for their obligations
-    if parties:
-        for party in parties:
-            # Look for sentences containing the party and obligation indicators
-            for sent in doc.sents:
-                sent_text = sent.text.lower()
-                if party.lower() in sent_text and any(term in sent_text for term in 
-                                                    ["shall", "must", "required to", "agrees to", "will"]):
-                    obligations[party].append(sent.text)
+    obligations = {}
+    for party in parties:
+        sentence_ids = party_index.get(party.lower())
+        if sentence_ids:
+            obligations[party] = [obligation_sentences[i] for i in sentence_ids]
     
     # If no specific party obligations found, extract general obligations
-    if not any(obligations.values()):
-        obligation_sentences = []
-        for sent in doc.sents:
-            sent_text = sent.text.lower()
-            if any(term in sent_text for term in ["shall", "must", "required to", "agrees to", "will"]):
-                obligation_sentences.append(sent.text)
-        
-        if obligation_sentences:
-            obligations["General Obligations"] = obligation_sentences[:5]  # Limit to top 5
+    if not obligations and obligation_sentences:
+        obligations["General Obligations"] = obligation_sentences[:5]  # Limit to top 5
+    
+    return obligations
+
+def build_party_index(parties, lowered_sentences):
+    """Map each lowercased party name to the indices of the (lowercased) sentences mentioning it"""
+    keys = sorted({party.lower() for party in parties if party}, key=len, reverse=True)
+    if not keys:
+        return {}
+    
+    # A zero-width lookahead reports the longest party starting at every offset, so
+    # overlapping mentions are all seen; shorter names nested inside a match are
+    # resolved through the precomputed containment table below.
+    matcher = re.compile("(?=(" + "|".join(re.escape(key) for key in keys) + "))")
+    contained = {key: [other for other in keys if other in key] for key in keys}
+    
+    index = defaultdict(list)
+    for i, sentence in enumerate(lowered_sentences):
+        found = set()
+        for match in matcher.finditer(sentence):
+            longest = match.group(1)
+            if longest not in found:
+                found.update(contained[longest])
+        for key in found:
+            index[key].append(i)
+    
+    return index
+
+def extract_entity_cooccurrence(parsed):
+    """Count party mentions and sentence-level co-occurrences of party pairs"""
+    mentions = Counter()
+    pair_counts = Counter()
     
-    return dict(obligations)
+    # Group the distinct parties mentioned in each sentence
+    parties_by_sentence = defaultdict(set)
+    for ent in parsed["entities"]:
+        party = ent["text"]
+        if ent["label"] != "ORG" or party in COMMON_FALSE_POSITIVE_PARTIES or len(party) < 3:
+            continue
+        mentions[party] += 1
+        parties_by_sentence[ent["sentence"]].add(party)
+    
+    for sentence_parties in parties_by_sentence.values():
+        ordered = sorted(sentence_parties)
+        for i in range(len(ordered)):
+            for j in range(i + 1, len(ordered)):
+                pair_counts[(ordered[i], ordered[j])] += 1
+    
+    return {
+        "nodes": dict(mentions),
+        "edges": [[source, target, weight] for (source, target), weight in pair_counts.most_common()]
+    }
 
 def extract_contract_duration(text):
     """Extract information about contract duration"""
@@ -0,0 +1,106 @@
+# analysis/lexical_prefilter.py
+
+import math
+import os
+from collections import Counter, defaultdict
+from Analysis.document_index import TOKEN_PATTERN, normalize_case
+from utils.cache import LRUCache, content_hash
+
+# Sentences shortlisted per compliance category before semantic matching
+# (override with VAULTIQ_PREFILTER_TOP_N)
+PREFILTER_TOP_N = int(os.environ.get("VAULTIQ_PREFILTER_TOP_N", "50"))
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Terms are cut to this many characters, a cheap stemmer that maps
+# "processing"/"processor" or "safeguard"/"safeguards" to the same term
+STEM_CHARS = 6
+
+STOPWORDS = frozenset(
+    "a an and any are as at be by for from has have in is it its of on or shall "
+    "that the their this to which will with".split()
+)
+
+# Shortlists keyed by document and rule set; building them is cheap but
+# the budget check and the scoring both ask for them
+SHORTLIST_CACHE = LRUCache(max_entries=256, name="sentence_shortlists")
+
+def terms(text):
+    """Stemmed, lowercased word terms of text without stopwords"""
+    return [
+        token[:STEM_CHARS] for token in TOKEN_PATTERN.findall(normalize_case(text))
+        if token not in STOPWORDS and not token.isdigit()
+    ]
+
+class SentenceBM25:
+    """BM25 index over a document's sentences, each sentence scored as a document"""
+
+    def __init__(self, sentences):
+        self.postings = defaultdict(list)
+        self.lengths = []
+        for i, sentence in enumerate(sentences):
+            counts = Counter(terms(sentence))
+            self.lengths.append(sum(counts.values()))
+            for term, count in counts.items():
+                self.postings[term].append((i, count))
+        self.average_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+
+    def scores(self, query_terms):
+        """BM25 score of every sentence sharing at least one term with the query"""
+        scores = defaultdict(float)
+        count = len(self.lengths)
+        for term in set(query_terms):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for i, tf in postings:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[i] / (self.average_length or 1))
+                scores[i] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+def category_queries(rules):
+    """Query terms of each compliance category: its requirements' descriptions and phrases"""
+    return {
+        category: [
+            term for requirement in requirements
+            for text in [requirement["description"], *requirement["patterns"]]
+            for term in terms(text)
+        ]
+        for category, requirements in rules.compliance_requirements.items()
+    }
+
+def shortlist_sentences(sentences, rules, top_n=PREFILTER_TOP_N):
+    """
+    Pick the sentences worth sending to the sentence encoder
+
+    Args:
+        sentences: The document's sentences
+        rules: CompiledRules whose compliance requirements are matched
+        top_n: Most sentences kept per compliance category
+
+    Returns:
+        list: Sorted indexes of the union of every category's top_n
+            sentences by BM25 score (all sentences if there are no more
+            than top_n)
+    """
+    if len(sentences) <= top_n:
+        return list(range(len(sentences)))
+
+    bm25 = SentenceBM25(sentences)
+    shortlisted = set()
+    for query in category_queries(rules).values():
+        scores = bm25.scores(query)
+        shortlisted.update(sorted(scores, key=scores.get, reverse=True)[:top_n])
+    return sorted(shortlisted)
+
+def get_shortlist(text, sentences, rules, top_n=PREFILTER_TOP_N):
+    """shortlist_sentences for a document, reusing the result for the same text and rules"""
+    key = (content_hash(text), rules.fingerprint, top_n)
+    shortlist = SHORTLIST_CACHE.get(key)
+    if shortlist is None:
+        shortlist = shortlist_sentences(sentences, rules, top_n)
+        SHORTLIST_CACHE.set(key, shortlist)
+    return shortlist
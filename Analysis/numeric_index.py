@@ -0,0 +1,140 @@
+# analysis/numeric_index.py
+
+import re
+from bisect import bisect_left
+from collections import defaultdict, namedtuple
+from utils.cache import LRUCache, content_hash
+
+# Numeric indexes of recently analyzed documents, keyed by text and rule set
+NUMERIC_INDEX_CACHE = LRUCache(max_entries=64, name="numeric_indexes")
+
+# Labels of contract values, looked up in this order by the legal analyzer
+VALUE_LABELS = {
+    "Contract Value": r"contract value of",
+    "Total Value": r"total value of",
+    "Worth": r"\bworth",
+    "Consideration": r"consideration of",
+    "Fee": r"\bfee of",
+    "Amount": r"\bamount of"
+}
+
+SCALES = {
+    "thousand": 1e3, "k": 1e3,
+    "million": 1e6, "mn": 1e6, "m": 1e6,
+    "billion": 1e9, "bn": 1e9, "b": 1e9,
+    "trillion": 1e12
+}
+CURRENCIES = {"$": "USD", "usd": "USD", "€": "EUR", "eur": "EUR", "£": "GBP", "gbp": "GBP"}
+CURRENCY_SYMBOLS = {"USD": "$", "EUR": "€", "GBP": "£"}
+
+# A monetary or numeric expression: optional currency, the number (not part
+# of a word such as "FY2024"), an optional scale word and percent sign
+NUMBER_PATTERN = (
+    r"(?:(?P<currency>[$€£]|\b(?:USD|EUR|GBP)\b)\s?)?"
+    r"(?<![\w.,])(?P<number>\d(?:[\d,]*\d)?(?:\.\d+)?)"
+    r"(?:\s?(?P<scale>" + "|".join(sorted(SCALES, key=len, reverse=True)) + r")\b)?"
+    r"(?P<percent>\s?%)?"
+)
+
+# What may separate a label from the value it introduces, e.g. "Revenue of $5M"
+LABEL_CONNECTOR = re.compile(r"\s*(?:of|:)?\s*", re.IGNORECASE)
+
+NumericEntity = namedtuple(
+    "NumericEntity", "start end value number scale currency percent label label_start adjacent"
+)
+
+def compile_numeric_scanner(labels):
+    """
+    Compile label patterns and the number pattern into one scanner
+
+    Args:
+        labels: Ordered dict of label name -> regex; earlier labels win
+            where two would match at the same position
+
+    Returns:
+        tuple: (compiled scanner, label names by group number)
+    """
+    names = list(labels)
+    branches = [f"(?P<label{i}>{labels[name]})" for i, name in enumerate(names)]
+    branches.append(f"(?P<entity>{NUMBER_PATTERN})")
+    return re.compile("|".join(branches), re.IGNORECASE), names
+
+class NumericIndex:
+    """
+    Every monetary and numeric expression of a document, found in one scan
+
+    Each entity carries its scaled value, scale word, currency, position and
+    the nearest label before it. An entity is `adjacent` to its label when
+    only whitespace, "of" or ":" separates them; those are the values the
+    label's queries return.
+    """
+
+    def __init__(self, text, scanner, label_names):
+        self.text = text
+        self.entities = []
+        self._by_label = defaultdict(list)
+        self._label_starts = defaultdict(list)
+
+        label = label_start = label_end = None
+        for match in scanner.finditer(text):
+            group = match.lastgroup
+            if group != "entity":
+                label, label_start, label_end = label_names[int(group[5:])], match.start(), match.end()
+                continue
+
+            scale = (match.group("scale") or "").lower() or None
+            currency = match.group("currency")
+            number = float(match.group("number").replace(",", ""))
+            entity = NumericEntity(
+                start=match.start(),
+                end=match.end(),
+                value=number * SCALES.get(scale, 1),
+                number=number,
+                scale=scale,
+                currency=CURRENCIES[currency.lower()] if currency else None,
+                percent=bool(match.group("percent")),
+                label=label,
+                label_start=label_start,
+                adjacent=label is not None and LABEL_CONNECTOR.fullmatch(text, label_end, match.start()) is not None
+            )
+            self.entities.append(entity)
+            if entity.adjacent and not entity.percent:
+                self._by_label[label].append(entity)
+                self._label_starts[label].append(label_start)
+
+    def amounts(self, label):
+        """Amounts introduced by a label, in document order"""
+        return self._by_label.get(label, [])
+
+    def first(self, label):
+        """First amount introduced by a label, or None"""
+        amounts = self.amounts(label)
+        return amounts[0] if amounts else None
+
+    def first_after(self, label, offset):
+        """First amount whose label starts at or after offset, or None"""
+        amounts = self.amounts(label)
+        i = bisect_left(self._label_starts.get(label, []), offset)
+        return amounts[i] if i < len(amounts) else None
+
+def get_numeric_index(text, rules):
+    """
+    Return the numeric index of a document, scanning it on first request
+
+    Args:
+        text: The extracted text from the document
+        rules: CompiledRules providing the metric and value labels
+
+    Returns:
+        NumericIndex: Index shared by the financial and legal analyzers
+    """
+    key = (content_hash(text), rules.fingerprint)
+    index = NUMERIC_INDEX_CACHE.get(key)
+    if index is None:
+        index = NumericIndex(text, rules.numeric_scanner, rules.numeric_labels)
+        NUMERIC_INDEX_CACHE.set(key, index)
+    return index
+
+def format_amount(entity):
+    """Format an amount like '$5,200,000.00', in its own currency where stated"""
+    return f"{CURRENCY_SYMBOLS.get(entity.currency, '$')}{entity.value:,.2f}"
@@ -0,0 +1,190 @@
+# analysis/pattern_engine.py
+
+import re
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from Analysis.document_index import text_layout
+
+# Gap written in clause patterns as "left .* right"
+GAP = " .* "
+
+# Most words a gap may span; a clause phrase spread wider than this is not one clause
+MAX_GAP_WORDS = 30
+
+class ProximityMatch:
+    """Match of a `left .* right` pattern, with the groups of both sides"""
+
+    def __init__(self, text, left, right):
+        self.string = text
+        self.left = left
+        self.right = right
+
+    def start(self):
+        return self.left.start()
+
+    def end(self):
+        return self.right.end()
+
+    def span(self):
+        return self.start(), self.end()
+
+    def group(self, number=0):
+        if number == 0:
+            return self.string[self.start():self.end()]
+        left_groups = self.left.re.groups
+        if number <= left_groups:
+            return self.left.group(number)
+        return self.right.group(number - left_groups)
+
+class ProximityPattern:
+    """
+    A clause pattern whose `.*` gaps are matched by bounded word proximity
+
+    Each top-level alternative of the pattern is either a plain regex or a
+    `left .* right` pair. The plain alternatives are scanned as one regex;
+    the sides of each pair are scanned separately and paired up with binary
+    searches over word and line offsets. A gap matches when the right side
+    starts after the left side, on the same line (like `.` in the original)
+    and at most max_gap_words words later. Like the greedy `.*`, a left side
+    pairs with the farthest such right side, and scanning resumes after it.
+    No step backtracks over the text, so scan time grows linearly with
+    document length.
+    """
+
+    def __init__(self, pattern, flags=0, max_gap_words=MAX_GAP_WORDS):
+        self.pattern = pattern
+        self.max_gap_words = max_gap_words
+        plain, self.pairs = [], []
+        for branch in split_alternatives(pattern):
+            gap = split_gap(branch)
+            if gap:
+                left, right = gap
+                self.pairs.append((re.compile(left + " ", flags), re.compile(" " + right, flags)))
+            else:
+                plain.append(branch)
+        self.plain = re.compile("|".join(plain), flags) if plain else None
+
+    def finditer(self, text, layout=None):
+        """
+        Yield non-overlapping matches from left to right
+
+        Args:
+            text: Text to scan
+            layout: Optional (word_starts, line_breaks) offsets of the text,
+                e.g. DocumentIndex.layout, to avoid recomputing them
+        """
+        candidates = []
+        if self.plain is not None:
+            candidates.extend((match.start(), match) for match in self.plain.finditer(text))
+
+        if self.pairs:
+            word_starts, line_breaks = layout or text_layout(text)
+            for left_pattern, right_pattern in self.pairs:
+                rights = list(right_pattern.finditer(text))
+                right_starts = [match.start() for match in rights]
+                for left in left_pattern.finditer(text):
+                    i = bisect_left(right_starts, left.end())
+                    if i == len(rights):
+                        break
+                    # The right side may start up to the end of the line and
+                    # up to max_gap_words words after the left side
+                    limit = len(text)
+                    line_break = bisect_left(line_breaks, left.end())
+                    if line_break < len(line_breaks):
+                        limit = line_breaks[line_break]
+                    last_word = bisect_left(word_starts, left.end()) + self.max_gap_words
+                    if last_word < len(word_starts):
+                        limit = min(limit, word_starts[last_word])
+                    # Greedy like `.*`: take the farthest right side in range
+                    j = bisect_right(right_starts, limit) - 1
+                    if j >= i:
+                        candidates.append((left.start(), ProximityMatch(text, left, rights[j])))
+
+        # Keep the leftmost match at each point, like a single regex scan would
+        candidates.sort(key=lambda candidate: candidate[0])
+        position = 0
+        for start, match in candidates:
+            if start >= position:
+                position = max(match.end(), start + 1)
+                yield match
+
+    def search(self, text, layout=None):
+        """Return the first match, or None"""
+        return next(self.finditer(text, layout), None)
+
+@lru_cache(maxsize=None)
+def compile_pattern(pattern, flags=re.IGNORECASE, max_gap_words=MAX_GAP_WORDS):
+    """Compile (and cache) a clause pattern for linear-time matching"""
+    return ProximityPattern(pattern, flags, max_gap_words)
+
+def split_alternatives(pattern):
+    """Split a pattern like "(a|b .* c)" into its top-level alternatives"""
+    if pattern.startswith("(") and not pattern.startswith("(?") and closing_paren(pattern, 0) == len(pattern) - 1:
+        pattern = pattern[1:-1]
+
+    branches, depth, start, i = [], 0, 0, 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\":
+            i += 1
+        elif char == "[":
+            i = closing_bracket(pattern, i)
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "|" and depth == 0:
+            branches.append(pattern[start:i])
+            start = i + 1
+        i += 1
+    branches.append(pattern[start:])
+    return branches
+
+def split_gap(branch):
+    """Split "left .* right" at its first top-level gap, or return None"""
+    depth, i = 0, 0
+    while i < len(branch):
+        char = branch[i]
+        if char == "\\":
+            i += 1
+        elif char == "[":
+            i = closing_bracket(branch, i)
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif depth == 0 and branch.startswith(GAP, i):
+            return branch[:i], branch[i + len(GAP):]
+        i += 1
+    return None
+
+def closing_paren(pattern, open_index):
+    """Index of the parenthesis closing the one at open_index"""
+    depth, i = 0, open_index
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\":
+            i += 1
+        elif char == "[":
+            i = closing_bracket(pattern, i)
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+            if depth == 0:
+                return i
+        i += 1
+    return -1
+
+def closing_bracket(pattern, open_index):
+    """Index of the bracket closing a character class"""
+    i = open_index + 1
+    if i < len(pattern) and pattern[i] == "^":
+        i += 1
+    if i < len(pattern) and pattern[i] == "]":
+        i += 1
+    while i < len(pattern) and pattern[i] != "]":
+        if pattern[i] == "\\":
+            i += 1
+        i += 1
+    return i
@@ -0,0 +1,332 @@
+# analysis/rule_packs.py
+
+import hashlib
+import json
+import os
+import pickle
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from Analysis.document_index import normalize_case
+from Analysis.numeric_index import VALUE_LABELS, compile_numeric_scanner
+from Analysis.pattern_engine import compile_pattern
+
+# Versioned rule pack files shipped with the app (override with VAULTIQ_RULES_DIR)
+DEFAULT_RULES_DIR = os.environ.get(
+    "VAULTIQ_RULES_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rules")
+)
+
+# Compiled artifacts, one per distinct set of pack files (override with VAULTIQ_RULE_CACHE_DIR);
+# next to the packs rather than under the working directory, since they are unpickled on load
+DEFAULT_RULE_CACHE_DIR = os.environ.get(
+    "VAULTIQ_RULE_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "rule_cache")
+)
+
+RULE_PACK_FILES = {
+    "legal": "legal_clauses.json",
+    "compliance": "compliance_requirements.json",
+    "financial": "financial_patterns.json"
+}
+
+# Keys every pack must define, besides name and version
+REQUIRED_PACK_KEYS = {
+    "legal": ["clauses"],
+    "compliance": ["requirements"],
+    "financial": ["keywords", "periods"]
+}
+
+# Bump when the artifact layout changes so stale artifacts are rebuilt
+ARTIFACT_FORMAT = 1
+
+# Seconds between checks of the pack files for changes
+RULES_CHECK_INTERVAL = 5.0
+
+# Superseded rule sets kept alive for analyses that started before a swap
+KEEP_PREVIOUS_RULES = 4
+
+class LiteralAutomaton:
+    """
+    Finds every occurrence of a fixed set of lowercase phrases in one scan
+
+    The phrases are merged into a prefix trie written as a regex, so each
+    text position is tested against all phrases at once. A lookahead reports
+    the longest phrase starting at every position; shorter phrases that are
+    its prefixes are resolved through a precomputed table.
+    """
+
+    def __init__(self, phrases, source=None):
+        self.phrases = sorted(set(phrase for phrase in phrases if phrase))
+        self.source = source if source is not None else trie_regex(self.phrases)
+        self._regex = re.compile("(?=(" + self.source + "))") if self.phrases else None
+        self._prefixes = {
+            phrase: [other for other in self.phrases if phrase.startswith(other)]
+            for phrase in self.phrases
+        }
+
+    def first_offsets(self, lowered_text):
+        """Map every phrase that occurs in the (lowercased) text to its first offset"""
+        found = {}
+        if self._regex is None:
+            return found
+        for match in self._regex.finditer(lowered_text):
+            for phrase in self._prefixes[match.group(1)]:
+                found.setdefault(phrase, match.start())
+            if len(found) == len(self.phrases):
+                break
+        return found
+
+class CompiledRules:
+    """
+    Rule packs compiled into ready-to-use matchers
+
+    A CompiledRules object never changes after it is built (requirement
+    embeddings are only added), so analyses that hold one keep a consistent
+    rule set even when newer packs are swapped in.
+    """
+
+    def __init__(self, packs, fingerprint, automaton_source=None, embeddings=None, artifact_path=None):
+        self.packs = packs
+        self.fingerprint = fingerprint
+        self.version = ", ".join(f"{pack['name']} {pack['version']}" for pack in packs.values())
+        self.loaded_at = time.time()
+        self.artifact_path = artifact_path
+
+        self.legal_clauses = packs["legal"]["clauses"]
+        self.compliance_requirements = packs["compliance"]["requirements"]
+        self.financial_keywords = packs["financial"]["keywords"]
+        self.financial_periods = packs["financial"]["periods"]
+
+        try:
+            self.clause_matchers = {
+                category: [(pattern, compile_pattern(pattern)) for pattern in clause["patterns"]]
+                for category, clause in self.legal_clauses.items()
+            }
+            # Metric labels and contract value labels share one scan for numbers (see NumericIndex)
+            self.numeric_scanner, self.numeric_labels = compile_numeric_scanner(
+                {**self.financial_keywords, **VALUE_LABELS}
+            )
+            self.period_matchers = [re.compile(pattern) for pattern in self.financial_periods]
+        except re.error as e:
+            raise ValueError(f"Invalid pattern in rule packs: {e}") from e
+
+        self.phrase_automaton = LiteralAutomaton(
+            [normalize_case(phrase) for requirements in self.compliance_requirements.values()
+             for requirement in requirements for phrase in requirement["patterns"]],
+            automaton_source
+        )
+
+        self._embeddings = dict(embeddings or {})
+        self._lock = threading.Lock()
+
+    def requirement_embeddings(self, embedder, model_name):
+        """
+        Embeddings of every requirement's phrases, computed once per model
+
+        Returns:
+            dict: (category, requirement index) -> array with one row per phrase
+        """
+        with self._lock:
+            if model_name not in self._embeddings:
+                keys, phrases = [], []
+                for category, requirements in self.compliance_requirements.items():
+                    for i, requirement in enumerate(requirements):
+                        keys.append(((category, i), len(requirement["patterns"])))
+                        phrases.extend(requirement["patterns"])
+
+                # Encode every phrase in a single batch, then split per requirement
+                encoded = np.asarray(embedder.encode(phrases, convert_to_numpy=True), dtype=np.float32)
+                by_requirement, start = {}, 0
+                for key, count in keys:
+                    by_requirement[key] = encoded[start:start + count]
+                    start += count
+
+                self._embeddings[model_name] = by_requirement
+                self.save()
+            return self._embeddings[model_name]
+
+    def save(self):
+        """Write the compiled artifact so the next cold start can load it"""
+        if not self.artifact_path:
+            return
+        artifact = {
+            "format": ARTIFACT_FORMAT,
+            "fingerprint": self.fingerprint,
+            "packs": self.packs,
+            "automaton_source": self.phrase_automaton.source,
+            "embeddings": self._embeddings
+        }
+        try:
+            os.makedirs(os.path.dirname(self.artifact_path) or ".", exist_ok=True)
+            tmp_path = f"{self.artifact_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(artifact, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.artifact_path)
+        except OSError:
+            # A read-only deployment simply compiles on every cold start
+            pass
+
+def trie_regex(phrases):
+    """Build a regex matching any of the phrases, factored into a prefix trie"""
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[""] = {}
+    return _trie_pattern(trie)
+
+def _trie_pattern(node):
+    branches = [re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    # A phrase ending here makes the rest optional; greedy matching prefers the longer phrase
+    return f"(?:{body})?" if "" in node else body
+
+def read_rule_packs(rules_dir=DEFAULT_RULES_DIR):
+    """
+    Read and validate the rule pack files
+
+    Returns:
+        tuple: (packs by domain, fingerprint of the files' contents)
+    """
+    digest = hashlib.sha1()
+    packs = {}
+    for domain, filename in RULE_PACK_FILES.items():
+        path = os.path.join(rules_dir, filename)
+        with open(path, "rb") as f:
+            raw = f.read()
+        digest.update(raw)
+
+        try:
+            pack = json.loads(raw)
+        except ValueError as e:
+            raise ValueError(f"{filename} is not valid JSON: {e}") from e
+        missing = [key for key in ["name", "version"] + REQUIRED_PACK_KEYS[domain] if key not in pack]
+        if missing:
+            raise ValueError(f"{filename} is missing: {', '.join(missing)}")
+        packs[domain] = pack
+
+    return packs, digest.hexdigest()
+
+def load_compiled_rules(rules_dir=DEFAULT_RULES_DIR, cache_dir=DEFAULT_RULE_CACHE_DIR):
+    """Load the compiled artifact for the current pack files, compiling it if needed"""
+    packs, fingerprint = read_rule_packs(rules_dir)
+    artifact_path = os.path.join(cache_dir, f"{fingerprint}.pkl")
+
+    artifact = None
+    if os.path.exists(artifact_path):
+        try:
+            with open(artifact_path, "rb") as f:
+                artifact = pickle.load(f)
+        except Exception:
+            artifact = None
+
+    if artifact and artifact.get("format") == ARTIFACT_FORMAT and artifact.get("fingerprint") == fingerprint:
+        return CompiledRules(
+            artifact["packs"], fingerprint, artifact["automaton_source"], artifact["embeddings"], artifact_path
+        )
+
+    rules = CompiledRules(packs, fingerprint, artifact_path=artifact_path)
+    rules.save()
+    return rules
+
+_state_lock = threading.Lock()
+_current = None
+_previous = OrderedDict()
+_file_stamps = None
+_last_check = 0.0
+_last_error = None
+
+def _pack_file_stamps(rules_dir):
+    stamps = []
+    for filename in RULE_PACK_FILES.values():
+        try:
+            stat = os.stat(os.path.join(rules_dir, filename))
+            stamps.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            stamps.append(None)
+    return tuple(stamps)
+
+def reload_rules(force=False, rules_dir=DEFAULT_RULES_DIR):
+    """
+    Swap in the rule packs on disk if they changed
+
+    The new rule set is compiled before it replaces the current one, and the
+    previous sets stay reachable by fingerprint, so analyses already running
+    finish with the rules they started with.
+
+    Args:
+        force: Reload even if the pack files look unchanged
+        rules_dir: Directory holding the pack files
+
+    Returns:
+        CompiledRules: The rule set now in use
+
+    Raises:
+        ValueError: If the packs are invalid (the current rules stay in use)
+    """
+    global _current, _file_stamps, _last_check, _last_error
+
+    with _state_lock:
+        _last_check = time.monotonic()
+        stamps = _pack_file_stamps(rules_dir)
+        if _current is not None and not force and stamps == _file_stamps:
+            return _current
+
+        try:
+            rules = load_compiled_rules(rules_dir)
+        except (OSError, ValueError) as e:
+            _last_error = str(e)
+            raise ValueError(f"Could not load rule packs: {e}") from e
+
+        _file_stamps = stamps
+        _last_error = None
+        if _current is None or rules.fingerprint != _current.fingerprint:
+            if _current is not None:
+                _previous[_current.fingerprint] = _current
+                while len(_previous) > KEEP_PREVIOUS_RULES:
+                    _previous.popitem(last=False)
+            _current = rules
+        return _current
+
+def get_rules(fingerprint=None):
+    """
+    Return the rule set to analyze with
+
+    Args:
+        fingerprint: Optional fingerprint of a specific (possibly superseded)
+            rule set, e.g. the one a cached analysis was keyed on
+
+    Returns:
+        CompiledRules: That rule set if still available, otherwise the current one
+    """
+    if fingerprint is not None:
+        current = _current
+        if current is not None and current.fingerprint == fingerprint:
+            return current
+        rules = _previous.get(fingerprint)
+        if rules is not None:
+            return rules
+
+    # Pick up edited pack files every few seconds
+    if _current is None or time.monotonic() - _last_check >= RULES_CHECK_INTERVAL:
+        try:
+            return reload_rules()
+        except ValueError:
+            if _current is None:
+                raise
+    return _current
+
+def rules_status():
+    """Describe the rule set in use and the last reload error, if any"""
+    current = _current
+    return {
+        "version": current.version if current else None,
+        "fingerprint": current.fingerprint if current else None,
+        "loaded_at": current.loaded_at if current else None,
+        "error": _last_error
+    }
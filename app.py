@@ -1,10 +1,31 @@
 import streamlit as st
+import atexit
 import os
+import threading
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 from utils.file_processor import process_uploaded_file
-from utils.visualization import create_visualizations
+from utils.visualization import create_visualizations, create_portfolio_visualizations
+from utils.portfolio import expand_uploads, analyze_portfolio, aggregate_portfolio
 from Analysis.financial_analyzer import analyze_financials
 from Analysis.legal_analyzer import analyze_legal_document
-from Analysis.compliance_checker import check_compliance
+from Analysis.compliance_checker import (
+    check_compliance, embed_document_sentences, embed_query, encoding_within_budget
+)
+from utils.version_tracker import document_key, build_version, compare_versions
+from utils.cache import cache_stats, content_hash
+from utils.budget import clear_degradation, degradations_for, document_budget, record_degradation
+from utils.result_store import (
+    open_store, build_record, save_results, update_compliance, count_documents,
+    query_risk_clauses, query_compliance, query_metrics
+)
+from utils.search_index import open_search_index, index_document, search_pages
+from utils.vector_index import VectorIndex
+from Analysis.document_index import get_document_index
+from Analysis.rule_packs import get_rules, reload_rules, rules_status
+from utils.exporter import ResultExporter
+from utils.document_viewer import (
+    TABLE_PAGE_ROWS, plan_views, view_label, collect_findings, findings_by_view
+)
 
 # Automatically create `.streamlit/config.toml` if it doesn't exist
 config_dir = ".streamlit"
@@ -32,6 +53,58 @@ st.set_page_config(
     layout="wide"
 )
 
+@st.cache_resource
+def get_result_store():
+    """Open the local results database once per server process"""
+    return open_store()
+
+@st.cache_resource
+def get_search_index():
+    """Open the full-text page index once per server process"""
+    return open_search_index()
+
+@st.cache_resource
+def get_vector_index():
+    """Load the clause vector index once per server process, saving pending changes at exit"""
+    index = VectorIndex.load()
+    atexit.register(index.flush)
+    return index
+
+def add_to_vector_index(doc_hash, filename, text):
+    """
+    Store a document's sentence embeddings for cross-document clause retrieval
+    
+    Every sentence is indexed, so clauses the compliance prefilter passes
+    over (indemnities, liability caps...) can still be found; sentences the
+    compliance check already encoded are reused. Must run inside the
+    document's budget: if encoding the rest would not fit, the document is
+    left out of the index and the skip is reported as a degradation.
+    """
+    index = get_vector_index()
+    if index.contains_document(doc_hash):
+        return
+    
+    # A re-uploaded file with new content replaces its earlier version
+    index.replace_filename(filename, doc_hash)
+    
+    document_index = get_document_index(text)
+    within_budget, reason = encoding_within_budget(document_index.sentences, "indexing")
+    if not within_budget:
+        record_degradation("indexing", f"Not added to the similar-clause index ({reason})")
+        return
+    clear_degradation("indexing")
+    
+    sentences, embeddings = embed_document_sentences(text)
+    if embeddings is None:
+        return
+    
+    index.add(embeddings, [
+        {"doc_hash": doc_hash, "filename": filename, "sentence": i, "offset": start, "text": sentence}
+        for i, (sentence, (start, _)) in enumerate(zip(sentences, document_index.sentence_spans))
+    ])
+    # Saves are batched; a portfolio run flushes once at the end
+    index.save_if_due()
+
 def main():
     # App header
     st.title("VaultIQ: Legal & Finance")
@@ -48,13 +121,38 @@ def main():
             ["Comprehensive", "Financial Focus", "Legal Focus", "Compliance Focus"]
         )
         
+        portfolio_mode = st.checkbox(
+            "Portfolio mode",
+            value=False,
+            help="Analyze many documents or a ZIP archive at once and aggregate the results"
+        )
+        
         st.header("Advanced Settings")
         confidence_threshold = st.slider("Confidence Threshold", 0.0, 1.0, 0.5)
         enable_ocr = st.checkbox("Enable OCR for scanned documents", value=True)
+        save_to_store = st.checkbox(
+            "Save results to local database",
+            value=True,
+            help="Store analysis results and page text so they can be queried and searched later without re-running analysis"
+        )
+        track_versions = st.checkbox(
+            "Track document versions",
+            value=False,
+            help="Compare new uploads against the previously analyzed version of the same document and only re-analyze changed pages"
+        )
+        index_clauses = st.checkbox(
+            "Index clauses for similarity search",
+            value=False,
+            help="Add each document's sentences to the index behind \"Find Similar Clauses\"; costs extra encoding time per document"
+        )
         
         st.markdown("---")
         st.info("This app uses AI techniques to analyze documents. Results should be reviewed by professionals.")
 
+    if portfolio_mode:
+        show_portfolio(enable_ocr, confidence_threshold, save_to_store, index_clauses)
+        return
+    
     # File upload area
     uploaded_file = st.file_uploader(
         "Upload a contract or financial report:", 
@@ -63,9 +161,35 @@ def main():
     )
 
     if uploaded_file:
-        # Process the file to extract text and tables
-        with st.spinner("Processing document..."):
-            text, tables = process_uploaded_file(uploaded_file, enable_ocr=enable_ocr)
+        # Stages close to the document's time or memory budget fall back to cheaper paths
+        with document_budget() as budget:
+            # Process the file to extract text and tables
+            with st.spinner("Processing document..."):
+                text, tables, pages = process_uploaded_file(uploaded_file, enable_ocr=enable_ocr)
+                budget.attach(text)
+                # Index the text once with its page boundaries; every analyzer reuses it
+                get_document_index(text, pages)
+            
+            # Run the (cached) analyses up front so the overview can link to their findings
+            with st.spinner("Analyzing document..."):
+                financial_results = analyze_financials(text, tables)
+                # In version-aware mode, parse page by page so unchanged pages are reused
+                legal_results = analyze_legal_document(
+                    text, confidence_threshold, pages=pages if track_versions else None
+                )
+                compliance_results = check_compliance(text, confidence_threshold)
+            
+            # Indexing runs within the budget so its encoding time counts too
+            if index_clauses:
+                add_to_vector_index(content_hash(text), uploaded_file.name, text)
+        
+        # Say which stages took a cheaper path, also when served from cache on a rerun
+        degradations = degradations_for(text)
+        if degradations:
+            st.warning(
+                "Some stages were degraded to stay within their time or memory budget:\n"
+                + "\n".join(f"- **{stage.title()}**: {detail}" for stage, detail in degradations.items())
+            )
         
         # Display tabs for different analysis views
         tab1, tab2, tab3, tab4, tab5 = st.tabs([
@@ -77,17 +201,9 @@ def main():
         ])
         
         with tab1:
-            st.subheader("Document Preview")
-            with st.expander("Raw Text", expanded=False):
-                st.text_area("Extracted Text", text, height=200)
-            
-            if tables and len(tables) > 0:
-                st.subheader(f"Extracted Tables ({len(tables)})")
-                for i, table in enumerate(tables):
-                    st.dataframe(table)
+            show_document_viewer(text, pages, tables, legal_results, compliance_results)
         
         with tab2:
-            financial_results = analyze_financials(text, tables)
             st.subheader("Financial Metrics")
             if financial_results["metrics"]:
                 metrics_col1, metrics_col2 = st.columns(2)
@@ -106,8 +222,6 @@ def main():
                 st.info("No trend data available.")
                 
         with tab3:
-            legal_results = analyze_legal_document(text, confidence_threshold)
-            
             st.subheader("Contract Information")
             if legal_results["contract_info"]["parties"]:
                 st.write("**Parties Involved:**", ", ".join(legal_results["contract_info"]["parties"]))
@@ -117,17 +231,23 @@ def main():
                 st.write("**Governing Law:**", legal_results["contract_info"]["governing_law"])
                 
             st.subheader("Risk Analysis")
+            pattern_budget = legal_results.get("pattern_budget", {})
+            if pattern_budget.get("exceeded"):
+                st.warning(
+                    f"Clause scanning stopped after {pattern_budget['elapsed_seconds']:.1f}s; not checked: "
+                    + ", ".join(pattern_budget["skipped_categories"])
+                )
             for category, details in legal_results["risk_clauses"].items():
                 if details["found"]:
                     with st.expander(f"⚠️ {category}", expanded=True):
                         st.markdown(f"**Risk Level:** {details['risk_level']}")
                         st.markdown(f"**Findings:** {details['description']}")
+                        if details.get("pages"):
+                            st.markdown(f"**Pages:** {', '.join(map(str, details['pages']))}")
                         if details.get("recommendation"):
                             st.markdown(f"**Recommendation:** {details['recommendation']}")
         
         with tab4:
-            compliance_results = check_compliance(text, confidence_threshold)
-            
             st.subheader("Compliance Status")
             if compliance_results["overall_compliant"]:
                 st.success("✅ Document appears to be compliant with standard regulations")
@@ -138,7 +258,8 @@ def main():
                 with st.expander(f"{category} Requirements"):
                     for check in checks:
                         if check["compliant"]:
-                            st.markdown(f"✅ {check['description']}")
+                            page_note = f" (page {check['page']})" if check.get("page") else ""
+                            st.markdown(f"✅ {check['description']}{page_note}")
                         else:
                             st.markdown(f"❌ {check['description']}")
                             st.markdown(f"_Suggestion: {check['recommendation']}_")
@@ -146,6 +267,329 @@ def main():
         with tab5:
             st.subheader("Document Insights")
             create_visualizations(text, financial_results, legal_results)
+        
+        if track_versions:
+            show_version_changes(uploaded_file.name, pages, legal_results, compliance_results)
+        
+        # Store each document once per session rather than on every rerun; a
+        # threshold change only rewrites its compliance rows
+        if save_to_store:
+            doc_hash = content_hash(text)
+            stored = st.session_state.setdefault("stored_thresholds", {})
+            if doc_hash not in stored:
+                record = build_record(uploaded_file.name, text, pages, financial_results, legal_results, compliance_results)
+                save_results(get_result_store(), [record])
+                index_document(get_search_index(), doc_hash, uploaded_file.name, pages)
+            elif stored[doc_hash] != confidence_threshold:
+                update_compliance(get_result_store(), doc_hash, compliance_results)
+            stored[doc_hash] = confidence_threshold
+    else:
+        show_archive_search()
+        show_similar_clauses()
+        show_saved_results()
+
+def show_document_viewer(text, pages, tables, legal_results, compliance_results):
+    """Page through the extracted text and tables, sending only what is on screen"""
+    views = plan_views(text, get_document_index(text, pages), pages)
+    findings = findings_by_view(views, collect_findings(legal_results, compliance_results))
+    
+    # Start at the top whenever a different document is shown
+    doc_hash = content_hash(text)
+    if st.session_state.get("viewer_document") != doc_hash:
+        st.session_state["viewer_document"] = doc_hash
+        st.session_state["viewer_view"] = 0
+        st.session_state["viewer_jump"] = None
+    
+    st.subheader("Document Preview")
+    if findings:
+        def jump_to_finding():
+            if st.session_state["viewer_jump"] is not None:
+                st.session_state["viewer_view"] = st.session_state["viewer_jump"]
+        
+        st.selectbox(
+            "Jump to finding",
+            sorted(findings),
+            index=None,
+            format_func=lambda i: f"{view_label(views[i])}: {', '.join(findings[i])}",
+            placeholder="Pages with risk clauses or compliance hits",
+            key="viewer_jump",
+            on_change=jump_to_finding
+        )
+    
+    if len(views) > 1:
+        st.select_slider(
+            "Page", options=range(len(views)), format_func=lambda i: view_label(views[i]), key="viewer_view"
+        )
+    position = st.session_state["viewer_view"] if len(views) > 1 else 0
+    view = views[position]
+    
+    # Only the visible window of text goes to the browser
+    st.caption(f"Characters {view['start']:,}–{view['end']:,} of {len(text):,}")
+    st.text_area("Extracted Text", text[view["start"]:view["end"]], height=300)
+    labels = findings.get(position)
+    if labels:
+        st.markdown("**Findings here:** " + "; ".join(labels))
+    
+    if tables and len(tables) > 0:
+        st.subheader(f"Extracted Tables ({len(tables)})")
+        # Load one table, and one slice of its rows, at a time
+        number = st.selectbox(
+            "Table",
+            range(len(tables)),
+            format_func=lambda i: f"Table {i + 1} ({len(tables[i])} rows × {len(tables[i].columns)} columns)"
+        )
+        table = tables[number]
+        if len(table) > TABLE_PAGE_ROWS:
+            row_pages = -(-len(table) // TABLE_PAGE_ROWS)
+            row_page = st.number_input("Rows page", min_value=1, max_value=row_pages, value=1)
+            table = table.iloc[(row_page - 1) * TABLE_PAGE_ROWS:row_page * TABLE_PAGE_ROWS]
+        st.dataframe(table)
+
+def show_similar_clauses():
+    """Semantic search for clauses similar to a given piece of language"""
+    index = get_vector_index()
+    if not len(index):
+        return
+    
+    with st.expander(f"🧭 Find Similar Clauses ({len(index)} sentences indexed)", expanded=False):
+        clause = st.text_area(
+            "Clause language",
+            placeholder="e.g. The Supplier shall indemnify and hold harmless the Customer against all losses...",
+            height=100
+        )
+        top_k = st.slider("Results", 5, 50, 10)
+        if not clause.strip():
+            return
+        
+        for hit in index.search(embed_query(clause), k=top_k):
+            st.markdown(f"**{hit['filename']}** — similarity {hit['score']:.2f}")
+            st.caption(hit["text"])
+
+def show_archive_search():
+    """Full-text search over the page text of previously processed documents"""
+    with st.expander("🔎 Search Document Archive", expanded=False):
+        query = st.text_input(
+            "Search clauses",
+            placeholder='e.g. "net 90", "governed by the laws of Delaware", indemnif*',
+            help='Use quotes for exact phrases and * for prefixes'
+        )
+        if not query:
+            return
+        
+        try:
+            hits = search_pages(get_search_index(), query)
+        except ValueError as e:
+            st.warning(str(e))
+            return
+        
+        if not hits:
+            st.info("No matching pages found.")
+        for hit in hits:
+            st.markdown(f"**{hit['filename']}** — page {hit['page']}")
+            st.caption(hit["snippet"])
+
+def show_saved_results():
+    """Query results stored by earlier analysis runs"""
+    conn = get_result_store()
+    total = count_documents(conn)
+    if not total:
+        return
+    
+    rules = get_rules()
+    with st.expander(f"🗄️ Query Saved Results ({total} documents)", expanded=False):
+        view = st.radio("Search by", ["Risk Clauses", "Compliance", "Financial Metrics"], horizontal=True)
+        
+        if view == "Risk Clauses":
+            col1, col2 = st.columns(2)
+            category = col1.selectbox("Category", ["Any"] + list(rules.legal_clauses.keys()))
+            risk_level = col2.selectbox("Risk Level", ["Any", "High", "Medium", "Low"])
+            results = query_risk_clauses(
+                conn,
+                category=None if category == "Any" else category,
+                risk_level=None if risk_level == "Any" else risk_level
+            )
+        elif view == "Compliance":
+            requirements = [req["description"] for reqs in rules.compliance_requirements.values() for req in reqs]
+            col1, col2 = st.columns(2)
+            requirement = col1.selectbox("Requirement", ["Any"] + requirements)
+            status = col2.selectbox("Status", ["Missing", "Compliant", "Any"])
+            results = query_compliance(
+                conn,
+                requirement=None if requirement == "Any" else requirement,
+                compliant=None if status == "Any" else status == "Compliant"
+            )
+        else:
+            col1, col2, col3 = st.columns(3)
+            metric = col1.selectbox("Metric", ["Any"] + list(rules.financial_keywords.keys()))
+            min_value = col2.number_input("Minimum", value=None)
+            max_value = col3.number_input("Maximum", value=None)
+            results = query_metrics(
+                conn,
+                metric=None if metric == "Any" else metric,
+                min_value=min_value,
+                max_value=max_value
+            )
+        
+        st.dataframe(results, hide_index=True, use_container_width=True)
+
+def show_portfolio(enable_ocr, confidence_threshold, save_to_store=False, index_clauses=False):
+    """Analyze a batch of documents in parallel and show aggregated results"""
+    uploaded_files = st.file_uploader(
+        "Upload contracts, financial reports or ZIP archives:",
+        type=["pdf", "txt", "docx", "zip"],
+        accept_multiple_files=True,
+        help="Supported formats: PDF, TXT, DOCX, and ZIP archives containing them"
+    )
+    
+    if not uploaded_files:
+        return
+    
+    documents = expand_uploads(uploaded_files)
+    if not documents:
+        st.warning("No supported documents found in the upload.")
+        return
+    
+    export_results = st.checkbox(
+        "Export results",
+        value=False,
+        help="Stream every document's results to JSON Lines and Parquet files on the server as it is analyzed"
+    )
+    # Export each batch once per session rather than on every rerun
+    exported = st.session_state.setdefault("exported_portfolios", {})
+    export_key = (tuple(document.name for document in documents), confidence_threshold)
+    exporter = ResultExporter() if export_results and export_key not in exported else None
+    
+    # Worker threads need the script context to use Streamlit caches
+    ctx = get_script_run_ctx()
+    progress = st.progress(0.0, text=f"Analyzing {len(documents)} documents...")
+    
+    def update_progress(completed, total, name):
+        progress.progress(completed / total, text=f"Analyzed {completed}/{total}: {name}")
+    
+    search_index = get_search_index() if save_to_store else None
+    
+    def index_pages(name, text, pages):
+        index_document(search_index, content_hash(text), name, pages)
+    
+    # Sentences are indexed after the compliance check, reusing what it encoded
+    def finish_document(name, text, pages, *results):
+        if index_clauses:
+            add_to_vector_index(content_hash(text), name, text)
+        if exporter:
+            exporter.write(name, text, pages, *results)
+    
+    portfolio = analyze_portfolio(
+        documents,
+        enable_ocr=enable_ocr,
+        confidence_threshold=confidence_threshold,
+        initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx),
+        progress_callback=update_progress,
+        on_extracted=index_pages if save_to_store else None,
+        on_analyzed=finish_document if exporter or index_clauses else None
+    )
+    progress.empty()
+    
+    if exporter:
+        exporter.close()
+        exported[export_key] = (exporter.documents, exporter.directory)
+    if export_results and export_key in exported:
+        count, directory = exported[export_key]
+        st.success(f"Exported {count} documents to {directory}")
+    
+    if save_to_store and portfolio["records"]:
+        save_results(get_result_store(), portfolio["records"])
+    if index_clauses:
+        get_vector_index().flush()
+    
+    analyzed = portfolio["risks"]["document"].nunique()
+    st.subheader(f"Portfolio Overview ({analyzed} documents)")
+    if not portfolio["failures"].empty:
+        with st.expander(f"⚠️ {len(portfolio['failures'])} documents could not be analyzed"):
+            st.dataframe(portfolio["failures"], use_container_width=True)
+    if not portfolio["degraded"].empty:
+        degraded_documents = portfolio["degraded"]["document"].nunique()
+        with st.expander(f"⚠️ {degraded_documents} documents were analyzed with degraded stages"):
+            st.dataframe(portfolio["degraded"], use_container_width=True)
+    
+    create_portfolio_visualizations(aggregate_portfolio(portfolio))
+
+def show_version_changes(filename, pages, legal_results, compliance_results):
+    """Diff this upload against the last analyzed version of the same document"""
+    history = st.session_state.setdefault("document_versions", {}).setdefault(document_key(filename), [])
+    current = build_version(filename, pages, legal_results, compliance_results)
+    
+    # Reruns of the same version replace its entry instead of adding a new one
+    if history and history[-1]["page_hashes"] == current["page_hashes"]:
+        history[-1] = current
+    else:
+        history.append(current)
+    
+    st.markdown("---")
+    st.subheader("🔁 Changes Since Previous Version")
+    
+    if len(history) < 2:
+        st.info("First analyzed version of this document. Upload a revision to compare.")
+        return
+    
+    changes = compare_versions(history[-2], current)
+    page_changes = changes["pages"]
+    
+    st.markdown(f"Compared against **{changes['previous_filename']}**")
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Unchanged Pages", page_changes["unchanged"])
+    col2.metric("Changed Pages", len(page_changes["changed"]))
+    col3.metric("Added Pages", len(page_changes["added"]))
+    col4.metric("Removed Pages", len(page_changes["removed"]))
+    
+    if changes["risk_clauses"]:
+        st.markdown("**Risk Clause Changes**")
+        for change in changes["risk_clauses"]:
+            st.markdown(f"- {change['category']}: {change['before']} → {change['after']}")
+    
+    if changes["compliance"]:
+        st.markdown("**Compliance Changes**")
+        for change in changes["compliance"]:
+            status = "✅ now compliant" if change["after"] else "❌ no longer compliant"
+            st.markdown(f"- {change['check']}: {status}")
+    
+    with st.expander(f"Sentence Changes (+{len(changes['sentences']['added'])} / -{len(changes['sentences']['removed'])})"):
+        for sentence in changes["sentences"]["added"]:
+            st.markdown(f"➕ {sentence}")
+        for sentence in changes["sentences"]["removed"]:
+            st.markdown(f"➖ ~~{sentence}~~")
+
+def show_performance_stats():
+    """Show cache instrumentation in the sidebar"""
+    with st.sidebar:
+        with st.expander("Performance", expanded=False):
+            stats = cache_stats()
+            if stats:
+                st.dataframe(
+                    stats,
+                    column_config={"hit_rate": st.column_config.ProgressColumn("hit_rate", min_value=0.0, max_value=1.0)},
+                    hide_index=True,
+                    use_container_width=True
+                )
+
+def show_rule_packs():
+    """Show the rule packs in use and allow reloading them without a restart"""
+    with st.sidebar:
+        with st.expander("Rule packs", expanded=False):
+            status = rules_status()
+            if status["version"]:
+                st.caption(status["version"])
+            if status["error"]:
+                st.warning(f"Edited rule packs were not loaded: {status['error']}")
+            
+            # Analyses already running finish with the rules they started with
+            if st.button("Reload rule packs"):
+                try:
+                    rules = reload_rules(force=True)
+                    st.success(f"Loaded {rules.version}")
+                except ValueError as e:
+                    st.error(str(e))
 
 if __name__ == "__main__":
     main()
+    show_rule_packs()
+    show_performance_stats()
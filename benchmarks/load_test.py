@@ -0,0 +1,347 @@
+# benchmarks/load_test.py
+"""
+Offline load test of the analysis path with many concurrent analyst sessions.
+
+Usage:
+    python benchmarks/load_test.py --sessions 20 50 --duration 120
+
+Every simulated session is a thread that behaves like an analyst in the app:
+it uploads a document from a synthetic mix, runs the same stages as a script
+run of app.py (extraction, indexing, financial, legal and compliance analysis,
+saving to the result store and search index), sometimes moves the threshold
+slider (a rerun that should be served from cache) and pauses between actions.
+The mix has documents that many analysts open, one-off uploads and revised
+versions of shared documents, so the caches see realistic reuse.
+
+Each concurrency level runs in a fresh process, with its own temporary
+databases, so memory and caches start cold. The report has per-stage
+p50/p95/p99 latencies (first-time and repeat documents apart), throughput,
+RSS over time, the st.cache_data memory footprint and the hit rates of the
+app's own caches. No network access is needed once the spaCy and sentence
+transformer models are installed locally.
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+STAGES = ["extract", "index", "financial", "legal", "compliance", "save"]
+
+CLAUSES = [
+    "The Supplier shall indemnify and hold harmless the Customer against all losses arising from any breach.",
+    "In no event shall either party be liable for indirect or consequential damages.",
+    "The total liability of the Supplier is limited to an amount equal to $50,000.",
+    "Either party may terminate this Agreement for convenience upon thirty days written notice.",
+    "All intellectual property rights in the deliverables shall remain with the Supplier.",
+    "Each party shall protect the confidential information of the other party.",
+    "This Agreement shall be governed by the laws of the State of New York.",
+    "Neither party shall be liable for delay caused by events beyond its reasonable control.",
+    "Payment is due within 45 days of receipt of a valid invoice.",
+    "The Processor shall process personal data only on documented instructions from the Controller.",
+    "The Company maintains disclosure controls and procedures and reviews them quarterly.",
+    "Acme Corporation and Globex Inc. agree to the terms of this Service Agreement.",
+]
+
+FINANCIALS = [
+    "Total Revenue of $1,250.5 million for FY2023, compared with FY2022 Revenue of $1,100.2 million.",
+    "Net Income of $210.4 million and EBITDA of $340.0 million in Q4 2023.",
+    "Total Assets of $5,400.0 million and Total Liabilities of $3,100.0 million as of December 2023.",
+    "Operating Income of $275.1 million; Gross Profit of $610.9 million; EPS of 2.45.",
+    "Current Assets of $1,900.0 million and Current Liabilities of $1,200.0 million.",
+]
+
+FILLER = (
+    "the parties acknowledge that the obligations described in this section apply throughout the term "
+    "and any renewal period unless otherwise agreed in writing by authorized representatives"
+).split()
+
+def build_document(rng, doc_id, sentences, financial_share):
+    """Synthetic contract or report text with a unique header"""
+    lines = [f"Document {doc_id}. Master Service Agreement between Acme Corporation and Globex Inc."]
+    for i in range(sentences):
+        roll = rng.random()
+        if roll < financial_share:
+            lines.append(rng.choice(FINANCIALS))
+        elif roll < financial_share + 0.3:
+            lines.append(rng.choice(CLAUSES))
+        else:
+            words = " ".join(rng.choice(FILLER) for _ in range(rng.randint(8, 40)))
+            lines.append(f"Section {i}.{doc_id}: {words.capitalize()}.")
+    return "\n".join(lines)
+
+def revise(rng, text, changes=3):
+    """Return a new version of a document with a few sentences changed"""
+    lines = text.split("\n")
+    for _ in range(changes):
+        i = rng.randrange(1, len(lines)) if len(lines) > 1 else 0
+        lines[i] = f"Amended clause {rng.randrange(10**6)}: " + rng.choice(CLAUSES)
+    return "\n".join(lines)
+
+class DocumentMix:
+    """Picks the next upload: shared documents, one-off uploads and revisions"""
+
+    def __init__(self, seed, shared_documents=20):
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.shared = [self.new_document(f"shared-{i}") for i in range(shared_documents)]
+        self.unique = 0
+
+    def new_document(self, name):
+        # Mostly short contracts with a tail of long reports
+        size = int(min(self.rng.lognormvariate(4.0, 0.9), 3000))
+        financial_share = 0.4 if self.rng.random() < 0.3 else 0.05
+        return name, build_document(self.rng, name, max(size, 5), financial_share)
+
+    def next(self):
+        with self.lock:
+            roll = self.rng.random()
+            if roll < 0.6:
+                # Popular documents are opened by many analysts
+                return self.shared[min(int(self.rng.expovariate(0.25)), len(self.shared) - 1)]
+            if roll < 0.85:
+                self.unique += 1
+                return self.new_document(f"upload-{self.unique}")
+            name, text = self.rng.choice(self.shared)
+            return f"{name}-rev{self.rng.randrange(1000)}", revise(self.rng, text)
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+def current_rss_mb():
+    """Resident set size of this process from /proc (Linux)"""
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+def cache_data_bytes():
+    """Memory held by st.cache_data per cached function (uses Streamlit internals)"""
+    try:
+        from streamlit.runtime.caching.cache_data_api import _data_caches
+        totals = defaultdict(int)
+        for stat in _data_caches.get_stats():
+            totals[stat.cache_name] += stat.byte_length
+        return dict(totals)
+    except Exception:
+        return {}
+
+def run_level(args):
+    """Run one concurrency level in this process and return the report"""
+    # Keep databases and caches of the run away from the real data directory
+    workdir = tempfile.mkdtemp(prefix="vaultiq-load-")
+    os.environ.setdefault("VAULTIQ_DB_PATH", os.path.join(workdir, "vaultiq.db"))
+    os.environ.setdefault("VAULTIQ_SEARCH_DB_PATH", os.path.join(workdir, "search_index.db"))
+    os.environ.setdefault("VAULTIQ_OCR_CACHE_PATH", os.path.join(workdir, "ocr_cache.db"))
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+    from utils.cache import cache_stats, content_hash
+    from utils.portfolio import NamedBytesIO
+    from utils.file_processor import process_uploaded_file
+    from utils.result_store import open_store, build_record, save_results
+    from utils.search_index import open_search_index, index_document
+    from Analysis.document_index import get_document_index
+    from Analysis.financial_analyzer import analyze_financials
+    from Analysis.legal_analyzer import analyze_legal_document, load_nlp_model
+    from Analysis.compliance_checker import check_compliance, load_embedder
+
+    # Load the shared models up front, as a warm server would have them
+    started = time.perf_counter()
+    load_nlp_model()
+    load_embedder()
+    model_load_seconds = time.perf_counter() - started
+    baseline_rss = current_rss_mb()
+
+    store = open_store()
+    search = open_search_index()
+    mix = DocumentMix(args.seed, args.shared_documents)
+    seen, seen_lock = set(), threading.Lock()
+    timings = defaultdict(lambda: {"first": [], "repeat": []})
+    runs, errors = [], []
+    results_lock = threading.Lock()
+    stop = threading.Event()
+
+    rss_samples = []
+    def sample_rss():
+        start = time.perf_counter()
+        while not stop.is_set():
+            rss_samples.append((time.perf_counter() - start, current_rss_mb()))
+            stop.wait(args.sample_interval)
+
+    def script_run(name, text, threshold):
+        """One rerun of app.py for an uploaded document"""
+        key = content_hash(text)
+        with seen_lock:
+            kind = "repeat" if key in seen else "first"
+            seen.add(key)
+        stage_times = {}
+
+        def timed(stage, function, *stage_args, **stage_kwargs):
+            start = time.perf_counter()
+            result = function(*stage_args, **stage_kwargs)
+            stage_times[stage] = time.perf_counter() - start
+            return result
+
+        upload = NamedBytesIO(text.encode("utf-8"), f"{name}.txt")
+        text, tables, pages = timed("extract", process_uploaded_file, upload)
+        timed("index", get_document_index, text, pages)
+        financial = timed("financial", analyze_financials, text, tables)
+        legal = timed("legal", analyze_legal_document, text, threshold)
+        compliance = timed("compliance", check_compliance, text, threshold)
+
+        def save():
+            record = build_record(upload.name, text, pages, financial, legal, compliance)
+            save_results(store, [record])
+            index_document(search, record["doc_hash"], upload.name, pages)
+        timed("save", save)
+
+        with results_lock:
+            for stage, seconds in stage_times.items():
+                timings[stage][kind].append(seconds)
+            runs.append((time.perf_counter(), sum(stage_times.values())))
+
+    def session(session_id):
+        rng = random.Random(args.seed * 1000 + session_id)
+        # Analysts arrive over the ramp-up period rather than all at once
+        if stop.wait(rng.uniform(0, args.ramp_up)):
+            return
+        while not stop.is_set():
+            name, text = mix.next()
+            threshold = 0.5
+            try:
+                script_run(name, text, threshold)
+                # Moving the slider reruns the script on the same document
+                while rng.random() < args.rerun_rate and not stop.is_set():
+                    threshold = round(rng.uniform(0.3, 0.8), 2)
+                    script_run(name, text, threshold)
+            except Exception as e:
+                with results_lock:
+                    errors.append(f"{type(e).__name__}: {e}")
+            stop.wait(rng.expovariate(1 / args.think_time) if args.think_time else 0)
+
+    sampler = threading.Thread(target=sample_rss, daemon=True)
+    sampler.start()
+    threads = [threading.Thread(target=session, args=(i,), daemon=True) for i in range(args.run)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    sampler.join()
+
+    return {
+        "sessions": args.run,
+        "seconds": elapsed,
+        "model_load_seconds": model_load_seconds,
+        "script_runs": len(runs),
+        "documents": len(seen),
+        "errors": errors[:10],
+        "error_count": len(errors),
+        "stages": {
+            stage: {
+                kind: {
+                    "count": len(values),
+                    "p50": percentile(values, 50),
+                    "p95": percentile(values, 95),
+                    "p99": percentile(values, 99)
+                }
+                for kind, values in timings[stage].items()
+            }
+            for stage in STAGES
+        },
+        "baseline_rss_mb": baseline_rss,
+        "rss_mb": rss_samples,
+        "cache_data_bytes": cache_data_bytes(),
+        "caches": cache_stats()
+    }
+
+def print_report(report, timeline_points):
+    print(f"\n=== {report['sessions']} concurrent sessions, {report['seconds']:.0f}s "
+          f"(models loaded in {report['model_load_seconds']:.1f}s) ===")
+    print(f"Script runs: {report['script_runs']} ({report['script_runs'] / report['seconds']:.2f}/s), "
+          f"distinct documents: {report['documents']}, errors: {report['error_count']}")
+    for error in report["errors"]:
+        print(f"  ! {error}")
+
+    print(f"\n{'stage':<12}{'docs':<8}{'runs':>6}{'p50 s':>9}{'p95 s':>9}{'p99 s':>9}")
+    for stage, kinds in report["stages"].items():
+        for kind in ["first", "repeat"]:
+            row = kinds.get(kind)
+            if row and row["count"]:
+                print(f"{stage:<12}{kind:<8}{row['count']:>6}{row['p50']:>9.3f}{row['p95']:>9.3f}{row['p99']:>9.3f}")
+
+    samples = report["rss_mb"]
+    if samples:
+        step = max(1, len(samples) // timeline_points)
+        print(f"\nRSS (MB), baseline after model load {report['baseline_rss_mb']:.0f}:")
+        print("  " + "  ".join(f"{t:.0f}s:{rss:.0f}" for t, rss in samples[::step]))
+        print(f"  peak {max(rss for _, rss in samples):.0f}, "
+              f"growth {samples[-1][1] - report['baseline_rss_mb']:+.0f}")
+
+    if report["cache_data_bytes"]:
+        print("\nst.cache_data memory:")
+        for name, size in sorted(report["cache_data_bytes"].items(), key=lambda item: -item[1]):
+            print(f"  {name:<60}{size / 2**20:>9.1f} MB")
+
+    print(f"\n{'cache':<22}{'entries':>9}{'hits':>9}{'misses':>9}{'evictions':>11}{'hit rate':>10}{'MB':>9}")
+    for cache in report["caches"]:
+        resident = cache.get("resident_mb")
+        print(f"{cache['cache']:<22}{cache['entries']:>9}{cache['hits']:>9}{cache['misses']:>9}"
+              f"{cache['evictions']:>11}{cache['hit_rate']:>10.1%}"
+              f"{f'{resident:.1f}' if resident is not None else '-':>9}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[20, 50],
+                        help="concurrency levels, each run in a fresh process")
+    parser.add_argument("--duration", type=float, default=120.0, help="seconds of load per level")
+    parser.add_argument("--ramp-up", type=float, default=10.0, help="seconds over which sessions start")
+    parser.add_argument("--think-time", type=float, default=2.0, help="mean pause between uploads (seconds)")
+    parser.add_argument("--rerun-rate", type=float, default=0.5, help="chance of another slider rerun")
+    parser.add_argument("--shared-documents", type=int, default=20)
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="seconds between RSS samples")
+    parser.add_argument("--timeline-points", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the reports to this file")
+    parser.add_argument("--run", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # Child process: run a single level and hand the report back as JSON
+    if args.run:
+        print(json.dumps(run_level(args)))
+        return
+
+    reports = []
+    for sessions in args.sessions:
+        command = [sys.executable, os.path.abspath(__file__), "--run", str(sessions)] + [
+            option for name in ["duration", "ramp_up", "think_time", "rerun_rate", "shared_documents",
+                                "sample_interval", "seed"]
+            for option in (f"--{name.replace('_', '-')}", str(getattr(args, name)))
+        ]
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        report = json.loads(output.strip().splitlines()[-1])
+        print_report(report, args.timeline_points)
+        reports.append(report)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+
+if __name__ == "__main__":
+    main()
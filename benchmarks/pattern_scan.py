@@ -0,0 +1,131 @@
+# benchmarks/pattern_scan.py
+"""
+Adversarial scan-time benchmark for the risk clause patterns.
+
+Usage:
+    python benchmarks/pattern_scan.py --max-chars 400000 --fuzz 200
+
+Runs every legal clause rule pack pattern plus the contract value patterns over
+documents of doubling size, once with plain `re` (the previous behaviour)
+and once through Analysis.pattern_engine. The adversarial corpora are single
+long lines full of gap prefixes ("reimburse", "no event shall", ...) with no
+matching suffix, the worst case for `.*` backtracking. A "growth" close to 2.0
+per doubling means linear time; close to 4.0 means quadratic.
+
+The fuzz pass scans random word soup built from pattern fragments and
+reports the worst engine time per character seen.
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Analysis.document_index import DocumentIndex
+from Analysis.pattern_engine import compile_pattern
+from Analysis.rule_packs import get_rules
+
+VALUE_PATTERNS = [r"agreement .* worth \$?([0-9,\.]+)"]
+PATTERNS = [pattern for clause in get_rules().legal_clauses.values() for pattern in clause["patterns"]] + VALUE_PATTERNS
+
+# Left sides of gap patterns, never followed by their right side
+GAP_PREFIXES = [
+    "reimburse", "no event shall", "ownership of", "liability", "terminate", "cancel",
+    "transfer of", "assign", "maintain", "protect", "disputes", "subject to", "beyond",
+    "unavoidable", "excuse", "payment", "invoice", "interest", "fee for", "agreement"
+]
+FRAGMENTS = GAP_PREFIXES + [
+    "for any losses", "be liable", "IP", "rights", "convenience", "secrecy", "settled",
+    "laws", "control", "delay", "performance", "due", "payable", "unpaid", "worth $1,000",
+    "the", "party", "shall", "indemnify", ".", ",", "\n"
+]
+
+def gap_bait(size, rng):
+    words = []
+    while sum(map(len, words)) + len(words) < size:
+        words.append(rng.choice(GAP_PREFIXES))
+    return " ".join(words)[:size]
+
+def ocr_noise(size, rng):
+    alphabet = "abcdefghijklmnopqrstuvwxyz      .,;:$0123456789"
+    return "".join(rng.choice(alphabet) for _ in range(size))
+
+def word_soup(size, rng):
+    words = []
+    while sum(map(len, words)) + len(words) < size:
+        words.append(rng.choice(FRAGMENTS))
+    return " ".join(words)[:size]
+
+CORPORA = {"gap_bait": gap_bait, "ocr_noise": ocr_noise, "word_soup": word_soup}
+
+def scan_legacy(text):
+    count = 0
+    for pattern in PATTERNS:
+        count += sum(1 for _ in re.finditer(pattern, text, re.IGNORECASE))
+    return count
+
+def scan_engine(text):
+    # Index construction is part of the cost being measured
+    layout = DocumentIndex(text).layout
+    count = 0
+    for pattern in PATTERNS:
+        count += sum(1 for _ in compile_pattern(pattern).finditer(text, layout))
+    return count
+
+def timed(function, text):
+    start = time.perf_counter()
+    matches = function(text)
+    return time.perf_counter() - start, matches
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--min-chars", type=int, default=25000)
+    parser.add_argument("--max-chars", type=int, default=400000)
+    parser.add_argument("--legacy-limit", type=float, default=20.0,
+                        help="stop running plain re once a scan takes longer than this (seconds)")
+    parser.add_argument("--fuzz", type=int, default=200, help="random documents in the fuzz pass")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    for pattern in PATTERNS:
+        compile_pattern(pattern)
+
+    print(f"{'corpus':<11}{'chars':>9}{'re (s)':>10}{'growth':>8}{'engine (s)':>12}{'growth':>8}{'us/char':>9}")
+    for name, build in CORPORA.items():
+        previous_legacy = previous_engine = None
+        legacy_enabled = True
+        size = args.min_chars
+        while size <= args.max_chars:
+            text = build(size, rng)
+
+            legacy = None
+            if legacy_enabled:
+                legacy, _ = timed(scan_legacy, text)
+                legacy_enabled = legacy <= args.legacy_limit
+            engine, _ = timed(scan_engine, text)
+
+            legacy_growth = f"{legacy / previous_legacy:.1f}" if legacy and previous_legacy else "-"
+            engine_growth = f"{engine / previous_engine:.1f}" if previous_engine else "-"
+            legacy_cell = f"{legacy:.3f}" if legacy is not None else "skipped"
+            print(f"{name:<11}{size:>9}{legacy_cell:>10}{legacy_growth:>8}{engine:>12.3f}{engine_growth:>8}"
+                  f"{engine / size * 1e6:>9.2f}")
+
+            previous_legacy, previous_engine = legacy, engine
+            size *= 2
+
+    if args.fuzz:
+        worst = 0.0
+        for _ in range(args.fuzz):
+            size = rng.randint(1000, 50000)
+            text = word_soup(size, rng)
+            engine, _ = timed(scan_engine, text)
+            worst = max(worst, engine / size)
+        print(f"\nFuzz: {args.fuzz} random documents, worst engine scan {worst * 1e6:.2f} us/char")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+# benchmarks/prefilter_recall.py
+"""
+Recall-vs-speed report for the BM25 sentence prefilter in front of the
+semantic compliance check.
+
+Usage:
+    python benchmarks/prefilter_recall.py --corpus contracts/ --top-n 10 25 50 100
+    python benchmarks/prefilter_recall.py --documents 40
+
+For every document, each requirement not already matched by a phrase
+pattern (the only ones the semantic fallback scores) is compared against
+all sentences, as without the prefilter, and against the shortlisted
+sentences only. The report shows per shortlist size:
+
+    encoded    share of sentences sent to the encoder
+    speed-up   full encode time / (shortlisting + shortlist encode time)
+    recall     how often the best full-document match survives the prefilter
+    flips      requirements whose compliant/non-compliant outcome changes
+    loss       mean drop in best similarity where the best match was dropped
+
+--corpus reads .txt, .pdf and .docx files; without it a synthetic corpus
+of contracts padded with signature blocks, addresses and definitions is used.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Analysis.compliance_checker import EMBEDDING_MODEL
+from Analysis.document_index import DocumentIndex, normalize_case
+from Analysis.lexical_prefilter import shortlist_sentences
+from Analysis.rule_packs import get_rules
+
+FILLER = [
+    "IN WITNESS WHEREOF, the parties have executed this Agreement as of the Effective Date.",
+    "Signed by: ____________________ Name: {name} Title: Authorized Signatory.",
+    "Address: {number} {street} Street, Suite {suite}, {city}.",
+    "\"{term}\" means any {term} as defined in Schedule {number}.",
+    "This Section {number} survives termination of the Agreement.",
+    "Invoices are payable in {currency} within {number} days of receipt.",
+    "Headings are for convenience only and do not affect interpretation.",
+    "This Agreement may be executed in counterparts, each of which is an original.",
+]
+
+# Paraphrases that describe a requirement without using its exact phrases
+PARAPHRASES = [
+    "The company maintains procedures so that information it must disclose is recorded and reported on time.",
+    "Management evaluates each year whether its controls over the accounts are operating effectively.",
+    "Supplier handles customer personal information only on documented instructions from the customer.",
+    "Residents of California may ask the supplier to erase the information held about them.",
+    "The vendor keeps appropriate organisational and technical protections for customer systems.",
+    "Customer may have independent testers probe the vendor's network for weaknesses once a year.",
+    "Hiring decisions are made without regard to race, religion, gender or age.",
+    "The contractor provides a workplace free of recognised hazards to its staff.",
+    "Neither party will offer payments to public servants to obtain an improper advantage.",
+    "Employees may not accept presents or hospitality above a nominal value from suppliers.",
+]
+
+WORDS = ["Acme", "Globex", "Initech", "Umbrella", "Hooli", "Main", "Oak", "Pine", "Boston", "Denver"]
+
+def synthetic_corpus(documents, rng):
+    """Contracts where a few requirement paraphrases hide among boilerplate"""
+    corpus = []
+    for _ in range(documents):
+        sentences = [
+            rng.choice(FILLER).format(
+                name=rng.choice(WORDS), number=rng.randint(1, 99), street=rng.choice(WORDS),
+                suite=rng.randint(100, 999), city=rng.choice(WORDS), term=rng.choice(WORDS).lower(),
+                currency=rng.choice(["USD", "EUR", "GBP"])
+            )
+            for _ in range(rng.randint(80, 600))
+        ]
+        for paraphrase in rng.sample(PARAPHRASES, rng.randint(2, 6)):
+            sentences.insert(rng.randrange(len(sentences) + 1), paraphrase)
+        corpus.append(" ".join(sentences))
+    return corpus
+
+def read_corpus(directory):
+    """Extracted text of every supported file in a directory"""
+    from utils.file_processor import process_pdf
+    import docx2txt
+
+    corpus = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        extension = name.rsplit(".", 1)[-1].lower()
+        if extension == "txt":
+            with open(path, encoding="utf-8", errors="replace") as f:
+                corpus.append(f.read())
+        elif extension == "pdf":
+            corpus.append(process_pdf(path)[0])
+        elif extension == "docx":
+            corpus.append(docx2txt.process(path))
+    return corpus
+
+def normalize(matrix):
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+def unmatched_requirements(rules, lowered_text):
+    """(category, index) of requirements none of whose phrases occur in the text"""
+    return [
+        (category, i)
+        for category, requirements in rules.compliance_requirements.items()
+        for i, requirement in enumerate(requirements)
+        if not any(normalize_case(pattern) in lowered_text for pattern in requirement["patterns"])
+    ]
+
+def best_matches(requirement_embeddings, sentence_embeddings):
+    """Best (sentence index, similarity) for each requirement's phrases"""
+    similarities = requirement_embeddings @ sentence_embeddings.T
+    flat = similarities.argmax()
+    return np.unravel_index(flat, similarities.shape)[1], float(similarities.max())
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="Directory of .txt/.pdf/.docx documents")
+    parser.add_argument("--documents", type=int, default=40, help="Synthetic documents without --corpus")
+    parser.add_argument("--top-n", type=int, nargs="+", default=[10, 25, 50, 100])
+    parser.add_argument("--threshold", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = read_corpus(args.corpus) if args.corpus else synthetic_corpus(args.documents, random.Random(args.seed))
+    rules = get_rules()
+    model = SentenceTransformer(EMBEDDING_MODEL, device="cpu")
+    requirement_embeddings = {
+        key: normalize(np.asarray(embeddings, dtype=np.float32))
+        for key, embeddings in rules.requirement_embeddings(model, EMBEDDING_MODEL).items()
+    }
+    # Warm up so the first document doesn't pay for lazy initialisation
+    model.encode(["warm up"] * 8)
+
+    totals = {top_n: {"encoded": 0, "seconds": 0.0, "hits": 0, "flips": 0, "loss": 0.0} for top_n in args.top_n}
+    full_seconds = sentence_count = checks = 0
+
+    for text in corpus:
+        index = DocumentIndex(text)
+        sentences = index.sentences
+        requirements = unmatched_requirements(rules, index.lower)
+        if not sentences or not requirements:
+            continue
+
+        # Baseline: every sentence goes to the encoder
+        start = time.perf_counter()
+        embeddings = normalize(model.encode(sentences, convert_to_numpy=True))
+        full_seconds += time.perf_counter() - start
+        sentence_count += len(sentences)
+        checks += len(requirements)
+        full = {key: best_matches(requirement_embeddings[key], embeddings) for key in requirements}
+
+        for top_n in args.top_n:
+            total = totals[top_n]
+            start = time.perf_counter()
+            candidates = shortlist_sentences(sentences, rules, top_n)
+            if candidates:
+                model.encode([sentences[i] for i in candidates], convert_to_numpy=True)
+            total["seconds"] += time.perf_counter() - start
+            total["encoded"] += len(candidates)
+
+            # Scores are identical per sentence, so reuse the baseline embeddings
+            for key in requirements:
+                full_best, full_score = full[key]
+                if candidates:
+                    best, score = best_matches(requirement_embeddings[key], embeddings[candidates])
+                    best = candidates[best]
+                else:
+                    best, score = None, 0.0
+                if best == full_best:
+                    total["hits"] += 1
+                else:
+                    total["loss"] += full_score - score
+                total["flips"] += (full_score >= args.threshold) != (score >= args.threshold)
+
+    if not checks:
+        print("No document had requirements left for semantic matching.")
+        return
+
+    print(f"{len(corpus)} documents, {sentence_count} sentences, {checks} requirement checks "
+          f"(full encode {full_seconds:.2f}s)")
+    print(f"{'top-n':>6}{'encoded':>9}{'seconds':>9}{'speed-up':>10}{'recall':>8}{'flips':>7}{'loss':>8}")
+    for top_n, total in totals.items():
+        misses = checks - total["hits"]
+        print(f"{top_n:>6}{total['encoded'] / sentence_count:>9.1%}{total['seconds']:>9.2f}"
+              f"{full_seconds / max(total['seconds'], 1e-9):>9.1f}x{total['hits'] / checks:>8.1%}"
+              f"{total['flips']:>7}{total['loss'] / misses if misses else 0.0:>8.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# benchmarks/sentence_batching.py
+"""
+Compare sentence encoding throughput on CPU: one encoder call per document
+(the previous behaviour of check_compliance) against the shared, length-
+bucketed EncodingScheduler.
+
+Usage:
+    python benchmarks/sentence_batching.py --documents 200 --workers 4
+
+The synthetic portfolio mixes many short documents (a few sentences each)
+with some long ones, and sentences from a few words to a long paragraph, the
+shape that leaves per-document batches underfilled or padding-heavy. Each
+variant analyzes the documents with the same number of worker threads, like
+analyze_portfolio, and starts from an empty cache. Sentences are unique by
+default so the comparison measures batching alone; --duplicate-rate adds
+boilerplate shared between documents.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+from sentence_transformers import SentenceTransformer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.encoding_scheduler import EncodingScheduler, estimate_tokens
+
+WORDS = (
+    "the supplier shall indemnify customer against all third party claims arising from breach "
+    "of this agreement including reasonable legal fees payment is due within thirty days of "
+    "invoice confidential information remains property of disclosing party data protection "
+    "personal data processing controller processor audit rights termination notice period"
+).split()
+
+BOILERPLATE = [
+    "This Agreement shall be governed by the laws of the State of New York.",
+    "Each party shall keep the other party's Confidential Information strictly confidential.",
+    "Notices under this Agreement must be given in writing to the addresses set out above.",
+]
+
+def build_portfolio(documents, duplicate_rate, rng):
+    """Return one list of sentences per document"""
+    portfolio = []
+    for doc in range(documents):
+        # Mostly short documents, with a long tail of large ones
+        count = max(1, min(int(rng.lognormvariate(2.5, 1.2)), 1500))
+        sentences = []
+        for i in range(count):
+            if rng.random() < duplicate_rate:
+                sentences.append(rng.choice(BOILERPLATE))
+                continue
+            length = max(3, min(int(rng.lognormvariate(2.8, 0.7)), 180))
+            words = " ".join(rng.choice(WORDS) for _ in range(length))
+            sentences.append(f"Clause {doc}.{i}: {words}.")
+        portfolio.append(sentences)
+    return portfolio
+
+def run_per_document(model, portfolio, workers):
+    """Each worker encodes its document's sentences in its own call"""
+    def encode(sentences):
+        return model.encode(sentences, convert_to_tensor=True)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(encode, portfolio))
+
+def run_scheduled(model, portfolio, workers, max_batch_size, max_batch_tokens):
+    """Workers submit to one scheduler that batches across documents"""
+    scheduler = EncodingScheduler(
+        lambda batch: model.encode(batch, batch_size=len(batch), convert_to_tensor=True),
+        max_batch_size=max_batch_size, max_batch_tokens=max_batch_tokens
+    )
+
+    def encode(sentences):
+        return torch.stack(scheduler.encode(sentences))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        embeddings = list(executor.map(encode, portfolio))
+    return embeddings, scheduler.stats()
+
+def per_document_padding(portfolio, batch_size=32):
+    """Padding share of per-document calls (sentence-transformers sorts each call by length)"""
+    tokens = padded = 0
+    for sentences in portfolio:
+        lengths = sorted(estimate_tokens(sentence) for sentence in sentences)
+        for start in range(0, len(lengths), batch_size):
+            batch = lengths[start:start + batch_size]
+            tokens += sum(batch)
+            padded += max(batch) * len(batch)
+    return 1 - tokens / padded
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--duplicate-rate", type=float, default=0.0)
+    parser.add_argument("--max-batch-size", type=int, default=128)
+    parser.add_argument("--max-batch-tokens", type=int, default=8192)
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    portfolio = build_portfolio(args.documents, args.duplicate_rate, random.Random(args.seed))
+    total = sum(len(sentences) for sentences in portfolio)
+    sizes = sorted(len(sentences) for sentences in portfolio)
+    print(f"Portfolio: {len(portfolio)} documents, {total} sentences "
+          f"(median {sizes[len(sizes) // 2]}, max {sizes[-1]} per document)")
+
+    model = SentenceTransformer(args.model, device="cpu")
+    # Warm up so neither variant pays for lazy initialisation
+    model.encode(["warm up"] * 8)
+
+    start = time.perf_counter()
+    baseline = run_per_document(model, portfolio, args.workers)
+    per_document_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scheduled, stats = run_scheduled(model, portfolio, args.workers, args.max_batch_size, args.max_batch_tokens)
+    scheduled_seconds = time.perf_counter() - start
+
+    # Both variants must produce the same embeddings
+    max_diff = max((a - b).abs().max().item() for a, b in zip(baseline, scheduled))
+
+    print(f"{'variant':<14}{'seconds':>9}{'sent/s':>9}{'calls':>7}{'mean batch':>12}{'padding':>9}")
+    calls = sum(-(-len(sentences) // 32) for sentences in portfolio)
+    print(f"{'per-document':<14}{per_document_seconds:>9.2f}{total / per_document_seconds:>9.0f}"
+          f"{calls:>7}{total / calls:>12.1f}{per_document_padding(portfolio):>9.1%}")
+    print(f"{'scheduled':<14}{scheduled_seconds:>9.2f}{total / scheduled_seconds:>9.0f}"
+          f"{stats['batches']:>7}{stats['mean_batch_size']:>12.1f}{stats['padding_ratio']:>9.1%}")
+    print(f"\nSpeed-up: {per_document_seconds / scheduled_seconds:.2f}x, max embedding difference {max_diff:.2e}")
+
+if __name__ == "__main__":
+    main()
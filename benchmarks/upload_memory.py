@@ -0,0 +1,159 @@
+# benchmarks/upload_memory.py
+"""
+Compare memory use of the legacy upload handling (getvalue() copy + temp
+file round trip) with the current in-memory pipeline in process_pdf.
+
+Usage:
+    python benchmarks/upload_memory.py [path/to/file.pdf]
+    python benchmarks/upload_memory.py --pages 200 --image-kb 1000
+
+Without a PDF a synthetic "scanned" document is generated: every page holds
+a line of text and an uncompressed grayscale image of the given size, so the
+file size is roughly pages * image-kb. Each variant runs in a fresh process
+so peak RSS is comparable.
+"""
+
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def build_synthetic_pdf(pages, image_kb):
+    """Write a minimal multi-page PDF with one raw image per page"""
+    side = max(1, int((image_kb * 1024) ** 0.5))
+    image = bytes((x * 7) % 256 for x in range(side)) * side
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    catalog = add(None)
+    pages_obj = add(None)
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    kids = []
+    for number in range(pages):
+        img = add(
+            b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray "
+            b"/BitsPerComponent 8 /Length %d >>\nstream\n" % (side, side, len(image)) + image + b"\nendstream"
+        )
+        content = (b"BT /F1 12 Tf 72 720 Td (Page %d: payment due net 30 days.) Tj ET "
+                   b"q 400 0 0 400 100 200 cm /Im0 Do Q" % (number + 1))
+        stream = add(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        kids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 %d 0 R >> /XObject << /Im0 %d 0 R >> >> >>" % (pages_obj, stream, font, img)
+        ))
+    objects[catalog - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages_obj
+    objects[pages_obj - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % kid for kid in kids), len(kids))
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref))
+    return out.getvalue()
+
+class Upload(io.BytesIO):
+    """Stand-in for Streamlit's UploadedFile"""
+    name = "benchmark.pdf"
+
+def run_legacy(upload):
+    """The previous process_pdf flow: copy the upload into a temp file and read it back"""
+    import pdfplumber
+    import camelot
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
+        tmp_file.write(upload.getvalue())
+        tmp_path = tmp_file.name
+    try:
+        with pdfplumber.open(tmp_path) as pdf:
+            text = "\n".join(page.extract_text() or "" for page in pdf.pages)
+        tables = [table.df for table in camelot.read_pdf(tmp_path, pages='all', flavor='stream')]
+        return text, tables
+    finally:
+        os.unlink(tmp_path)
+
+def run_current(upload):
+    """The in-memory flow in utils.file_processor"""
+    from utils.file_processor import process_pdf
+    text, tables, _ = process_pdf(upload, enable_ocr=False)
+    return text, tables
+
+def measure(variant, pdf_path):
+    """Run one variant in this process and print its measurements as JSON"""
+    # Import everything up front so module loading isn't counted
+    import pdfplumber, camelot  # noqa: F401
+    from utils import file_processor  # noqa: F401
+
+    with open(pdf_path, "rb") as f:
+        upload = Upload(f.read())
+
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    start = time.perf_counter()
+    text, tables = (run_legacy if variant == "legacy" else run_current)(upload)
+    elapsed = time.perf_counter() - start
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(json.dumps({
+        "variant": variant,
+        "seconds": elapsed,
+        "traced_peak_mb": traced_peak / 2**20,
+        "rss_growth_mb": (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline_rss) / 1024,
+        "chars": len(text),
+        "tables": len(tables)
+    }))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf", nargs="?", help="PDF to benchmark (default: synthetic)")
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--image-kb", type=int, default=1000)
+    parser.add_argument("--variant", choices=["legacy", "current"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        measure(args.variant, args.pdf)
+        return
+
+    pdf_path = args.pdf
+    cleanup = None
+    if not pdf_path:
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as f:
+            f.write(build_synthetic_pdf(args.pages, args.image_kb))
+            pdf_path = cleanup = f.name
+
+    try:
+        size_mb = os.path.getsize(pdf_path) / 2**20
+        print(f"Document: {pdf_path} ({size_mb:.1f} MB)")
+        print(f"{'variant':<10}{'time (s)':>10}{'traced peak (MB)':>18}{'RSS growth (MB)':>17}")
+        for variant in ["legacy", "current"]:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), pdf_path, "--variant", variant],
+                capture_output=True, text=True, check=True
+            ).stdout.strip().splitlines()[-1]
+            result = json.loads(output)
+            print(f"{variant:<10}{result['seconds']:>10.2f}{result['traced_peak_mb']:>18.1f}{result['rss_growth_mb']:>17.1f}")
+    finally:
+        if cleanup:
+            os.unlink(cleanup)
+
+if __name__ == "__main__":
+    main()
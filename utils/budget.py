@@ -0,0 +1,165 @@
+# utils/budget.py
+
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from utils.cache import LRUCache, content_hash
+
+# Default time (seconds) and memory (MB of RSS growth) budgets; override with
+# VAULTIQ_BUDGET_<STAGE>_SECONDS and VAULTIQ_BUDGET_<STAGE>_MB
+DEFAULT_BUDGETS = {
+    "document": {"seconds": 600.0, "mb": 2048.0},
+    "ocr": {"seconds": 240.0, "mb": None},
+    "tables": {"seconds": 120.0, "mb": None},
+    "legal": {"seconds": 2.0, "mb": None},
+    "compliance": {"seconds": 60.0, "mb": None},
+    "indexing": {"seconds": 30.0, "mb": None}
+}
+
+# Share of a budget after which stages switch to their cheaper paths
+NEAR_LIMIT = 0.8
+
+# Degradations of recently analyzed documents, keyed by text hash, so reruns
+# served from cache still report how their results were produced
+DEGRADATION_LOG = LRUCache(max_entries=1000, name="degradations")
+
+_current_document = contextvars.ContextVar("vaultiq_document_budget", default=None)
+
+def budget_setting(stage, unit):
+    """Configured budget of a stage, or None for no limit"""
+    value = os.environ.get(f"VAULTIQ_BUDGET_{stage.upper()}_{unit.upper()}")
+    if value is not None:
+        return float(value) if value else None
+    return DEFAULT_BUDGETS.get(stage, {}).get(unit)
+
+def current_rss_mb():
+    """Resident set size of the process in MB, or None where /proc is unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+class Budget:
+    """
+    Time and memory allowance for one stage, nested in the document's budget
+
+    A stage is near its limit when it, or the document it belongs to, has
+    used NEAR_LIMIT of its time or memory. Memory is the growth of process
+    RSS since the budget started, so with several documents in flight it is
+    an upper bound for any single one.
+    """
+
+    def __init__(self, stage, seconds=None, memory_mb=None, parent=None):
+        self.stage = stage
+        self.seconds = seconds
+        self.memory_mb = memory_mb
+        self.parent = parent
+        self.started = time.perf_counter()
+        self.start_rss = current_rss_mb() if memory_mb is not None else None
+        self.document_key = None
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def remaining(self):
+        """Seconds left before this stage or its document runs out (None for no limit)"""
+        own = None if self.seconds is None else max(self.seconds - self.elapsed(), 0.0)
+        inherited = self.parent.remaining() if self.parent else None
+        if own is None or inherited is None:
+            return own if inherited is None else inherited
+        return min(own, inherited)
+
+    def used_share(self):
+        """Largest share of the time or memory allowance used so far"""
+        shares = [0.0]
+        if self.seconds:
+            shares.append(self.elapsed() / self.seconds)
+        if self.memory_mb and self.start_rss is not None:
+            rss = current_rss_mb()
+            if rss is not None:
+                shares.append((rss - self.start_rss) / self.memory_mb)
+        return max(shares)
+
+    def near_limit(self, share=NEAR_LIMIT):
+        return self.used_share() >= share or bool(self.parent and self.parent.near_limit(share))
+
+    def exceeded(self):
+        return self.near_limit(1.0)
+
+    def attach(self, text):
+        """Tie the document budget to its extracted text and log what was degraded so far"""
+        with self._lock:
+            self.document_key = content_hash(text)
+            pending, self._pending = self._pending, {}
+        for stage, detail in pending.items():
+            _log(self.document_key, stage, detail)
+
+    def degraded_stages(self):
+        """Stages reported as degraded for this document so far"""
+        with self._lock:
+            if self.document_key is None:
+                return {stage for stage, detail in self._pending.items() if detail is not None}
+        return set(DEGRADATION_LOG.get(self.document_key, record=False) or {})
+
+    def _report(self, stage, detail):
+        with self._lock:
+            if self.document_key is None:
+                self._pending[stage] = detail
+                return
+        _log(self.document_key, stage, detail)
+
+def _log(document_key, stage, detail):
+    entries = dict(DEGRADATION_LOG.get(document_key, record=False) or {})
+    if detail is None:
+        entries.pop(stage, None)
+    else:
+        entries[stage] = detail
+    DEGRADATION_LOG.set(document_key, entries)
+
+@contextmanager
+def document_budget():
+    """Run a document's analysis within the document budget (see stage_budget)"""
+    budget = Budget("document", budget_setting("document", "seconds"), budget_setting("document", "mb"))
+    token = _current_document.set(budget)
+    try:
+        yield budget
+    finally:
+        _current_document.reset(token)
+
+def stage_budget(stage):
+    """Start the budget of a stage of the document currently being analyzed"""
+    return Budget(
+        stage, budget_setting(stage, "seconds"), budget_setting(stage, "mb"), parent=_current_document.get()
+    )
+
+def record_degradation(stage, detail):
+    """Note that a stage took a cheaper path for the current document"""
+    budget = _current_document.get()
+    if budget is not None:
+        budget._report(stage, detail)
+
+def clear_degradation(stage):
+    """Note that a stage ran in full for the current document"""
+    budget = _current_document.get()
+    if budget is not None:
+        budget._report(stage, None)
+
+def current_degradations():
+    """Stages degraded so far for the document currently being analyzed"""
+    budget = _current_document.get()
+    return budget.degraded_stages() if budget is not None else set()
+
+def degradations_for(text):
+    """
+    Stages that took a cheaper path for a document
+
+    Returns:
+        dict: Stage name -> description of what was skipped and why
+    """
+    return dict(DEGRADATION_LOG.get(content_hash(text), record=False) or {})
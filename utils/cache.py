@@ -0,0 +1,261 @@
+# utils/cache.py
+
+import functools
+import hashlib
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+# Named caches, listed by cache_stats() for instrumentation
+CACHE_REGISTRY = weakref.WeakValueDictionary()
+
+def content_hash(data):
+    """Return a stable hex digest for text or raw bytes"""
+    if isinstance(data, str):
+        data = data.encode("utf-8", errors="surrogatepass")
+    return hashlib.sha1(data).hexdigest()
+
+def stable_hash(obj):
+    """Return a stable hex digest for JSON-like data such as analysis results"""
+    return content_hash(json.dumps(obj, sort_keys=True, default=str))
+
+class LRUCache:
+    """
+    Small thread-safe least-recently-used cache
+
+    Always bounded by a number of entries; optionally also by the estimated
+    bytes its values hold (max_bytes) and by age (ttl seconds). Values larger
+    than max_bytes on their own are not stored at all.
+    """
+
+    def __init__(self, max_entries=1000, name=None, max_bytes=None, ttl=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.rejected = 0
+        self.bytes = 0
+        self._data = OrderedDict()
+        self._sizes = {}
+        self._expires = {}
+        self._last_purge = time.monotonic()
+        self._lock = threading.Lock()
+        if name:
+            CACHE_REGISTRY[name] = self
+
+    def get(self, key, default=None, record=True):
+        with self._lock:
+            if key not in self._data:
+                self.misses += record
+                return default
+            if self.ttl is not None and self._expires[key] <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += record
+                return default
+            self.hits += record
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        # Size the value outside the lock; it can walk a large object
+        size = estimate_size(value) if self.max_bytes is not None else 0
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                self.rejected += 1
+                return
+            self._data[key] = value
+            self._sizes[key] = size
+            self.bytes += size
+            if self.ttl is not None:
+                self._expires[key] = time.monotonic() + self.ttl
+                self._purge_expired()
+            while len(self._data) > self.max_entries or (
+                    self.max_bytes is not None and self.bytes > self.max_bytes):
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        del self._data[key]
+        self.bytes -= self._sizes.pop(key)
+        self._expires.pop(key, None)
+
+    def _purge_expired(self):
+        # Expired entries that are never read again would otherwise hold memory
+        # until evicted, so sweep them out a few times per TTL period
+        now = time.monotonic()
+        if now - self._last_purge < self.ttl / 4:
+            return
+        self._last_purge = now
+        for key in [key for key, expires in self._expires.items() if expires <= now]:
+            self._remove(key)
+            self.expirations += 1
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self._expires.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """Return hit/miss/eviction counters for this cache"""
+        lookups = self.hits + self.misses
+        return {
+            "cache": self.name,
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "expirations": self.expirations,
+            "resident_mb": self.bytes / 2**20 if self.max_bytes is not None else None,
+            "max_mb": self.max_bytes / 2**20 if self.max_bytes is not None else None
+        }
+
+def cache_setting(name, setting, default):
+    """Read a numeric cache limit from VAULTIQ_CACHE_<NAME>_<SETTING>, if set"""
+    value = os.environ.get(f"VAULTIQ_CACHE_{name.upper()}_{setting.upper()}")
+    return float(value) if value else default
+
+def cached_function(name, max_entries=64, max_mb=None, ttl=None, cache_if=None):
+    """
+    Bounded replacement for st.cache_data on the analysis entry points
+
+    Results are kept in a named LRUCache limited by entries, resident
+    megabytes and age, so they show up in cache_stats(). Each limit can be
+    overridden with VAULTIQ_CACHE_<NAME>_MAX_ENTRIES, _MAX_MB and _TTL.
+    Arguments are keyed by content hash (see argument_key) rather than by
+    pickling them. Unlike st.cache_data, results are returned as is, not
+    copied, so callers must not modify them. Concurrent calls with the same
+    arguments compute the result once.
+
+    Args:
+        name: Cache name shown in the Performance panel
+        max_entries: Most results kept
+        max_mb: Most estimated megabytes of results kept (None for no limit)
+        ttl: Seconds a result stays valid (None for no expiry)
+        cache_if: Optional callable receiving a result; results it rejects
+            (e.g. ones degraded to stay within a budget) are not kept
+    """
+    max_mb = cache_setting(name, "max_mb", max_mb)
+    cache = LRUCache(
+        max_entries=int(cache_setting(name, "max_entries", max_entries)),
+        name=name,
+        max_bytes=int(max_mb * 2**20) if max_mb is not None else None,
+        ttl=cache_setting(name, "ttl", ttl)
+    )
+
+    def decorator(function):
+        signature = inspect.signature(function)
+        key_locks = {}
+        locks_lock = threading.Lock()
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = content_hash("|".join(argument_key(value) for value in bound.arguments.values()))
+
+            missing = object()
+            result = cache.get(key, missing)
+            if result is not missing:
+                return result
+
+            # Let one caller compute a missing result while the others wait for it; a key's
+            # lock counts its users and is only dropped once none hold or wait for it
+            with locks_lock:
+                entry = key_locks.get(key)
+                if entry is None:
+                    entry = key_locks[key] = [threading.Lock(), 0]
+                entry[1] += 1
+            try:
+                with entry[0]:
+                    result = cache.get(key, missing, record=False)
+                    if result is missing:
+                        result = function(*args, **kwargs)
+                        if cache_if is None or cache_if(result):
+                            cache.set(key, result)
+            finally:
+                with locks_lock:
+                    entry[1] -= 1
+                    if not entry[1]:
+                        key_locks.pop(key, None)
+            return result
+
+        wrapper.cache = cache
+        wrapper.clear = cache.clear
+        return wrapper
+
+    return decorator
+
+def argument_key(value):
+    """
+    Cheap, stable key for a cached function argument
+
+    Text and bytes are hashed directly, uploaded files by their name and
+    buffer (no copy), DataFrames by pandas' vectorized row hashes, and
+    containers element by element.
+    """
+    if value is None or isinstance(value, (bool, int, float)):
+        return repr(value)
+    if isinstance(value, (str, bytes, bytearray, memoryview)):
+        return content_hash(value)
+    if hasattr(value, "getbuffer"):
+        with value.getbuffer() as buffer:
+            return f"{getattr(value, 'name', '')}:{content_hash(buffer)}"
+    if isinstance(value, (list, tuple)):
+        return content_hash("(" + ",".join(argument_key(item) for item in value) + ")")
+    if isinstance(value, dict):
+        return stable_hash(value)
+    pandas = sys.modules.get("pandas")
+    if pandas is not None and isinstance(value, pandas.DataFrame):
+        rows = pandas.util.hash_pandas_object(value, index=True).values
+        columns = ",".join(map(str, value.columns))
+        return content_hash(content_hash(rows.tobytes()) + columns)
+    return content_hash(repr(value))
+
+def estimate_size(value, _seen=None):
+    """Rough number of bytes held by a cached value, following containers"""
+    _seen = _seen if _seen is not None else set()
+    if id(value) in _seen:
+        return 0
+    _seen.add(id(value))
+
+    # DataFrames, arrays and tensors report their buffers themselves
+    if hasattr(value, "memory_usage") and hasattr(value, "columns"):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if hasattr(value, "nbytes") and not isinstance(value, (str, bytes)):
+        return int(value.nbytes)
+    if hasattr(value, "element_size") and hasattr(value, "nelement"):
+        return value.element_size() * value.nelement()
+
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k, _seen) + estimate_size(v, _seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item, _seen) for item in value)
+    return size
+
+def cache_stats():
+    """Collect statistics for every named cache"""
+    return [cache.stats() for _, cache in sorted(CACHE_REGISTRY.items())]
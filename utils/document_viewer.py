@@ -0,0 +1,86 @@
+# utils/document_viewer.py
+
+from bisect import bisect_right
+
+# Most characters of document text sent to the browser at once
+VIEWER_WINDOW_CHARS = 5000
+
+# Table rows sent to the browser at once
+TABLE_PAGE_ROWS = 200
+
+def plan_views(text, index, pages, window_chars=VIEWER_WINDOW_CHARS):
+    """
+    Cut a document into windows small enough to display, never across pages
+
+    Args:
+        text: The extracted text from the document
+        index: The document's DocumentIndex (for page start offsets)
+        pages: Per-page text as produced by process_uploaded_file
+        window_chars: Most characters per window
+
+    Returns:
+        list: Views as dicts with the page number (None without page
+            information), the part of the page, and start/end offsets
+    """
+    if index.has_pages:
+        spans = [
+            (number, start, start + len(pages[number - 1]))
+            for start, number in zip(index.page_starts, index.page_numbers)
+        ]
+    else:
+        spans = [(None, 0, len(text))]
+
+    views = []
+    for number, start, end in spans:
+        windows = split_windows(text, start, end, window_chars)
+        for part, (window_start, window_end) in enumerate(windows, start=1):
+            views.append({
+                "page": number,
+                "part": part,
+                "parts": len(windows),
+                "start": window_start,
+                "end": window_end
+            })
+    return views
+
+def split_windows(text, start, end, window_chars):
+    """Split text[start:end] into windows, preferring to break after a newline"""
+    windows = []
+    while end - start > window_chars:
+        cut = text.rfind("\n", start + window_chars // 2, start + window_chars)
+        cut = cut + 1 if cut >= 0 else start + window_chars
+        windows.append((start, cut))
+        start = cut
+    windows.append((start, end))
+    return windows
+
+def view_label(view):
+    """Short label for a view, e.g. "Page 12 (2/3)" """
+    label = f"Page {view['page']}" if view["page"] else "Text"
+    return f"{label} ({view['part']}/{view['parts']})" if view["parts"] > 1 else label
+
+def collect_findings(legal_results, compliance_results):
+    """List (offset, label) for every found risk clause and compliance hit"""
+    findings = []
+    for category, details in legal_results["risk_clauses"].items():
+        if details["found"]:
+            label = f"{category} ({details['risk_level']} risk)"
+            findings.extend((offset, label) for offset in details.get("offsets", []))
+
+    for checks in compliance_results["checks"].values():
+        for check in checks:
+            if check["compliant"] and check.get("offset") is not None:
+                findings.append((check["offset"], f"✓ {check['description']}"))
+
+    return sorted(findings)
+
+def findings_by_view(views, findings):
+    """Map view positions to the distinct finding labels they contain"""
+    starts = [view["start"] for view in views]
+    by_view = {}
+    for offset, label in findings:
+        position = max(bisect_right(starts, offset) - 1, 0)
+        labels = by_view.setdefault(position, [])
+        if label not in labels:
+            labels.append(label)
+    return by_view
@@ -0,0 +1,172 @@
+# utils/encoding_scheduler.py
+
+import threading
+from collections import deque
+
+# Rough wordpiece count per character of English text, used to size batches
+CHARS_PER_TOKEN = 4
+
+# Sentence transformers truncate longer inputs, so they never cost more than this
+MAX_SEQUENCE_TOKENS = 256
+
+class EncodingRequest:
+    """Handle for sentences submitted to an EncodingScheduler"""
+
+    def __init__(self, sentences, slots):
+        self.sentences = sentences
+        self._slots = slots
+
+    def done(self):
+        return all(slot.event.is_set() for slot in self._slots)
+
+    def result(self, timeout=None):
+        """Wait for the embeddings, in the order the sentences were submitted"""
+        embeddings = {}
+        for sentence, slot in self._slots.items():
+            if not slot.event.wait(timeout):
+                raise TimeoutError("Sentence encoding did not finish in time")
+            if slot.error is not None:
+                raise slot.error
+            embeddings[sentence] = slot.value
+        return [embeddings[sentence] for sentence in self.sentences]
+
+class _Slot:
+    """One distinct sentence waiting to be encoded"""
+
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+class EncodingScheduler:
+    """
+    Encodes sentences from many documents together in length-bucketed batches
+
+    Callers submit their sentences and wait; a single worker thread takes
+    everything queued so far, drops duplicates (including sentences another
+    document already has in flight), sorts it by length and cuts it into
+    batches whose padded size stays within a token budget. While a round is
+    being encoded, new submissions pile up and form the next round, so busy
+    periods produce full batches of similar-length sentences without adding
+    any wait when the scheduler is idle.
+    """
+
+    def __init__(self, encode_batch, max_batch_size=128, max_batch_tokens=8192, on_result=None, name=None):
+        """
+        Args:
+            encode_batch: Callable turning a list of sentences into a sequence
+                of embeddings in the same order
+            max_batch_size: Most sentences per encoder call
+            max_batch_tokens: Most padded tokens (sentences x longest) per call
+            on_result: Optional callable receiving (sentence, embedding) as soon
+                as a sentence is encoded, e.g. to fill a cache
+            name: Name for the worker thread
+        """
+        self.encode_batch = encode_batch
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.on_result = on_result
+        self.name = name or "encoding_scheduler"
+        self.requests = 0
+        self.sentences = 0
+        self.batches = 0
+        self.tokens = 0
+        self.padded_tokens = 0
+        self._queue = deque()
+        self._in_flight = {}
+        self._condition = threading.Condition()
+        self._worker = None
+
+    def submit(self, sentences):
+        """Queue sentences for encoding without waiting; returns an EncodingRequest"""
+        sentences = list(sentences)
+        slots = {}
+        with self._condition:
+            for sentence in dict.fromkeys(sentences):
+                slot = self._in_flight.get(sentence)
+                if slot is None:
+                    slot = self._in_flight[sentence] = _Slot()
+                    self._queue.append(sentence)
+                slots[sentence] = slot
+            self.requests += 1
+            self._start_worker()
+            self._condition.notify()
+        return EncodingRequest(sentences, slots)
+
+    def encode(self, sentences, timeout=None):
+        """Encode sentences alongside whatever other documents are encoding"""
+        return self.submit(sentences).result(timeout)
+
+    def _start_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._queue:
+                    self._condition.wait()
+                pending = list(self._queue)
+                self._queue.clear()
+
+            for batch in plan_batches(pending, self.max_batch_size, self.max_batch_tokens):
+                self._encode(batch)
+
+    def _encode(self, batch):
+        try:
+            embeddings = self.encode_batch(batch)
+            error = None
+        except Exception as e:
+            embeddings, error = [None] * len(batch), e
+
+        lengths = [estimate_tokens(sentence) for sentence in batch]
+        with self._condition:
+            self.batches += 1
+            self.sentences += len(batch)
+            self.tokens += sum(lengths)
+            self.padded_tokens += max(lengths) * len(batch)
+            slots = [self._in_flight.pop(sentence) for sentence in batch]
+
+        for sentence, embedding, slot in zip(batch, embeddings, slots):
+            if error is None and self.on_result:
+                self.on_result(sentence, embedding)
+            slot.value, slot.error = embedding, error
+            slot.event.set()
+
+    def stats(self):
+        """Return batching counters (padding_ratio is wasted share of encoded tokens)"""
+        return {
+            "requests": self.requests,
+            "sentences": self.sentences,
+            "batches": self.batches,
+            "mean_batch_size": self.sentences / self.batches if self.batches else 0.0,
+            "padding_ratio": 1 - self.tokens / self.padded_tokens if self.padded_tokens else 0.0,
+            "queued": len(self._queue)
+        }
+
+def estimate_tokens(sentence):
+    """Approximate the encoder's token count for a sentence"""
+    return min(len(sentence) // CHARS_PER_TOKEN + 2, MAX_SEQUENCE_TOKENS)
+
+def plan_batches(sentences, max_batch_size, max_batch_tokens):
+    """
+    Split sentences into batches of similar length
+
+    Sentences are sorted by estimated token count, so each batch pads to a
+    length close to all of its members; a batch closes when adding the next
+    sentence would push its padded size over max_batch_tokens.
+    """
+    batches, batch = [], []
+    for sentence in sorted(sentences, key=estimate_tokens):
+        # Sorted ascending, so the newest sentence is the longest in the batch
+        padded = estimate_tokens(sentence) * (len(batch) + 1)
+        if batch and (len(batch) >= max_batch_size or padded > max_batch_tokens):
+            batches.append(batch)
+            batch = []
+        batch.append(sentence)
+    if batch:
+        batches.append(batch)
+    return batches
@@ -0,0 +1,292 @@
+# utils/exporter.py
+
+import json
+import os
+import threading
+import time
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+from utils.budget import degradations_for
+from utils.cache import content_hash
+from Analysis.financial_analyzer import parse_financial_value
+
+# Where batch exports are written, one subdirectory per export (override with VAULTIQ_EXPORT_DIR)
+DEFAULT_EXPORT_DIR = os.environ.get("VAULTIQ_EXPORT_DIR", os.path.join("data", "exports"))
+
+# Rows buffered per table before they are written out as one partition file
+ROWS_PER_PARTITION = 50000
+
+EXPORT_FORMATS = ("jsonl", "parquet", "arrow")
+
+# Columnar layout of the exported tables; every row carries the document hash
+TABLE_SCHEMAS = {
+    "documents": pa.schema([
+        ("doc_hash", pa.string()), ("filename", pa.string()), ("page_count", pa.int32()),
+        ("contract_type", pa.string()), ("governing_law", pa.string()),
+        ("parties", pa.list_(pa.string())), ("dates", pa.list_(pa.string())),
+        ("contract_value", pa.string()), ("duration", pa.string()), ("overall_compliant", pa.bool_()),
+        ("degraded_stages", pa.list_(pa.string()))
+    ]),
+    "risk_clauses": pa.schema([
+        ("doc_hash", pa.string()), ("category", pa.string()), ("found", pa.bool_()),
+        ("risk_level", pa.string()), ("matches", pa.int32()), ("pages", pa.list_(pa.int32())),
+        ("description", pa.string()), ("recommendation", pa.string())
+    ]),
+    "compliance_checks": pa.schema([
+        ("doc_hash", pa.string()), ("category", pa.string()), ("requirement", pa.string()),
+        ("compliant", pa.bool_()), ("confidence", pa.float64()), ("page", pa.int32()),
+        ("best_match", pa.string()), ("recommendation", pa.string())
+    ]),
+    "metrics": pa.schema([
+        ("doc_hash", pa.string()), ("metric", pa.string()), ("value", pa.float64()), ("display", pa.string())
+    ]),
+    "trends": pa.schema([
+        ("doc_hash", pa.string()), ("metric", pa.string()), ("period", pa.string()),
+        ("value", pa.float64()), ("display", pa.string())
+    ]),
+    # Extracted tables have no common schema, so they are exported cell by cell
+    "table_cells": pa.schema([
+        ("doc_hash", pa.string()), ("table", pa.int32()), ("row", pa.int32()),
+        ("column", pa.string()), ("value", pa.string())
+    ])
+}
+
+class ResultExporter:
+    """
+    Streams per-document analysis results to JSON Lines and columnar partitions
+
+    Each document is written as soon as it is analyzed: one JSON line, and
+    one row per clause, check, metric, trend point and table cell in the
+    buffers of the columnar tables. A buffer is written out as a Parquet
+    and/or Arrow partition file once it reaches rows_per_partition rows, so
+    memory use stays flat however many documents are exported. Safe to call
+    from several worker threads.
+    """
+
+    def __init__(self, directory=None, formats=("jsonl", "parquet"), rows_per_partition=ROWS_PER_PARTITION):
+        unknown = set(formats) - set(EXPORT_FORMATS)
+        if unknown:
+            raise ValueError(f"Unknown export formats: {', '.join(sorted(unknown))}")
+
+        self.directory = directory or os.path.join(DEFAULT_EXPORT_DIR, time.strftime("%Y%m%d-%H%M%S"))
+        self.formats = tuple(formats)
+        self.rows_per_partition = rows_per_partition
+        self.documents = 0
+        self.partitions = 0
+        self._buffers = {table: [] for table in TABLE_SCHEMAS}
+        self._part_numbers = {table: 0 for table in TABLE_SCHEMAS}
+        self._lock = threading.Lock()
+        self._jsonl = None
+
+        os.makedirs(self.directory, exist_ok=True)
+        if "jsonl" in self.formats:
+            self._jsonl = open(os.path.join(self.directory, "documents.jsonl"), "a", encoding="utf-8")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, filename, text, pages, tables, financial_results, legal_results, compliance_results):
+        """Export one document's results"""
+        doc_hash = content_hash(text)
+        document = build_export_document(
+            doc_hash, filename, pages, tables, financial_results, legal_results, compliance_results,
+            degradations_for(text)
+        )
+        line = json.dumps(document, ensure_ascii=False, default=str) if self._jsonl else None
+        rows = build_export_rows(document, tables) if self.columnar else None
+
+        with self._lock:
+            if line is not None:
+                self._jsonl.write(line + "\n")
+                self._jsonl.flush()
+            if rows is not None:
+                for table, table_rows in rows.items():
+                    buffer = self._buffers[table]
+                    buffer.extend(table_rows)
+                    if len(buffer) >= self.rows_per_partition:
+                        self._flush(table)
+            self.documents += 1
+
+    @property
+    def columnar(self):
+        return any(fmt in self.formats for fmt in ("parquet", "arrow"))
+
+    def _flush(self, table):
+        buffer = self._buffers[table]
+        if not buffer:
+            return
+        arrow_table = pa.Table.from_pylist(buffer, schema=TABLE_SCHEMAS[table])
+        part = f"part-{self._part_numbers[table]:05d}"
+
+        for fmt in ("parquet", "arrow"):
+            if fmt not in self.formats:
+                continue
+            table_dir = os.path.join(self.directory, fmt, table)
+            os.makedirs(table_dir, exist_ok=True)
+            path = os.path.join(table_dir, f"{part}.{fmt}")
+
+            # Write under a hidden temporary name so readers never see a half-written partition
+            tmp_path = os.path.join(table_dir, f".{part}.{fmt}.tmp")
+            if fmt == "parquet":
+                pq.write_table(arrow_table, tmp_path)
+            else:
+                feather.write_feather(arrow_table, tmp_path)
+            os.replace(tmp_path, path)
+            self.partitions += 1
+
+        self._part_numbers[table] += 1
+        self._buffers[table] = []
+
+    def close(self):
+        """Write the remaining buffered rows and close the JSON Lines file"""
+        with self._lock:
+            if self.columnar:
+                for table in self._buffers:
+                    self._flush(table)
+            if self._jsonl:
+                self._jsonl.close()
+                self._jsonl = None
+
+def build_export_document(doc_hash, filename, pages, tables, financial_results, legal_results, compliance_results,
+                          degradations=None):
+    """Nested, JSON-ready view of one document's results with typed metric values"""
+    return {
+        "doc_hash": doc_hash,
+        "filename": filename,
+        "page_count": len(pages),
+        # Stages that took a cheaper path to stay within budget, with what they skipped
+        "degraded": dict(degradations or {}),
+        "contract_info": legal_results["contract_info"],
+        "contract_value": legal_results.get("contract_value"),
+        "duration": legal_results.get("duration"),
+        "risk_clauses": {
+            category: {
+                "found": details["found"],
+                "risk_level": details["risk_level"],
+                "matches": len(details.get("patterns_matched", [])),
+                "pages": details.get("pages", []),
+                "description": details.get("description"),
+                "recommendation": details.get("recommendation")
+            }
+            for category, details in legal_results["risk_clauses"].items()
+        },
+        "overall_compliant": compliance_results["overall_compliant"],
+        "compliance": {
+            category: [
+                {
+                    "requirement": check["description"],
+                    "compliant": check["compliant"],
+                    "confidence": float(check["confidence"]),
+                    "page": check.get("page"),
+                    "best_match": check.get("best_match") or None,
+                    "recommendation": check.get("recommendation") or None
+                }
+                for check in checks
+            ]
+            for category, checks in compliance_results["checks"].items()
+        },
+        "metrics": {
+            metric: {"value": parse_financial_value(value), "display": str(value)}
+            for metric, value in financial_results["metrics"].items()
+        },
+        "trends": {
+            metric: {
+                period: {"value": parse_financial_value(value), "display": str(value)}
+                for period, value in period_values.items()
+            }
+            for metric, period_values in financial_results["trends"].items()
+        },
+        "tables": [
+            {"columns": [str(column) for column in table.columns], "rows": table.astype(str).values.tolist()}
+            for table in tables or []
+        ]
+    }
+
+def build_export_rows(document, tables):
+    """Flatten an export document into rows for each columnar table"""
+    doc_hash = document["doc_hash"]
+    contract_info = document["contract_info"]
+
+    rows = {
+        "documents": [{
+            "doc_hash": doc_hash,
+            "filename": document["filename"],
+            "page_count": document["page_count"],
+            "contract_type": contract_info.get("contract_type"),
+            "governing_law": contract_info.get("governing_law"),
+            "parties": list(contract_info.get("parties", [])),
+            "dates": list(contract_info.get("dates", [])),
+            "contract_value": document["contract_value"],
+            "duration": None if document["duration"] is None else str(document["duration"]),
+            "overall_compliant": document["overall_compliant"],
+            "degraded_stages": list(document["degraded"])
+        }],
+        "risk_clauses": [
+            dict(details, doc_hash=doc_hash, category=category)
+            for category, details in document["risk_clauses"].items()
+        ],
+        "compliance_checks": [
+            dict(check, doc_hash=doc_hash, category=category)
+            for category, checks in document["compliance"].items()
+            for check in checks
+        ],
+        "metrics": [
+            {"doc_hash": doc_hash, "metric": metric, **value}
+            for metric, value in document["metrics"].items()
+        ],
+        "trends": [
+            {"doc_hash": doc_hash, "metric": metric, "period": period, **value}
+            for metric, period_values in document["trends"].items()
+            for period, value in period_values.items()
+        ],
+        "table_cells": [
+            {"doc_hash": doc_hash, "table": number, "row": row, "column": str(column), "value": str(value)}
+            for number, table in enumerate(tables or [])
+            for row, values in enumerate(table.itertuples(index=False, name=None))
+            for column, value in zip(table.columns, values)
+        ]
+    }
+    return rows
+
+def read_jsonl(path):
+    """Yield exported documents one at a time from a JSON Lines file or export directory"""
+    if os.path.isdir(path):
+        path = os.path.join(path, "documents.jsonl")
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def scan_export(directory, table, columns=None, filter=None, fmt="parquet", batch_size=65536):
+    """
+    Lazily scan one exported table across all its partitions
+
+    Only the requested columns are read, and with Parquet the filter is
+    pushed down so non-matching row groups are skipped.
+
+    Args:
+        directory: Export directory written by ResultExporter
+        table: Name of an exported table (see TABLE_SCHEMAS)
+        columns: Optional list of columns to read
+        filter: Optional pyarrow.dataset expression, e.g. ds.field("risk_level") == "High"
+        fmt: "parquet" or "arrow"
+        batch_size: Most rows per yielded DataFrame
+
+    Yields:
+        pandas.DataFrame: One batch of rows at a time
+    """
+    if table not in TABLE_SCHEMAS:
+        raise ValueError(f"Unknown export table: {table}")
+    table_dir = os.path.join(directory, fmt, table)
+    if not os.path.isdir(table_dir):
+        return
+
+    dataset = ds.dataset(table_dir, format="parquet" if fmt == "parquet" else "ipc", schema=TABLE_SCHEMAS[table])
+    for batch in dataset.to_batches(columns=columns, filter=filter, batch_size=batch_size):
+        if batch.num_rows:
+            yield batch.to_pandas()
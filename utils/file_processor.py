@@ -4,16 +4,62 @@ import pdfplumber
 import camelot
 import pandas as pd
 import io
+import re
 import tempfile
 import os
+import shutil
+from contextlib import contextmanager
+from functools import lru_cache
 import docx2txt
 import pytesseract
 from PIL import Image
 import cv2
 import numpy as np
+import hashlib
 import streamlit as st
+from pdfminer.pdftypes import resolve1
+from utils.budget import clear_degradation, current_degradations, record_degradation, stage_budget
+from utils.cache import LRUCache, cached_function
+from utils.ocr_cache import OCRCache
 
-@st.cache_data
+# Extracted page text and tables keyed by page fingerprint, so revised versions
+# of a document only re-extract the pages that actually changed
+PAGE_TEXT_CACHE = LRUCache(max_entries=5000, name="page_text")
+PAGE_TABLE_CACHE = LRUCache(max_entries=5000, name="page_tables")
+
+# OCR output keyed by the rendered page image, shared across documents and
+# restarts so repeated cover sheets and signature pages are only OCR'd once
+OCR_CACHE = OCRCache(max_entries=20000, name="ocr_results")
+OCR_LANG = "eng"
+OCR_CONFIG = ""
+
+# Clean up page images with OpenCV before OCR (disable with VAULTIQ_OCR_PREPROCESS=0)
+OCR_PREPROCESSING = os.environ.get("VAULTIQ_OCR_PREPROCESS", "1") != "0"
+OCR_RESOLUTION = 300            # DPI pages are rendered and normalized to for tesseract
+BLANK_PAGE_INK_RATIO = 0.001    # pages with less dark area than this are blank
+BORDER_INK_RATIO = 0.5          # edge rows/columns darker than this are scanner borders
+MAX_SKEW_ANGLE = 5.0            # degrees of skew searched in either direction
+SKEW_STEP = 0.25
+
+# Page triage thresholds
+MIN_TEXT_CHARS = 20             # fewer characters than this is no usable text layer
+THIN_TEXT_CHARS = 200           # a text layer this small may only be a header or stamp
+FULL_PAGE_IMAGE_COVERAGE = 0.8  # share of the page an image needs to count as a scan
+MIN_RULINGS = 4                 # drawn lines/rectangles that suggest a ruled table
+MIN_NUMERIC_ROWS = 3            # lines with several numbers that suggest a borderless table
+
+NUMERIC_CELL_PATTERN = re.compile(r'[$€£(-]?\d[\d,.]*%?\)?')
+
+# Degraded paths when the OCR or table budget runs low (see utils/budget.py)
+OCR_SAMPLE_STEP = 4             # near the limit, OCR only every Nth remaining scanned page
+TABLE_CHUNK_PAGES = 20          # pages per Camelot call, so the table budget is checked in between
+
+# Keyed by the upload's name and bytes; extractions are large, so keep few and not for long.
+# Extractions that sampled OCR or skipped tables to stay within budget are not kept.
+@cached_function(
+    "extracted_documents", max_entries=32, max_mb=512, ttl=3600,
+    cache_if=lambda result: not current_degradations() & {"ocr", "tables"}
+)
 def process_uploaded_file(uploaded_file, enable_ocr=False):
     """
     Process uploaded files (PDF, TXT, DOCX) and extract text and tables
@@ -23,70 +69,377 @@ def process_uploaded_file(uploaded_file, enable_ocr=False):
         enable_ocr: Whether to use OCR for scanned documents
         
     Returns:
-        tuple: (extracted_text, tables)
+        tuple: (extracted_text, tables, pages) where pages holds the text of
+            each page (a single entry for TXT and DOCX files)
     """
     file_extension = uploaded_file.name.split('.')[-1].lower()
     
     if file_extension == 'pdf':
         return process_pdf(uploaded_file, enable_ocr)
     elif file_extension == 'txt':
-        text = uploaded_file.read().decode("utf-8")
-        return text, []
+        # Decode straight from the upload's buffer instead of reading a copy
+        if hasattr(uploaded_file, "getbuffer"):
+            with uploaded_file.getbuffer() as buffer:
+                text = str(buffer, "utf-8")
+        else:
+            text = uploaded_file.read().decode("utf-8")
+        return text, [], [text]
     elif file_extension == 'docx':
         text = docx2txt.process(uploaded_file)
-        return text, []
+        return text, [], [text]
     else:
         raise ValueError(f"Unsupported file type: {file_extension}")
 
 def process_pdf(pdf_file, enable_ocr=False):
-    """Process PDF files to extract text and tables"""
-    # Save the uploaded file to a temporary file
+    """
+    Process PDF files to extract text and tables
+    
+    pdfplumber reads the upload's in-memory buffer (or the file itself when
+    given a path) directly; a temporary file is only written if Camelot has
+    pages left to extract tables from.
+    
+    Every page is triaged first (see triage_page) so it only goes through
+    the extractors it needs: OCR for scans, Camelot for pages that look
+    like tables, nothing at all for blank pages.
+    
+    Near the OCR budget only every OCR_SAMPLE_STEP-th scanned page is still
+    OCR'd, and past it scans keep whatever text layer they have; pages read
+    without OCR are not cached so a later run can fill them in.
+    """
+    if hasattr(pdf_file, "seek"):
+        pdf_file.seek(0)
+    
+    # Extract text using pdfplumber
+    ocr_budget = stage_budget("ocr")
+    ocr_candidates = 0
+    ocr_skipped = 0
+    with pdfplumber.open(pdf_file) as pdf:
+        pages_text = []
+        fingerprints = []
+        non_table_pages = set()
+        for page_number, page in enumerate(pdf.pages, start=1):
+            fingerprint = page_fingerprint(page)
+            fingerprints.append(fingerprint)
+            
+            # Reuse the text of pages seen before (e.g. in an earlier revision)
+            text_key = (fingerprint, enable_ocr)
+            page_text = PAGE_TEXT_CACHE.get(text_key) if fingerprint else None
+            triage = None
+            if page_text is None:
+                triage = triage_page(page)
+                use_ocr = enable_ocr
+                if enable_ocr and triage["kind"] in ("scanned", "mixed"):
+                    ocr_candidates += 1
+                    # Sample scanned pages near the OCR budget, and stop OCR once it is spent
+                    if ocr_budget.exceeded() or (ocr_budget.near_limit() and ocr_candidates % OCR_SAMPLE_STEP):
+                        use_ocr = False
+                        ocr_skipped += 1
+                page_text = extract_page_text(page, use_ocr, triage["kind"]) or ""
+                if fingerprint and use_ocr == enable_ocr:
+                    PAGE_TEXT_CACHE.set(text_key, page_text)
+            
+            pages_text.append(page_text)
+            
+            # Only pages with ruling lines or a numeric grid go to Camelot
+            if not fingerprint or fingerprint not in PAGE_TABLE_CACHE:
+                triage = triage or triage_page(page)
+                if triage["kind"] != "table" and (triage["kind"] == "scanned" or not has_numeric_grid(page_text)):
+                    non_table_pages.add(page_number)
+            
+            # Release the page's parsed objects before moving on
+            page.flush_cache()
+        
+        text = "\n".join(page_text for page_text in pages_text if page_text)
+    
+    if ocr_skipped:
+        record_degradation(
+            "ocr", f"OCR ran on {ocr_candidates - ocr_skipped} of {ocr_candidates} scanned pages "
+            f"(time or memory budget reached after {ocr_budget.elapsed():.0f}s)"
+        )
+    elif enable_ocr:
+        clear_degradation("ocr")
+    
+    # Extract tables using Camelot
+    tables = extract_tables(pdf_file, fingerprints, non_table_pages)
+    
+    return text, tables, pages_text
+
+@contextmanager
+def pdf_path(pdf_file):
+    """Yield a filesystem path for libraries that cannot read from memory"""
+    if isinstance(pdf_file, (str, os.PathLike)):
+        yield os.fspath(pdf_file)
+        return
+    
+    # Write the upload once, straight from its buffer without an intermediate copy
     with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-        tmp_file.write(pdf_file.getvalue())
+        if hasattr(pdf_file, "getbuffer"):
+            with pdf_file.getbuffer() as buffer:
+                tmp_file.write(buffer)
+        else:
+            pdf_file.seek(0)
+            shutil.copyfileobj(pdf_file, tmp_file, 1024 * 1024)
         tmp_path = tmp_file.name
     
     try:
-        # Extract text using pdfplumber
-        with pdfplumber.open(tmp_path) as pdf:
-            pages_text = []
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                
-                # If page has no text and OCR is enabled, apply OCR
-                if not page_text and enable_ocr:
-                    # Convert page to image
-                    img = page.to_image()
-                    # Save image to temporary file
-                    img_path = f"{tmp_path}_page.png"
-                    img.save(img_path)
-                    
-                    # Apply OCR
-                    image = Image.open(img_path)
-                    page_text = pytesseract.image_to_string(image)
-                    
-                    # Clean up
-                    os.remove(img_path)
-                
-                if page_text:
-                    pages_text.append(page_text)
-            
-            text = "\n".join(pages_text)
+        yield tmp_path
+    finally:
+        # Clean up the temporary file
+        os.unlink(tmp_path)
+
+def triage_page(page):
+    """
+    Classify a page from its layout objects without extracting anything
+    
+    Character counts, image coverage and the number of drawn lines and
+    rectangles come from the objects pdfplumber has already parsed, so this
+    costs a fraction of text extraction (which then reuses the same objects).
+    
+    Returns:
+        dict: kind ("blank", "scanned", "mixed", "table" or "text") plus the
+            chars, image_coverage and rulings it was based on
+    """
+    page_area = float(page.width * page.height) or 1.0
+    chars = len(page.chars)
+    
+    # Share of the page covered by images, clipped to the page box
+    image_area = 0.0
+    for image in page.images:
+        width = max(0.0, min(image["x1"], page.width) - max(image["x0"], 0))
+        height = max(0.0, min(image["bottom"], page.height) - max(image["top"], 0))
+        image_area += width * height
+    image_coverage = min(1.0, image_area / page_area)
+    
+    rulings = len(page.lines) + len(page.rects)
+    
+    if chars < MIN_TEXT_CHARS:
+        kind = "scanned" if page.images or page.curves or chars else "blank"
+    elif chars < THIN_TEXT_CHARS and image_coverage >= FULL_PAGE_IMAGE_COVERAGE:
+        kind = "mixed"
+    elif rulings >= MIN_RULINGS:
+        kind = "table"
+    else:
+        kind = "text"
+    
+    return {"kind": kind, "chars": chars, "image_coverage": image_coverage, "rulings": rulings}
+
+def has_numeric_grid(page_text):
+    """Check for borderless tables: several lines that each hold two or more numbers"""
+    numeric_rows = 0
+    for line in page_text.splitlines():
+        cells = line.split()
+        if sum(1 for cell in cells if NUMERIC_CELL_PATTERN.fullmatch(cell)) >= 2:
+            numeric_rows += 1
+            if numeric_rows >= MIN_NUMERIC_ROWS:
+                return True
+    return False
+
+def extract_page_text(page, enable_ocr=False, kind="text"):
+    """Extract the text of a single PDF page with the extractor its triage kind calls for"""
+    if kind == "blank":
+        return ""
+    
+    page_text = page.extract_text() if kind != "scanned" or not enable_ocr else ""
+    
+    # Scans, and thin text layers over a full-page image, need OCR
+    if enable_ocr and (kind in ("scanned", "mixed") or not page_text):
+        # Render the page and hand the in-memory image straight to tesseract
+        resolution = OCR_RESOLUTION if OCR_PREPROCESSING else None
+        image = page.to_image(resolution=resolution).original
+        ocr_text = ocr_image(image, OCR_PREPROCESSING, resolution or 72)
+        if len(ocr_text.strip()) > len((page_text or "").strip()):
+            page_text = ocr_text
+    
+    return page_text
+
+def ocr_image(image, preprocess=OCR_PREPROCESSING, dpi=OCR_RESOLUTION):
+    """Run tesseract on a page image, reusing the result for identical images"""
+    settings = f"{OCR_CONFIG}|preprocess={int(preprocess)}|dpi={dpi}"
+    key = ocr_cache_key(image, OCR_LANG, settings)
+    text = OCR_CACHE.get(key)
+    if text is None:
+        ocr_input = preprocess_for_ocr(image, dpi) if preprocess else image
+        # Blank pages never reach tesseract
+        text = "" if ocr_input is None else pytesseract.image_to_string(ocr_input, lang=OCR_LANG, config=OCR_CONFIG)
+        OCR_CACHE.set(key, text)
+    return text
+
+def preprocess_for_ocr(image, dpi=OCR_RESOLUTION):
+    """
+    Clean up a page image so tesseract reads it faster and more reliably
+    
+    Converts to grayscale, rescales to OCR_RESOLUTION, crops scanner borders
+    and empty margins, binarizes and straightens skewed scans.
+    
+    Args:
+        image: PIL image of the page
+        dpi: Resolution the image was rendered or scanned at
+        
+    Returns:
+        numpy.ndarray: Black-on-white page, or None if the page is blank
+    """
+    gray = np.asarray(image.convert("L"))
+    
+    # Normalize resolution so glyphs have the size tesseract is tuned for
+    scale = OCR_RESOLUTION / float(dpi)
+    if abs(scale - 1) > 0.1:
+        interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=interpolation)
+    
+    # A fixed threshold after despeckling; Otsu would split pure noise on blank pages
+    dark = cv2.medianBlur(gray, 3) < 128
+    
+    # Trim dark scanner borders from each edge
+    row_ink = dark.mean(axis=1)
+    col_ink = dark.mean(axis=0)
+    rows = np.flatnonzero(row_ink <= BORDER_INK_RATIO)
+    cols = np.flatnonzero(col_ink <= BORDER_INK_RATIO)
+    if not len(rows) or not len(cols):
+        return None
+    top, bottom, left, right = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+    dark = dark[top:bottom, left:right]
+    gray = gray[top:bottom, left:right]
+    
+    if dark.mean() < BLANK_PAGE_INK_RATIO:
+        return None
+    
+    # Crop to the inked area plus a small margin
+    ys, xs = np.nonzero(dark)
+    margin = OCR_RESOLUTION // 10
+    gray = gray[
+        max(ys.min() - margin, 0):ys.max() + margin + 1,
+        max(xs.min() - margin, 0):xs.max() + margin + 1
+    ]
+    
+    # Binarize: black text on white
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    
+    # Straighten skewed scans
+    angle = estimate_skew(binary)
+    if abs(angle) >= SKEW_STEP / 2:
+        height, width = binary.shape
+        matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+        binary = cv2.warpAffine(binary, matrix, (width, height), flags=cv2.INTER_NEAREST, borderValue=255)
+    
+    return binary
+
+def estimate_skew(binary):
+    """Find the rotation that makes text lines horizontal, by projection profile sharpness"""
+    # A downscaled copy is enough to find the angle
+    ink = np.where(binary < 128, 255, 0).astype(np.uint8)
+    factor = min(1.0, 1000.0 / max(ink.shape))
+    if factor < 1.0:
+        ink = cv2.resize(ink, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+    height, width = ink.shape
+    center = (width / 2, height / 2)
+    
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(-MAX_SKEW_ANGLE, MAX_SKEW_ANGLE + SKEW_STEP / 2, SKEW_STEP):
+        matrix = cv2.getRotationMatrix2D(center, angle, 1.0)
+        rotated = cv2.warpAffine(ink, matrix, (width, height), flags=cv2.INTER_NEAREST, borderValue=0)
+        # Aligned lines give sharp jumps between text rows and the gaps between them
+        profile = rotated.sum(axis=1, dtype=np.float64)
+        score = float(np.square(np.diff(profile)).sum())
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    
+    return best_angle
+
+def ocr_cache_key(image, lang, config):
+    """Hash the image pixels together with everything that changes the OCR output"""
+    digest = hashlib.sha1(f"{tesseract_version()}|{lang}|{config}|{image.mode}|{image.size}".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+@lru_cache(maxsize=1)
+def tesseract_version():
+    """Installed tesseract version, so upgrades don't serve stale OCR output"""
+    try:
+        return str(pytesseract.get_tesseract_version())
+    except Exception:
+        return "unknown"
+
+def page_fingerprint(page):
+    """Hash a page's content streams and embedded images without extracting it"""
+    try:
+        digest = hashlib.sha1(f"{page.width}x{page.height}".encode())
+        
+        contents = page.page_obj.contents or []
+        for stream in contents:
+            digest.update(resolve1(stream).get_data())
         
-        # Extract tables using Camelot
-        tables = []
+        # Scanned pages differ only in their image XObjects
+        resources = resolve1(page.page_obj.resources) or {}
+        xobjects = resolve1(resources.get("XObject")) or {}
+        for name in sorted(xobjects):
+            xobject = resolve1(xobjects[name])
+            digest.update(str(name).encode())
+            digest.update(getattr(xobject, "rawdata", None) or b"")
+        
+        return digest.hexdigest()
+    except Exception:
+        # An unreadable page is simply never cached
+        return None
+
+def extract_tables(pdf_file, fingerprints, non_table_pages=()):
+    """
+    Extract tables with Camelot, only running it on pages not seen before
+    
+    Pages in non_table_pages were triaged as holding no tables and are
+    recorded as empty without running Camelot on them. Camelot runs on
+    TABLE_CHUNK_PAGES pages at a time and stops once the table budget is
+    near its limit; the remaining pages are left uncached.
+    """
+    # Work out which pages still need table extraction
+    extracted = {}
+    page_numbers = []
+    for page_number, fingerprint in enumerate(fingerprints, start=1):
+        cached = PAGE_TABLE_CACHE.get(fingerprint) if fingerprint else None
+        if cached is not None:
+            extracted[page_number] = cached
+            continue
+        
+        extracted[page_number] = []
+        if page_number not in non_table_pages:
+            page_numbers.append(page_number)
+        elif fingerprint:
+            PAGE_TABLE_CACHE.set(fingerprint, [])
+    
+    budget = stage_budget("tables")
+    done = 0
+    if page_numbers and not budget.near_limit():
         try:
-            table_data = camelot.read_pdf(tmp_path, pages='all', flavor='stream')
-            if len(table_data) > 0:
-                for i in range(len(table_data)):
-                    tables.append(table_data[i].df)
+            # Camelot only accepts paths, so this is the one place a file may be written
+            with pdf_path(pdf_file) as path:
+                while done < len(page_numbers) and not budget.near_limit():
+                    chunk = page_numbers[done:done + TABLE_CHUNK_PAGES]
+                    pages = 'all' if len(chunk) == len(fingerprints) else ','.join(map(str, chunk))
+                    table_data = camelot.read_pdf(path, pages=pages, flavor='stream')
+                    for i in range(len(table_data)):
+                        extracted.setdefault(int(table_data[i].page), []).append(table_data[i].df)
+                    
+                    for page_number in chunk:
+                        fingerprint = fingerprints[page_number - 1]
+                        if fingerprint:
+                            PAGE_TABLE_CACHE.set(fingerprint, extracted[page_number])
+                    done += len(chunk)
         except Exception as e:
             st.warning(f"Table extraction error: {str(e)}")
-        
-        return text, tables
     
-    finally:
-        # Clean up the temporary file
-        os.unlink(tmp_path)
+    if done < len(page_numbers) and budget.near_limit():
+        record_degradation(
+            "tables", f"Table extraction skipped on {len(page_numbers) - done} of {len(page_numbers)} "
+            f"candidate pages (time or memory budget reached)"
+        )
+    else:
+        clear_degradation("tables")
+    
+    # Assemble tables in page order
+    tables = []
+    for page_number in sorted(extracted):
+        tables.extend(extracted[page_number])
+    
+    return tables
 
 def preprocess_text(text):
     """Clean and normalize text for better analysis"""
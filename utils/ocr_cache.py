@@ -0,0 +1,109 @@
+# utils/ocr_cache.py
+
+import os
+import sqlite3
+import threading
+import time
+from utils.cache import CACHE_REGISTRY
+
+# Location of the persistent OCR cache (override with VAULTIQ_OCR_CACHE_PATH)
+DEFAULT_OCR_CACHE_PATH = os.environ.get("VAULTIQ_OCR_CACHE_PATH", os.path.join("data", "ocr_cache.db"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ocr_results (
+    image_hash TEXT PRIMARY KEY,
+    text TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_ocr_last_used ON ocr_results(last_used);
+"""
+
+class OCRCache:
+    """
+    Persistent, bounded cache of OCR output keyed by page image hash
+
+    Results live in SQLite so they survive restarts and are shared by every
+    session. Once the cache holds more than max_entries results, the least
+    recently used tenth is dropped. The database is only opened on first use.
+    """
+
+    def __init__(self, db_path=DEFAULT_OCR_CACHE_PATH, max_entries=20000, name=None):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._conn = None
+        self._lock = threading.Lock()
+        if name:
+            CACHE_REGISTRY[name] = self
+
+    def _connection(self):
+        if self._conn is None:
+            if self.db_path != ":memory:":
+                os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def get(self, key, default=None):
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT text FROM ocr_results WHERE image_hash = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            with conn:
+                conn.execute("UPDATE ocr_results SET last_used = ? WHERE image_hash = ?", (time.time(), key))
+            return row[0]
+
+    def set(self, key, value):
+        with self._lock:
+            conn = self._connection()
+            now = time.time()
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO ocr_results VALUES (?, ?, ?, ?)", (key, value, now, now))
+                count = conn.execute("SELECT COUNT(*) FROM ocr_results").fetchone()[0]
+                if count > self.max_entries:
+                    # Evict in batches so a full cache isn't trimmed on every insert
+                    excess = count - self.max_entries + max(1, self.max_entries // 10)
+                    conn.execute(
+                        "DELETE FROM ocr_results WHERE image_hash IN "
+                        "(SELECT image_hash FROM ocr_results ORDER BY last_used LIMIT ?)",
+                        (excess,)
+                    )
+                    self.evictions += excess
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._connection().execute(
+                "SELECT 1 FROM ocr_results WHERE image_hash = ?", (key,)
+            ).fetchone() is not None
+
+    def __len__(self):
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM ocr_results").fetchone()[0]
+
+    def clear(self):
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM ocr_results")
+
+    def stats(self):
+        """Return hit/miss/eviction counters for this cache"""
+        lookups = self.hits + self.misses
+        return {
+            "cache": self.name,
+            "entries": len(self),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
@@ -0,0 +1,229 @@
+# utils/portfolio.py
+
+import io
+import os
+import zipfile
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils.file_processor import process_uploaded_file
+from Analysis.financial_analyzer import analyze_financials, parse_financial_value
+from Analysis.legal_analyzer import analyze_legal_document
+from Analysis.compliance_checker import check_compliance, prefetch_sentence_embeddings
+from Analysis.document_index import get_document_index
+from utils.result_store import build_record
+from utils.budget import degradations_for, document_budget
+
+SUPPORTED_EXTENSIONS = {"pdf", "txt", "docx"}
+
+# Keep the pool small: spaCy and the sentence transformer are shared across workers
+DEFAULT_MAX_WORKERS = min(4, os.cpu_count() or 1)
+
+class NamedBytesIO(io.BytesIO):
+    """In-memory file with a name, usable wherever an uploaded file is expected"""
+
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+
+def expand_uploads(uploaded_files):
+    """Flatten uploaded files and ZIP archives into a list of supported documents"""
+    documents = []
+
+    for uploaded_file in uploaded_files:
+        extension = uploaded_file.name.split('.')[-1].lower()
+
+        if extension == "zip":
+            with zipfile.ZipFile(uploaded_file) as archive:
+                for member in archive.infolist():
+                    member_name = os.path.basename(member.filename)
+                    # Skip folders, hidden files and macOS resource forks
+                    if member.is_dir() or member.filename.startswith('__MACOSX') or member_name.startswith('.'):
+                        continue
+                    if member_name.split('.')[-1].lower() in SUPPORTED_EXTENSIONS:
+                        documents.append(NamedBytesIO(archive.read(member), member.filename))
+        elif extension in SUPPORTED_EXTENSIONS:
+            documents.append(uploaded_file)
+
+    return documents
+
+def analyze_document(document, enable_ocr=False, confidence_threshold=0.5, on_extracted=None, on_analyzed=None):
+    """Run the full analysis on one document and flatten the results into rows"""
+    name = document.name
+
+    # Stages close to the document's time or memory budget fall back to cheaper paths
+    with document_budget() as budget:
+        text, tables, pages = process_uploaded_file(document, enable_ocr=enable_ocr)
+        budget.attach(text)
+        get_document_index(text, pages)
+
+        # Start encoding this document's sentences alongside the other workers' documents
+        prefetch_sentence_embeddings(text)
+
+        # Let the caller use the extracted pages (e.g. for search indexing) before they are dropped
+        if on_extracted:
+            on_extracted(name, text, pages)
+
+        financial_results = analyze_financials(text, tables)
+        legal_results = analyze_legal_document(text, confidence_threshold)
+        compliance_results = check_compliance(text, confidence_threshold)
+
+        # Hand the full results to the caller (e.g. a streaming exporter) before they are dropped
+        if on_analyzed:
+            on_analyzed(name, text, pages, tables, financial_results, legal_results, compliance_results)
+
+    # Only compact rows leave the worker, never the full text or tables
+    risk_rows = [
+        {
+            "document": name,
+            "category": category,
+            "found": details["found"],
+            # Missing clauses can be a risk in themselves, so keep their level
+            "risk_level": "Not Checked" if details.get("skipped")
+            else details["risk_level"] if details["risk_level"] != "N/A" else "Not Found"
+        }
+        for category, details in legal_results["risk_clauses"].items()
+    ]
+
+    compliance_rows = [
+        {
+            "document": name,
+            "category": category,
+            "requirement": check["description"],
+            "compliant": check["compliant"],
+            "confidence": check["confidence"]
+        }
+        for category, checks in compliance_results["checks"].items()
+        for check in checks
+    ]
+
+    metric_rows = [
+        {
+            "document": name,
+            "metric": metric,
+            "value": parse_financial_value(value),
+            "display": value
+        }
+        for metric, value in financial_results["metrics"].items()
+    ]
+
+    degraded_rows = [
+        {"document": name, "stage": stage, "detail": detail}
+        for stage, detail in degradations_for(text).items()
+    ]
+
+    return {
+        "document": name,
+        "pages": len(pages),
+        "risk_rows": risk_rows,
+        "compliance_rows": compliance_rows,
+        "metric_rows": metric_rows,
+        "degraded_rows": degraded_rows,
+        "record": build_record(name, text, pages, financial_results, legal_results, compliance_results)
+    }
+
+def analyze_portfolio(documents, enable_ocr=False, confidence_threshold=0.5,
+                      max_workers=DEFAULT_MAX_WORKERS, initializer=None, progress_callback=None,
+                      on_extracted=None, on_analyzed=None):
+    """
+    Analyze many documents in parallel with a bounded worker pool
+
+    Args:
+        documents: File-like objects with a `name` attribute (see expand_uploads)
+        enable_ocr: Whether to use OCR for scanned documents
+        confidence_threshold: Minimum confidence level for detection
+        max_workers: Upper bound on concurrently analyzed documents
+        initializer: Optional callable run in each worker thread on start
+        progress_callback: Optional callable receiving (completed, total, name)
+        on_extracted: Optional callable receiving (name, text, pages) in the
+            worker right after text extraction
+        on_analyzed: Optional callable receiving (name, text, pages, tables,
+            financial_results, legal_results, compliance_results) in the
+            worker once the document is analyzed, e.g. ResultExporter.write
+
+    Returns:
+        dict: Columnar DataFrames for risks, compliance, metrics, degraded
+            stages and failures, plus per-document records for the result store
+    """
+    risk_rows, compliance_rows, metric_rows, degraded_rows, failures, records = [], [], [], [], [], []
+    documents = list(documents)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), initializer=initializer) as executor:
+        futures = {
+            executor.submit(
+                analyze_document, document, enable_ocr, confidence_threshold, on_extracted, on_analyzed
+            ): document.name
+            for document in documents
+        }
+
+        for completed, future in enumerate(as_completed(futures), start=1):
+            name = futures[future]
+            try:
+                result = future.result()
+                risk_rows.extend(result["risk_rows"])
+                compliance_rows.extend(result["compliance_rows"])
+                metric_rows.extend(result["metric_rows"])
+                degraded_rows.extend(result["degraded_rows"])
+                records.append(result["record"])
+            except Exception as e:
+                failures.append({"document": name, "error": str(e)})
+
+            if progress_callback:
+                progress_callback(completed, len(documents), name)
+
+    return {
+        "risks": pd.DataFrame(risk_rows, columns=["document", "category", "found", "risk_level"]),
+        "compliance": pd.DataFrame(
+            compliance_rows, columns=["document", "category", "requirement", "compliant", "confidence"]
+        ),
+        "metrics": pd.DataFrame(metric_rows, columns=["document", "metric", "value", "display"]),
+        "degraded": pd.DataFrame(degraded_rows, columns=["document", "stage", "detail"]),
+        "failures": pd.DataFrame(failures, columns=["document", "error"]),
+        "records": records
+    }
+
+def aggregate_portfolio(portfolio):
+    """
+    Build portfolio-level views from the columnar analysis results
+
+    Args:
+        portfolio: Output of analyze_portfolio
+
+    Returns:
+        dict: Risk level counts per clause category, compliance gaps per
+            requirement and financial metrics side by side
+    """
+    risks = portfolio["risks"]
+    compliance = portfolio["compliance"]
+    metrics = portfolio["metrics"]
+
+    # Documents per risk level for every legal clause category
+    risk_levels = ["High", "Medium", "Low", "Not Found", "Not Checked"]
+    risk_by_category = (
+        pd.crosstab(risks["category"], risks["risk_level"])
+        .reindex(columns=risk_levels, fill_value=0)
+        if not risks.empty else pd.DataFrame(columns=risk_levels)
+    )
+
+    # Share of documents missing each requirement
+    if not compliance.empty:
+        compliance_gaps = (
+            compliance.assign(gap=~compliance["compliant"].astype(bool))
+            .groupby(["category", "requirement"], sort=False)["gap"]
+            .agg(documents_missing="sum", gap_rate="mean")
+            .reset_index()
+            .sort_values("gap_rate", ascending=False)
+        )
+    else:
+        compliance_gaps = pd.DataFrame(columns=["category", "requirement", "documents_missing", "gap_rate"])
+
+    # One column per document, one row per metric
+    metrics_by_document = (
+        metrics.pivot_table(index="metric", columns="document", values="value", aggfunc="first")
+        if not metrics.empty else pd.DataFrame()
+    )
+
+    return {
+        "risk_by_category": risk_by_category,
+        "compliance_gaps": compliance_gaps,
+        "metrics_by_document": metrics_by_document
+    }
@@ -0,0 +1,281 @@
+# utils/result_store.py
+
+import os
+import sqlite3
+import threading
+import time
+import pandas as pd
+from utils.cache import content_hash
+from Analysis.financial_analyzer import parse_financial_value
+
+# Location of the local results database (override with VAULTIQ_DB_PATH)
+DEFAULT_DB_PATH = os.environ.get("VAULTIQ_DB_PATH", os.path.join("data", "vaultiq.db"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    doc_hash TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    analyzed_at REAL NOT NULL,
+    page_count INTEGER NOT NULL,
+    contract_type TEXT,
+    governing_law TEXT,
+    contract_value TEXT,
+    duration TEXT,
+    overall_compliant INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS contract_parties (
+    doc_hash TEXT NOT NULL REFERENCES documents(doc_hash) ON DELETE CASCADE,
+    party TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS contract_dates (
+    doc_hash TEXT NOT NULL REFERENCES documents(doc_hash) ON DELETE CASCADE,
+    date_text TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS risk_clauses (
+    doc_hash TEXT NOT NULL REFERENCES documents(doc_hash) ON DELETE CASCADE,
+    category TEXT NOT NULL,
+    found INTEGER NOT NULL,
+    risk_level TEXT NOT NULL,
+    match_count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS compliance_checks (
+    doc_hash TEXT NOT NULL REFERENCES documents(doc_hash) ON DELETE CASCADE,
+    category TEXT NOT NULL,
+    requirement TEXT NOT NULL,
+    compliant INTEGER NOT NULL,
+    confidence REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    doc_hash TEXT NOT NULL REFERENCES documents(doc_hash) ON DELETE CASCADE,
+    metric TEXT NOT NULL,
+    value REAL,
+    display TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS trends (
+    doc_hash TEXT NOT NULL REFERENCES documents(doc_hash) ON DELETE CASCADE,
+    metric TEXT NOT NULL,
+    period TEXT NOT NULL,
+    value REAL,
+    display TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_documents_filename ON documents(filename);
+CREATE INDEX IF NOT EXISTS idx_parties_doc ON contract_parties(doc_hash);
+CREATE INDEX IF NOT EXISTS idx_parties_party ON contract_parties(party);
+CREATE INDEX IF NOT EXISTS idx_dates_doc ON contract_dates(doc_hash);
+CREATE INDEX IF NOT EXISTS idx_risk_doc ON risk_clauses(doc_hash);
+CREATE INDEX IF NOT EXISTS idx_risk_category_level ON risk_clauses(category, risk_level);
+CREATE INDEX IF NOT EXISTS idx_risk_level ON risk_clauses(risk_level);
+CREATE INDEX IF NOT EXISTS idx_compliance_doc ON compliance_checks(doc_hash);
+CREATE INDEX IF NOT EXISTS idx_compliance_requirement ON compliance_checks(requirement, compliant);
+CREATE INDEX IF NOT EXISTS idx_compliance_category ON compliance_checks(category, compliant);
+CREATE INDEX IF NOT EXISTS idx_metrics_doc ON metrics(doc_hash);
+CREATE INDEX IF NOT EXISTS idx_metrics_metric_value ON metrics(metric, value);
+CREATE INDEX IF NOT EXISTS idx_trends_doc ON trends(doc_hash);
+CREATE INDEX IF NOT EXISTS idx_trends_metric_period ON trends(metric, period);
+"""
+
+CHILD_TABLES = ["contract_parties", "contract_dates", "risk_clauses", "compliance_checks", "metrics", "trends"]
+
+# One connection is shared by the app's threads (and SQLite allows one writer
+# at a time), so every read and write holds this lock
+_lock = threading.Lock()
+
+def open_store(db_path=DEFAULT_DB_PATH):
+    """Open (and create if needed) the results database"""
+    if db_path != ":memory:":
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.executescript(SCHEMA)
+    return conn
+
+def build_record(filename, text, pages, financial_results, legal_results, compliance_results):
+    """Flatten one document's analysis results into a storable record"""
+    contract_info = legal_results["contract_info"]
+
+    return {
+        "doc_hash": content_hash(text),
+        "filename": filename,
+        "page_count": len(pages),
+        "contract_info": contract_info,
+        "contract_value": legal_results.get("contract_value"),
+        "duration": legal_results.get("duration"),
+        "overall_compliant": compliance_results["overall_compliant"],
+        "risk_clauses": [
+            (category, details["found"], details["risk_level"], len(details["patterns_matched"]))
+            for category, details in legal_results["risk_clauses"].items()
+        ],
+        "compliance": [
+            (category, check["description"], check["compliant"], check["confidence"])
+            for category, checks in compliance_results["checks"].items()
+            for check in checks
+        ],
+        "metrics": [
+            (metric, parse_financial_value(value), str(value))
+            for metric, value in financial_results["metrics"].items()
+        ],
+        "trends": [
+            (metric, period, parse_financial_value(value), str(value))
+            for metric, period_values in financial_results["trends"].items()
+            for period, value in period_values.items()
+        ]
+    }
+
+def save_results(conn, records):
+    """
+    Bulk insert analysis records in a single transaction
+
+    Documents that were stored before are replaced, so re-analyzing a
+    document never leaves stale child rows behind.
+
+    Args:
+        conn: Connection from open_store
+        records: Iterable of records from build_record
+
+    Returns:
+        int: Number of documents written
+    """
+    records = list(records)
+    if not records:
+        return 0
+
+    analyzed_at = time.time()
+    rows = {table: [] for table in CHILD_TABLES}
+    documents = []
+
+    for record in records:
+        doc_hash = record["doc_hash"]
+        info = record["contract_info"]
+        documents.append((
+            doc_hash, record["filename"], analyzed_at, record["page_count"],
+            info.get("contract_type"), info.get("governing_law"),
+            record["contract_value"], record["duration"], int(record["overall_compliant"])
+        ))
+        rows["contract_parties"].extend((doc_hash, party) for party in info.get("parties", []))
+        rows["contract_dates"].extend((doc_hash, date) for date in info.get("dates", []))
+        rows["risk_clauses"].extend(
+            (doc_hash, category, int(found), level, count)
+            for category, found, level, count in record["risk_clauses"]
+        )
+        rows["compliance_checks"].extend(
+            (doc_hash, category, requirement, int(compliant), float(confidence))
+            for category, requirement, compliant, confidence in record["compliance"]
+        )
+        rows["metrics"].extend((doc_hash, *metric) for metric in record["metrics"])
+        rows["trends"].extend((doc_hash, *trend) for trend in record["trends"])
+
+    with _lock, conn:
+        # Only clear child rows of documents that are already stored
+        hashes = [document[0] for document in documents]
+        existing = []
+        for start in range(0, len(hashes), 500):
+            chunk = hashes[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            existing.extend(conn.execute(
+                f"SELECT doc_hash FROM documents WHERE doc_hash IN ({placeholders})", chunk
+            ).fetchall())
+        for table in CHILD_TABLES:
+            conn.executemany(f"DELETE FROM {table} WHERE doc_hash = ?", existing)
+        conn.executemany("INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", documents)
+        conn.executemany("INSERT INTO contract_parties VALUES (?, ?)", rows["contract_parties"])
+        conn.executemany("INSERT INTO contract_dates VALUES (?, ?)", rows["contract_dates"])
+        conn.executemany("INSERT INTO risk_clauses VALUES (?, ?, ?, ?, ?)", rows["risk_clauses"])
+        conn.executemany("INSERT INTO compliance_checks VALUES (?, ?, ?, ?, ?)", rows["compliance_checks"])
+        conn.executemany("INSERT INTO metrics VALUES (?, ?, ?, ?)", rows["metrics"])
+        conn.executemany("INSERT INTO trends VALUES (?, ?, ?, ?, ?)", rows["trends"])
+
+    return len(documents)
+
+def _where(filters):
+    """Build a WHERE clause from (column, operator, value) filters, skipping unset values"""
+    clauses, params = [], []
+    for column, operator, value in filters:
+        if value is None:
+            continue
+        clauses.append(f"{column} {operator} ?")
+        params.append(value)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+def query_risk_clauses(conn, category=None, risk_level=None, found=None, limit=1000):
+    """Find documents by risk clause category and level, e.g. High-risk Indemnification"""
+    where, params = _where([
+        ("r.category", "=", category),
+        ("r.risk_level", "=", risk_level),
+        ("r.found", "=", None if found is None else int(found))
+    ])
+    sql = (
+        "SELECT d.filename, d.doc_hash, r.category, r.risk_level, r.found, r.match_count, d.analyzed_at "
+        "FROM risk_clauses r JOIN documents d ON d.doc_hash = r.doc_hash"
+        f"{where} ORDER BY d.analyzed_at DESC LIMIT ?"
+    )
+    return _read_query(conn, sql, params + [limit])
+
+def query_compliance(conn, requirement=None, category=None, compliant=None, limit=1000):
+    """Find documents by compliance requirement and status"""
+    where, params = _where([
+        ("c.requirement", "=", requirement),
+        ("c.category", "=", category),
+        ("c.compliant", "=", None if compliant is None else int(compliant))
+    ])
+    sql = (
+        "SELECT d.filename, d.doc_hash, c.category, c.requirement, c.compliant, c.confidence "
+        "FROM compliance_checks c JOIN documents d ON d.doc_hash = c.doc_hash"
+        f"{where} ORDER BY d.analyzed_at DESC LIMIT ?"
+    )
+    return _read_query(conn, sql, params + [limit])
+
+def query_metrics(conn, metric=None, min_value=None, max_value=None, limit=1000):
+    """Find documents by financial metric value range"""
+    where, params = _where([
+        ("m.metric", "=", metric),
+        ("m.value", ">=", min_value),
+        ("m.value", "<=", max_value)
+    ])
+    sql = (
+        "SELECT d.filename, d.doc_hash, m.metric, m.value, m.display "
+        "FROM metrics m JOIN documents d ON d.doc_hash = m.doc_hash"
+        f"{where} ORDER BY m.value DESC LIMIT ?"
+    )
+    return _read_query(conn, sql, params + [limit])
+
+def query_trends(conn, metric=None, period=None, doc_hash=None, limit=1000):
+    """Fetch stored trend values by metric, period or document"""
+    where, params = _where([
+        ("t.metric", "=", metric),
+        ("t.period", "=", period),
+        ("t.doc_hash", "=", doc_hash)
+    ])
+    sql = (
+        "SELECT d.filename, t.doc_hash, t.metric, t.period, t.value, t.display "
+        "FROM trends t JOIN documents d ON d.doc_hash = t.doc_hash"
+        f"{where} ORDER BY t.metric, t.period LIMIT ?"
+    )
+    return _read_query(conn, sql, params + [limit])
+
+def update_compliance(conn, doc_hash, compliance_results):
+    """Replace a stored document's compliance rows, e.g. after a threshold change"""
+    rows = [
+        (doc_hash, category, check["description"], int(check["compliant"]), float(check["confidence"]))
+        for category, checks in compliance_results["checks"].items()
+        for check in checks
+    ]
+    with _lock, conn:
+        conn.execute("DELETE FROM compliance_checks WHERE doc_hash = ?", (doc_hash,))
+        conn.executemany("INSERT INTO compliance_checks VALUES (?, ?, ?, ?, ?)", rows)
+        conn.execute(
+            "UPDATE documents SET overall_compliant = ? WHERE doc_hash = ?",
+            (int(compliance_results["overall_compliant"]), doc_hash)
+        )
+
+def _read_query(conn, sql, params):
+    """Run a query on the shared connection into a DataFrame"""
+    with _lock:
+        return pd.read_sql_query(sql, conn, params=params)
+
+def count_documents(conn):
+    """Return the number of stored documents"""
+    with _lock:
+        return conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
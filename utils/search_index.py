@@ -0,0 +1,140 @@
+# utils/search_index.py
+
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# Location of the full-text index (override with VAULTIQ_SEARCH_DB_PATH)
+DEFAULT_SEARCH_DB_PATH = os.environ.get("VAULTIQ_SEARCH_DB_PATH", os.path.join("data", "search_index.db"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS indexed_documents (
+    doc_hash TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    page_count INTEGER NOT NULL,
+    indexed_at REAL NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS page_text USING fts5(
+    text,
+    doc_hash UNINDEXED,
+    filename UNINDEXED,
+    page UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3 4'
+);
+"""
+
+# Queries that already use FTS5 syntax are passed through untouched
+FTS_SYNTAX_PATTERN = re.compile(r'["*()]|\b(AND|OR|NOT|NEAR)\b')
+
+# One connection is shared by the app's threads, so reads and writes both hold
+# this lock (reentrant: index_document checks is_indexed while holding it)
+_lock = threading.RLock()
+
+def open_search_index(db_path=DEFAULT_SEARCH_DB_PATH):
+    """Open (and create if needed) the full-text page index"""
+    if db_path != ":memory:":
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+def is_indexed(conn, doc_hash):
+    """Check whether a document's pages are already in the index"""
+    with _lock:
+        return conn.execute(
+            "SELECT 1 FROM indexed_documents WHERE doc_hash = ?", (doc_hash,)
+        ).fetchone() is not None
+
+def index_document(conn, doc_hash, filename, pages):
+    """
+    Add a document's extracted page text to the index
+
+    Indexing is incremental: a document whose hash is already indexed is
+    skipped, so re-uploads cost a single primary key lookup.
+
+    Args:
+        conn: Connection from open_search_index
+        doc_hash: Content hash of the document text
+        filename: Original file name, returned with search hits
+        pages: List of page texts as produced by process_uploaded_file
+
+    Returns:
+        bool: True if the document was newly indexed
+    """
+    with _lock, conn:
+        if is_indexed(conn, doc_hash):
+            return False
+
+        conn.executemany(
+            "INSERT INTO page_text (text, doc_hash, filename, page) VALUES (?, ?, ?, ?)",
+            [(page, doc_hash, filename, number) for number, page in enumerate(pages, start=1) if page]
+        )
+        conn.execute(
+            "INSERT INTO indexed_documents VALUES (?, ?, ?, ?)",
+            (doc_hash, filename, len(pages), time.time())
+        )
+    return True
+
+def remove_document(conn, doc_hash):
+    """Drop a document from the index"""
+    with _lock, conn:
+        conn.execute("DELETE FROM page_text WHERE doc_hash = ?", (doc_hash,))
+        conn.execute("DELETE FROM indexed_documents WHERE doc_hash = ?", (doc_hash,))
+
+def to_match_query(query):
+    """
+    Turn user input into an FTS5 MATCH expression
+
+    Plain words are quoted and must all appear on the page, so punctuation
+    in input like "net-90" can't break the query. Input that already uses
+    FTS5 syntax ("exact phrase", prefix*, AND/OR/NOT, NEAR) is used as is.
+    """
+    query = query.strip()
+    if FTS_SYNTAX_PATTERN.search(query):
+        return query
+
+    terms = re.findall(r"\w+", query)
+    return " ".join(f'"{term}"' for term in terms)
+
+def search_pages(conn, query, limit=50):
+    """
+    Search the indexed archive and return page-level hits
+
+    Args:
+        conn: Connection from open_search_index
+        query: Words, "exact phrases" or prefix* queries
+        limit: Maximum number of hits
+
+    Returns:
+        list: Dicts with filename, doc_hash, page and a highlighted snippet,
+            best matches first
+    """
+    match_query = to_match_query(query)
+    if not match_query:
+        return []
+
+    try:
+        with _lock:
+            rows = conn.execute(
+                "SELECT filename, doc_hash, page, snippet(page_text, 0, '**', '**', '…', 16) "
+                "FROM page_text WHERE page_text MATCH ? ORDER BY rank LIMIT ?",
+                (match_query, limit)
+            ).fetchall()
+    except sqlite3.OperationalError as e:
+        raise ValueError(f"Invalid search query: {query}") from e
+
+    return [
+        {"filename": filename, "doc_hash": doc_hash, "page": page, "snippet": snippet}
+        for filename, doc_hash, page, snippet in rows
+    ]
+
+def optimize_index(conn):
+    """Merge FTS5 index segments after large batch imports"""
+    with _lock, conn:
+        conn.execute("INSERT INTO page_text (page_text) VALUES ('optimize')")
@@ -0,0 +1,283 @@
+# utils/vector_index.py
+
+import json
+import os
+import shutil
+import threading
+import time
+from collections import defaultdict
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+
+# Location of the persisted clause vector index (override with VAULTIQ_VECTOR_INDEX_PATH)
+DEFAULT_VECTOR_INDEX_PATH = os.environ.get("VAULTIQ_VECTOR_INDEX_PATH", os.path.join("data", "vector_index"))
+
+# Below this many vectors an exact scan is already fast, so no clustering is trained
+MIN_TRAINING_VECTORS = 4096
+
+# save_if_due writes the index once this many documents changed, or this many
+# seconds after the first unsaved change
+SAVE_EVERY_DOCUMENTS = 20
+SAVE_INTERVAL = 300
+
+# Share of tombstoned vectors above which a save compacts the index first
+COMPACT_DELETED_SHARE = 0.25
+
+class VectorIndex:
+    """
+    Approximate nearest-neighbour index over normalized sentence embeddings
+
+    Vectors are grouped into k-means lists (an inverted-file index); a query
+    only scores the vectors of the `nprobe` lists closest to it. Deletes are
+    tombstones until `compact` rewrites the arrays.
+
+    Each save writes a complete new generation directory and then switches
+    the CURRENT pointer to it, so a crash mid-save leaves the previous
+    generation intact.
+    """
+
+    def __init__(self, nprobe=8):
+        self.nprobe = nprobe
+        self.vectors = None
+        self.metadata = []
+        self.deleted = np.zeros(0, dtype=bool)
+        self.centroids = None
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self.trained_size = 0
+        self._pending = []
+        self._lists = None
+        self._doc_rows = defaultdict(list)
+        self._unsaved_documents = set()
+        self._unsaved_since = None
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.metadata) - int(self.deleted.sum())
+
+    def add(self, vectors, metadata):
+        """Append vectors with one metadata dict each (doc_hash, filename, offset, text...)"""
+        vectors = normalize(np.asarray(vectors, dtype=np.float32))
+        if len(vectors) != len(metadata):
+            raise ValueError("Each vector needs exactly one metadata entry")
+        if not len(vectors):
+            return
+
+        with self._lock:
+            start = len(self.metadata)
+            for row, meta in enumerate(metadata, start=start):
+                self._doc_rows[meta["doc_hash"]].append(row)
+            self._pending.append(vectors)
+            self.metadata.extend(metadata)
+            self.deleted = np.concatenate([self.deleted, np.zeros(len(vectors), dtype=bool)])
+            self._mark_unsaved(meta["doc_hash"] for meta in metadata)
+
+    def contains_document(self, doc_hash):
+        """Check whether any live vector belongs to the document"""
+        with self._lock:
+            return any(not self.deleted[row] for row in self._doc_rows.get(doc_hash, []))
+
+    def delete_document(self, doc_hash):
+        """Tombstone every vector of a document; returns how many were removed"""
+        with self._lock:
+            rows = [row for row in self._doc_rows.pop(doc_hash, []) if not self.deleted[row]]
+            self.deleted[rows] = True
+            if rows:
+                self._mark_unsaved([doc_hash])
+            return len(rows)
+
+    def replace_filename(self, filename, doc_hash):
+        """Delete earlier versions of a file (same filename, other content); returns how many"""
+        with self._lock:
+            replaced = [
+                other for other, rows in self._doc_rows.items()
+                if other != doc_hash and rows and self.metadata[rows[0]]["filename"] == filename
+            ]
+            return sum(self.delete_document(other) for other in replaced)
+
+    def search(self, query, k=10):
+        """
+        Return the k most similar live vectors
+
+        Args:
+            query: Embedding of the query text
+            k: Number of results
+
+        Returns:
+            list: Metadata dicts extended with a cosine `score`, best first
+        """
+        query = normalize(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+
+        with self._lock:
+            self._consolidate()
+            if self.vectors is None or not len(self):
+                return []
+
+            candidates = self._candidates(query)
+            candidates = candidates[~self.deleted[candidates]]
+            if not len(candidates):
+                return []
+
+            scores = self.vectors[candidates] @ query
+            top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+
+            return [dict(self.metadata[candidates[i]], score=float(scores[i])) for i in top]
+
+    def compact(self):
+        """Drop tombstoned vectors and retrain the lists once the index has doubled"""
+        with self._lock:
+            self._consolidate()
+            if self.vectors is None:
+                return
+
+            keep = ~self.deleted
+            self.vectors = np.ascontiguousarray(self.vectors[keep])
+            self.metadata = [meta for meta, alive in zip(self.metadata, keep) if alive]
+            self.deleted = np.zeros(len(self.metadata), dtype=bool)
+            self.assignments = self.assignments[keep] if self.centroids is not None else self.assignments
+            self._rebuild_doc_rows()
+
+            if len(self.vectors) >= MIN_TRAINING_VECTORS and len(self.vectors) >= 2 * self.trained_size:
+                self._train()
+            elif len(self.vectors) < MIN_TRAINING_VECTORS:
+                self.centroids = None
+                self.trained_size = 0
+            self._lists = None
+
+    def save(self, path=DEFAULT_VECTOR_INDEX_PATH):
+        """Persist the index to a directory as a new generation, then switch to it"""
+        with self._lock:
+            if len(self.deleted) and self.deleted.mean() > COMPACT_DELETED_SHARE:
+                self.compact()
+            self._consolidate()
+            os.makedirs(path, exist_ok=True)
+
+            # Write every file of the new generation before anything points to it
+            generation = f"gen-{time.time_ns()}"
+            tmp_dir = os.path.join(path, f".{generation}.tmp")
+            os.makedirs(tmp_dir)
+            vectors = self.vectors if self.vectors is not None else np.zeros((0, 0), dtype=np.float32)
+            np.save(os.path.join(tmp_dir, "vectors.npy"), vectors)
+            np.save(os.path.join(tmp_dir, "deleted.npy"), self.deleted)
+            np.save(os.path.join(tmp_dir, "assignments.npy"), self.assignments)
+            if self.centroids is not None:
+                np.save(os.path.join(tmp_dir, "centroids.npy"), self.centroids)
+            with open(os.path.join(tmp_dir, "metadata.json"), "w", encoding="utf-8") as f:
+                json.dump({"trained_size": self.trained_size, "metadata": self.metadata}, f)
+            os.replace(tmp_dir, os.path.join(path, generation))
+
+            # Switch the pointer atomically, then drop older generations
+            pointer_tmp = os.path.join(path, ".CURRENT.tmp")
+            with open(pointer_tmp, "w", encoding="utf-8") as f:
+                f.write(generation)
+            os.replace(pointer_tmp, os.path.join(path, "CURRENT"))
+            for name in os.listdir(path):
+                if name != generation and (name.startswith("gen-") or name.startswith(".gen-")):
+                    shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+
+            self._unsaved_documents = set()
+            self._unsaved_since = None
+
+    def save_if_due(self, path=DEFAULT_VECTOR_INDEX_PATH):
+        """Save once enough documents changed or the oldest unsaved change is old enough"""
+        with self._lock:
+            if not self._unsaved_documents:
+                return False
+            if (len(self._unsaved_documents) < SAVE_EVERY_DOCUMENTS
+                    and time.monotonic() - self._unsaved_since < SAVE_INTERVAL):
+                return False
+            self.save(path)
+            return True
+
+    def flush(self, path=DEFAULT_VECTOR_INDEX_PATH):
+        """Save if anything changed since the last save (e.g. at shutdown)"""
+        with self._lock:
+            if self._unsaved_documents:
+                self.save(path)
+
+    def _mark_unsaved(self, doc_hashes):
+        self._unsaved_documents.update(doc_hashes)
+        if self._unsaved_since is None:
+            self._unsaved_since = time.monotonic()
+
+    @classmethod
+    def load(cls, path=DEFAULT_VECTOR_INDEX_PATH, nprobe=8):
+        """Load the current generation of a saved index, or return an empty one"""
+        index = cls(nprobe=nprobe)
+        pointer = os.path.join(path, "CURRENT")
+        if os.path.exists(pointer):
+            with open(pointer, encoding="utf-8") as f:
+                path = os.path.join(path, f.read().strip())
+        if not os.path.exists(os.path.join(path, "metadata.json")):
+            return index
+
+        with open(os.path.join(path, "metadata.json"), encoding="utf-8") as f:
+            saved = json.load(f)
+        index.metadata = saved["metadata"]
+        index.trained_size = saved["trained_size"]
+
+        vectors = np.load(os.path.join(path, "vectors.npy"))
+        index.vectors = vectors if vectors.size else None
+        index.deleted = np.load(os.path.join(path, "deleted.npy"))
+        index.assignments = np.load(os.path.join(path, "assignments.npy"))
+        if os.path.exists(os.path.join(path, "centroids.npy")):
+            index.centroids = np.load(os.path.join(path, "centroids.npy"))
+        index._rebuild_doc_rows()
+        return index
+
+    def _rebuild_doc_rows(self):
+        """Recompute the document to row mapping used for deletes"""
+        self._doc_rows = defaultdict(list)
+        for row, meta in enumerate(self.metadata):
+            self._doc_rows[meta["doc_hash"]].append(row)
+
+    def _consolidate(self):
+        """Fold pending vectors into the main array and assign them to lists"""
+        if not self._pending:
+            return
+
+        new_vectors = np.concatenate(self._pending)
+        self._pending = []
+        self.vectors = new_vectors if self.vectors is None else np.concatenate([self.vectors, new_vectors])
+
+        if self.centroids is not None:
+            self.assignments = np.concatenate([self.assignments, self._assign(new_vectors)])
+        elif len(self.vectors) >= MIN_TRAINING_VECTORS:
+            self._train()
+        self._lists = None
+
+    def _train(self):
+        """Cluster the current vectors into roughly sqrt(n) lists"""
+        n_lists = max(1, int(np.sqrt(len(self.vectors))))
+        kmeans = MiniBatchKMeans(n_clusters=n_lists, batch_size=4096, n_init=3, random_state=0)
+        kmeans.fit(self.vectors)
+        self.centroids = normalize(kmeans.cluster_centers_.astype(np.float32))
+        self.assignments = self._assign(self.vectors)
+        self.trained_size = len(self.vectors)
+
+    def _assign(self, vectors):
+        """Assign vectors to their most similar centroid"""
+        assignments = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), 65536):
+            block = vectors[start:start + 65536]
+            assignments[start:start + len(block)] = np.argmax(block @ self.centroids.T, axis=1)
+        return assignments
+
+    def _candidates(self, query):
+        """Indices of the vectors in the lists closest to the query"""
+        if self.centroids is None:
+            return np.arange(len(self.vectors))
+
+        if self._lists is None:
+            order = np.argsort(self.assignments, kind="stable")
+            bounds = np.searchsorted(self.assignments[order], np.arange(len(self.centroids) + 1))
+            self._lists = (order, bounds)
+        order, bounds = self._lists
+
+        probes = np.argsort(-(self.centroids @ query))[:self.nprobe]
+        return np.concatenate([order[bounds[c]:bounds[c + 1]] for c in probes])
+
+def normalize(vectors):
+    """Scale rows to unit length so dot products are cosine similarities"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
@@ -0,0 +1,116 @@
+# utils/version_tracker.py
+
+import os
+import re
+from difflib import SequenceMatcher
+from utils.cache import content_hash
+from Analysis.compliance_checker import split_into_sentences
+
+# Filename suffixes that mark a revision of the same underlying document
+VERSION_SUFFIX_PATTERN = re.compile(
+    r"[\s_\-.]*(\(\d+\)|v(?:ersion)?[\s_\-.]?\d+(?:\.\d+)*|rev(?:ision)?[\s_\-.]?\d+|"
+    r"redline[ds]?|draft|final|clean|executed|signed)$"
+)
+
+def document_key(filename):
+    """Derive a key shared by all revisions of the same document from its filename"""
+    stem = os.path.splitext(os.path.basename(filename))[0].lower().strip()
+
+    # Strip trailing revision markers such as "_v3", "-redline" or " (2)"
+    previous = None
+    while stem != previous:
+        previous = stem
+        stem = VERSION_SUFFIX_PATTERN.sub("", stem).strip()
+
+    # Treat spaces, underscores and dashes alike
+    stem = re.sub(r"[\s_\-]+", " ", stem).strip()
+
+    return stem or filename.lower()
+
+def build_version(filename, pages, legal_results, compliance_results):
+    """Capture what is needed to diff a later revision against this one"""
+    return {
+        "filename": filename,
+        "page_hashes": [content_hash(page) for page in pages],
+        "sentences": split_into_sentences("\n".join(page for page in pages if page)),
+        # Categories the legal time budget skipped were not looked for, not missing
+        "risk_clauses": {
+            category: "Not Checked" if details.get("skipped")
+            else details["risk_level"] if details["found"] else "Not Found"
+            for category, details in legal_results["risk_clauses"].items()
+        },
+        "compliance": {
+            f"{category}: {check['description']}": check["compliant"]
+            for category, checks in compliance_results["checks"].items()
+            for check in checks
+        }
+    }
+
+def diff_pages(old_hashes, new_hashes):
+    """Compare page hashes and report changed, added and removed pages (1-based)"""
+    changed, added, removed = [], [], []
+    unchanged = 0
+    matcher = SequenceMatcher(None, old_hashes, new_hashes, autojunk=False)
+
+    for tag, old_start, old_end, new_start, new_end in matcher.get_opcodes():
+        if tag == "replace":
+            paired = min(old_end - old_start, new_end - new_start)
+            changed.extend(range(new_start + 1, new_start + paired + 1))
+            added.extend(range(new_start + paired + 1, new_end + 1))
+            removed.extend(range(old_start + paired + 1, old_end + 1))
+        elif tag == "insert":
+            added.extend(range(new_start + 1, new_end + 1))
+        elif tag == "delete":
+            removed.extend(range(old_start + 1, old_end + 1))
+        else:
+            unchanged += new_end - new_start
+
+    return {
+        "changed": changed,
+        "added": added,
+        "removed": removed,
+        "unchanged": unchanged
+    }
+
+def diff_sentences(old_sentences, new_sentences):
+    """List sentences that were added to or removed from the document"""
+    old_set = set(old_sentences)
+    new_set = set(new_sentences)
+
+    return {
+        "added": [s for s in dict.fromkeys(new_sentences) if s not in old_set],
+        "removed": [s for s in dict.fromkeys(old_sentences) if s not in new_set]
+    }
+
+def compare_versions(previous, current):
+    """
+    Report what changed between two analyzed versions of a document
+
+    Args:
+        previous: Version dict from build_version for the earlier revision
+        current: Version dict from build_version for the new revision
+
+    Returns:
+        dict: Page and sentence level diffs plus changed risk clauses and
+            compliance checks
+    """
+    # A category skipped in either revision has nothing to compare
+    risk_changes = []
+    for category, level in current["risk_clauses"].items():
+        before = previous["risk_clauses"].get(category, "Not Found")
+        if before != level and "Not Checked" not in (before, level):
+            risk_changes.append({"category": category, "before": before, "after": level})
+
+    compliance_changes = []
+    for check, compliant in current["compliance"].items():
+        before = previous["compliance"].get(check)
+        if before is not None and before != compliant:
+            compliance_changes.append({"check": check, "before": before, "after": compliant})
+
+    return {
+        "previous_filename": previous["filename"],
+        "pages": diff_pages(previous["page_hashes"], current["page_hashes"]),
+        "sentences": diff_sentences(previous["sentences"], current["sentences"]),
+        "risk_clauses": risk_changes,
+        "compliance": compliance_changes
+    }
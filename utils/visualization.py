@@ -5,12 +5,30 @@ import plotly.express as px
 import plotly.graph_objects as go
 import pandas as pd
 import numpy as np
+import io
 from collections import Counter
+from functools import lru_cache
 import re
 from wordcloud import WordCloud
 import matplotlib.pyplot as plt
 import nltk
 from nltk.corpus import stopwords
+from utils.cache import LRUCache, content_hash, stable_hash
+from Analysis.financial_analyzer import parse_financial_value
+
+# Rendered word cloud PNGs keyed by document hash, so reruns skip rendering
+WORD_CLOUD_CACHE = LRUCache(max_entries=64, name="word_clouds")
+
+# Entity graph node positions keyed by document hash and node set
+GRAPH_LAYOUT_CACHE = LRUCache(max_entries=64, name="graph_layouts")
+
+# Finished Plotly figures keyed by chart type and a hash of their input results
+FIGURE_CACHE = LRUCache(max_entries=256, name="figures")
+MISSING = object()
+
+# Bound the entity graph so rendering cost stays flat for entity-heavy documents
+MAX_GRAPH_NODES = 25
+MAX_EDGES_PER_NODE = 5
 
 # Download required NLTK resources
 try:
@@ -20,11 +38,12 @@ except LookupError:
 
 def create_visualizations(text, financial_results, legal_results):
     """Create visualizations based on the document analysis"""
+    doc_hash = content_hash(text)
     col1, col2 = st.columns(2)
     
     with col1:
         # Create word cloud
-        generate_word_cloud(text)
+        generate_word_cloud(text, legal_results.get("term_frequencies"), doc_hash)
         
     with col2:
         # Create risk heatmap
@@ -36,10 +55,11 @@ def create_visualizations(text, financial_results, legal_results):
     
     # Generate entity relationship graph
     if legal_results["contract_info"]["parties"]:
-        create_entity_relationship_graph(legal_results)
+        create_entity_relationship_graph(legal_results, doc_hash)
 
-def generate_word_cloud(text):
-    """Generate and display a word cloud from the document text"""
+@lru_cache(maxsize=1)
+def get_stop_words():
+    """Build the stop word set once per process"""
     stop_words = set(stopwords.words('english'))
     
     # Add custom stop words relevant to legal/financial documents
@@ -48,11 +68,40 @@ def generate_word_cloud(text):
         'section', 'article', 'agreement', 'contract', 'page', 'date'
     }
     stop_words.update(custom_stop_words)
+    return frozenset(stop_words)
+
+def compute_term_frequencies(text):
+    """Count alphabetic, lowercased terms in the text"""
+    return Counter(word for word in text.lower().split() if word.isalpha())
+
+def generate_word_cloud(text, term_frequencies=None, doc_hash=None):
+    """Generate and display a word cloud from the document text"""
+    doc_hash = doc_hash or content_hash(text)
+    image = WORD_CLOUD_CACHE.get(doc_hash)
+    
+    if image is None:
+        # Reuse the token counts from the NLP stage when available
+        if term_frequencies is None:
+            term_frequencies = compute_term_frequencies(text)
+        
+        # Remove stop words from the (much smaller) vocabulary, not the full text
+        stop_words = get_stop_words()
+        frequencies = {word: count for word, count in term_frequencies.items()
+                       if word not in stop_words}
+        
+        image = render_word_cloud(frequencies)
+        WORD_CLOUD_CACHE.set(doc_hash, image)
     
-    # Process text to remove stop words
-    words = text.lower().split()
-    filtered_words = [word for word in words if word.isalpha() and word not in stop_words]
-    processed_text = ' '.join(filtered_words)
+    if image:
+        st.image(image, use_container_width=True)
+    else:
+        st.info("Not enough text to build a word cloud.")
+    st.caption("Word Cloud: Key terms frequency in document")
+
+def render_word_cloud(frequencies):
+    """Render a word cloud to PNG bytes using a dedicated matplotlib figure"""
+    if not frequencies:
+        return b""
     
     # Generate word cloud
     wordcloud = WordCloud(
@@ -63,27 +112,46 @@ def generate_word_cloud(text):
         contour_width=1,
         contour_color='steelblue',
         max_words=100
-    ).generate(processed_text)
-    
-    # Display the word cloud using matplotlib
-    plt.figure(figsize=(10, 5))
-    plt.imshow(wordcloud, interpolation='bilinear')
-    plt.axis('off')
-    plt.tight_layout(pad=0)
-    st.pyplot(plt)
-    st.caption("Word Cloud: Key terms frequency in document")
+    ).generate_from_frequencies(frequencies)
+    
+    # Draw on an explicit figure and close it so long-running servers don't leak
+    fig, ax = plt.subplots(figsize=(10, 5))
+    try:
+        ax.imshow(wordcloud, interpolation='bilinear')
+        ax.axis('off')
+        fig.tight_layout(pad=0)
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png')
+    finally:
+        plt.close(fig)
+    
+    return buffer.getvalue()
+
+def cached_figure(kind, inputs, build_figure):
+    """Return the figure for these inputs, building it only on a cache miss"""
+    key = (kind, stable_hash(inputs))
+    fig = FIGURE_CACHE.get(key, MISSING)
+    if fig is MISSING:
+        fig = build_figure(inputs)
+        FIGURE_CACHE.set(key, fig)
+    return fig
 
 def create_risk_heatmap(legal_results):
     """Create a heatmap of risk categories found in the document"""
-    risk_categories = list(legal_results["risk_clauses"].keys())
+    fig = cached_figure("risk_heatmap", legal_results["risk_clauses"], build_risk_heatmap)
+    st.plotly_chart(fig, use_container_width=True)
+
+def build_risk_heatmap(risk_clauses):
+    """Build the risk heatmap figure from the risk clause results"""
+    risk_categories = list(risk_clauses.keys())
     
     # Convert risk levels to numeric values for the heatmap
     risk_values = []
     risk_levels = {'Low': 1, 'Medium': 2, 'High': 3, 'Not Found': 0}
     
     for category in risk_categories:
-        if legal_results["risk_clauses"][category]["found"]:
-            level = legal_results["risk_clauses"][category]["risk_level"]
+        if risk_clauses[category]["found"]:
+            level = risk_clauses[category]["risk_level"]
             risk_values.append(risk_levels.get(level, 0))
         else:
             risk_values.append(risk_levels['Not Found'])
@@ -117,7 +185,7 @@ def create_risk_heatmap(legal_results):
         margin=dict(l=20, r=20, t=40, b=20)
     )
     
-    st.plotly_chart(fig, use_container_width=True)
+    return fig
 
 def create_financial_charts(financial_results):
     """Create charts for financial metrics"""
@@ -128,35 +196,46 @@ def create_financial_charts(financial_results):
     
     # Create bar chart for financial metrics
     if metrics:
-        df = pd.DataFrame({
-            'Metric': list(metrics.keys()),
-            'Value': [float(str(v).replace(',', '').replace('$', '')) if v and isinstance(v, (str, int, float)) else 0 
-                     for v in metrics.values()]
-        })
-        
-        fig = px.bar(
-            df, 
-            x='Metric', 
-            y='Value', 
-            title='Key Financial Metrics',
-            color='Value',
-            color_continuous_scale=px.colors.sequential.Viridis
-        )
-        
-        fig.update_layout(
-            xaxis_title='',
-            yaxis_title='Value ($)',
-            height=400
-        )
-        
+        fig = cached_figure("financial_metrics", metrics, build_financial_chart)
         st.plotly_chart(fig, use_container_width=True)
     
     # If trend data exists, show it
     if financial_results.get("trends") and any(financial_results["trends"].values()):
         create_trend_chart(financial_results["trends"])
 
+def build_financial_chart(metrics):
+    """Build the bar chart figure for financial metrics"""
+    df = pd.DataFrame({
+            'Metric': list(metrics.keys()),
+        'Value': [np.nan_to_num(parse_financial_value(v)) if v and isinstance(v, (str, int, float)) else 0 
+                 for v in metrics.values()]
+    })
+    
+    fig = px.bar(
+        df, 
+        x='Metric', 
+        y='Value', 
+        title='Key Financial Metrics',
+        color='Value',
+        color_continuous_scale=px.colors.sequential.Viridis
+    )
+    
+    fig.update_layout(
+        xaxis_title='',
+        yaxis_title='Value ($)',
+        height=400
+    )
+    
+    return fig
+
 def create_trend_chart(trends):
     """Create a line chart for financial trends over time"""
+    fig = cached_figure("financial_trends", trends, build_trend_chart)
+    if fig is not None:
+        st.plotly_chart(fig, use_container_width=True)
+
+def build_trend_chart(trends):
+    """Build the line chart figure for financial trends, or None without data"""
     # Convert trend data to DataFrame
     periods = []
     metrics = {}
@@ -177,7 +256,7 @@ def create_trend_chart(trends):
             df_list.append({
                 'Metric': metric,
                 'Period': period,
-                'Value': float(str(value).replace(',', '').replace('$', '')) if value else 0
+                'Value': np.nan_to_num(parse_financial_value(value)) if value else 0
             })
     
     if df_list:
@@ -198,62 +277,94 @@ def create_trend_chart(trends):
             height=400
         )
         
-        st.plotly_chart(fig, use_container_width=True)
+        return fig
+    
+    return None
 
-def create_entity_relationship_graph(legal_results):
-    """Create a network graph of entities and their relationships"""
-    parties = legal_results["contract_info"]["parties"]
+def create_entity_relationship_graph(legal_results, doc_hash=None):
+    """Create a network graph of entities weighted by sentence-level co-occurrence"""
+    cooccurrence = legal_results.get("entity_cooccurrence")
+    if not cooccurrence or len(cooccurrence["nodes"]) < 2:
+        return
     
-    if len(parties) < 2:
+    fig = cached_figure(
+        "entity_graph",
+        cooccurrence,
+        lambda inputs: build_entity_relationship_graph(inputs, doc_hash)
+    )
+    if fig is None:
+        st.caption("No parties are mentioned together in the same sentence.")
         return
     
-    # Create relationships between parties (assuming all parties are related)
-    edges = []
-    for i in range(len(parties)):
-        for j in range(i+1, len(parties)):
-            edges.append((parties[i], parties[j]))
+    st.plotly_chart(fig, use_container_width=True)
+    st.caption("Edges connect parties mentioned in the same sentence; marker size reflects how often.")
+
+def build_entity_relationship_graph(cooccurrence, doc_hash=None):
+    """Build the entity graph figure, or None if no parties co-occur"""
+    nodes, edges = prune_entity_graph(cooccurrence["nodes"], cooccurrence["edges"])
+    if not edges:
+        return None
+    
+    # The layout only depends on the document, so compute it once per document
+    layout_key = (doc_hash, tuple(nodes)) if doc_hash else None
+    positions = GRAPH_LAYOUT_CACHE.get(layout_key) if layout_key else None
+    if positions is None:
+        positions = compute_graph_layout(len(nodes), [(nodes.index(s), nodes.index(t), w) for s, t, w in edges])
+        if layout_key:
+            GRAPH_LAYOUT_CACHE.set(layout_key, positions)
+    
+    index = {node: i for i, node in enumerate(nodes)}
+    max_weight = max(weight for _, _, weight in edges)
     
-    # Create a DataFrame for edges
-    edge_df = pd.DataFrame(edges, columns=['source', 'target'])
+    # All edges go into a single trace, separated by None (NaN) breaks
+    edge_x, edge_y = [], []
+    mid_x, mid_y, mid_text, mid_size = [], [], [], []
+    for source, target, weight in edges:
+        (x0, y0), (x1, y1) = positions[index[source]], positions[index[target]]
+        edge_x.extend([x0, x1, None])
+        edge_y.extend([y0, y1, None])
+        mid_x.append((x0 + x1) / 2)
+        mid_y.append((y0 + y1) / 2)
+        mid_text.append(f"{source} – {target}: {weight} shared sentence{'s' if weight != 1 else ''}")
+        mid_size.append(4 + 10 * weight / max_weight)
     
-    # Create a Plotly figure
     fig = go.Figure()
     
-    # Create the nodes
-    node_x = []
-    node_y = []
-    for i, party in enumerate(parties):
-        angle = 2 * np.pi * i / len(parties)
-        node_x.append(np.cos(angle))
-        node_y.append(np.sin(angle))
+    fig.add_trace(go.Scatter(
+        x=edge_x, y=edge_y,
+        mode='lines',
+        line=dict(width=1.5, color='gray'),
+        hoverinfo='skip',
+        showlegend=False
+    ))
+    
+    # Edge weights are shown by markers at the edge midpoints
+    fig.add_trace(go.Scatter(
+        x=mid_x, y=mid_y,
+        mode='markers',
+        text=mid_text,
+        hoverinfo='text',
+        marker=dict(size=mid_size, color='gray', opacity=0.6),
+        showlegend=False
+    ))
     
-    # Add nodes to the figure
+    mentions = cooccurrence["nodes"]
+    max_mentions = max(mentions[node] for node in nodes)
     fig.add_trace(go.Scatter(
-        x=node_x, y=node_y,
+        x=positions[:, 0], y=positions[:, 1],
         mode='markers+text',
-        text=parties,
+        text=nodes,
+        hovertext=[f"{node}: {mentions[node]} mentions" for node in nodes],
+        hoverinfo='text',
         textposition="top center",
         marker=dict(
-            size=30,
+            size=[15 + 25 * mentions[node] / max_mentions for node in nodes],
             color='royalblue',
             line=dict(width=2, color='darkblue')
         ),
         name='Entities'
     ))
     
-    # Add edges to the figure
-    for i, row in edge_df.iterrows():
-        source_idx = parties.index(row['source'])
-        target_idx = parties.index(row['target'])
-        
-        fig.add_trace(go.Scatter(
-            x=[node_x[source_idx], node_x[target_idx]],
-            y=[node_y[source_idx], node_y[target_idx]],
-            mode='lines',
-            line=dict(width=2, color='gray'),
-            showlegend=False
-        ))
-    
     fig.update_layout(
         title='Contract Parties Relationship',
         showlegend=False,
@@ -263,4 +374,104 @@ def create_entity_relationship_graph(legal_results):
         height=400
     )
     
-    st.plotly_chart(fig, use_container_width=True)
\ No newline at end of file
+    return fig
+
+def prune_entity_graph(mentions, edges, max_nodes=MAX_GRAPH_NODES, edges_per_node=MAX_EDGES_PER_NODE):
+    """Keep the most mentioned entities and each entity's strongest edges"""
+    nodes = sorted(mentions, key=lambda node: (-mentions[node], node))[:max_nodes]
+    kept = set(nodes)
+    
+    # Edges arrive sorted by weight, so the first ones seen per node are its strongest
+    degree = Counter()
+    pruned = []
+    for source, target, weight in edges:
+        if source not in kept or target not in kept:
+            continue
+        if degree[source] < edges_per_node or degree[target] < edges_per_node:
+            pruned.append((source, target, weight))
+            degree[source] += 1
+            degree[target] += 1
+    
+    # Drop entities left without any edge
+    connected = {node for edge in pruned for node in edge[:2]}
+    return [node for node in nodes if node in connected], pruned
+
+def compute_graph_layout(num_nodes, weighted_edges, iterations=50, seed=42):
+    """Compute a weighted force-directed (Fruchterman-Reingold) layout"""
+    rng = np.random.default_rng(seed)
+    
+    # Start from a circle with a little jitter so the result is deterministic
+    angles = 2 * np.pi * np.arange(num_nodes) / num_nodes
+    positions = np.column_stack([np.cos(angles), np.sin(angles)]) + rng.normal(0, 0.01, (num_nodes, 2))
+    
+    weights = np.zeros((num_nodes, num_nodes))
+    for source, target, weight in weighted_edges:
+        weights[source, target] = weights[target, source] = weight
+    if weights.max() > 0:
+        weights /= weights.max()
+    
+    k = 1.0 / np.sqrt(num_nodes)
+    temperature = 0.1
+    for _ in range(iterations):
+        delta = positions[:, None, :] - positions[None, :, :]
+        distance = np.maximum(np.linalg.norm(delta, axis=-1), 0.01)
+        
+        # Repulsion between all nodes, attraction along weighted edges
+        force = k * k / distance ** 2 - weights * distance / k
+        displacement = np.einsum('ij,ijk->ik', force, delta)
+        
+        length = np.maximum(np.linalg.norm(displacement, axis=-1), 0.01)
+        positions += displacement / length[:, None] * np.minimum(length, temperature)[:, None]
+        temperature *= 0.95
+    
+    return positions
+
+def create_portfolio_visualizations(aggregates):
+    """Create aggregated risk, compliance and financial views across many documents"""
+    risk_by_category = aggregates["risk_by_category"]
+    compliance_gaps = aggregates["compliance_gaps"]
+    metrics_by_document = aggregates["metrics_by_document"]
+    
+    if not risk_by_category.empty:
+        st.subheader("Risk Levels by Clause Category")
+        risk_df = risk_by_category.reset_index().melt(
+            id_vars="category", var_name="Risk Level", value_name="Documents"
+        )
+        fig = px.bar(
+            risk_df,
+            x="category",
+            y="Documents",
+            color="Risk Level",
+            color_discrete_map={
+                "High": "#e57373",
+                "Medium": "#ffb74d",
+                "Low": "#81c784",
+                "Not Found": "#e0f7fa",
+                "Not Checked": "#b0bec5"
+            },
+            title="Documents per Risk Level"
+        )
+        fig.update_layout(xaxis_title='', height=400)
+        st.plotly_chart(fig, use_container_width=True)
+    
+    if not compliance_gaps.empty:
+        st.subheader("Compliance Gaps by Requirement")
+        gaps_df = compliance_gaps[compliance_gaps["documents_missing"] > 0]
+        if not gaps_df.empty:
+            fig = px.bar(
+                gaps_df,
+                x="gap_rate",
+                y="requirement",
+                color="category",
+                orientation="h",
+                hover_data=["documents_missing"],
+                title="Share of Documents Missing Each Requirement"
+            )
+            fig.update_layout(xaxis_title='Gap Rate', yaxis_title='', xaxis_tickformat='.0%', height=500)
+            st.plotly_chart(fig, use_container_width=True)
+        else:
+            st.success("✅ No compliance gaps found across the portfolio")
+    
+    if not metrics_by_document.empty:
+        st.subheader("Financial Metrics by Document")
+        st.dataframe(metrics_by_document, use_container_width=True)